@@ -0,0 +1,201 @@
+"""
+Agent backends: the agent API available in the installed LlamaIndex, behind one call signature
+"""
+import asyncio
+from typing import Any, Optional, Tuple
+from llama_index.core.llms import ChatMessage
+from src.agents.memory import ConversationMemory
+from src.agents.event_loop import run_coroutine
+from src.agents.streaming import ReActAnswerFilter, current_stream, emit_token
+
+# Workflow-based agents (LlamaIndex 0.12+) run inside an event loop
+try:
+    from llama_index.core.workflow import Workflow
+    from llama_index.core.agent.workflow import AgentStream
+except ImportError:
+    Workflow = AgentStream = None
+
+
+def response_text(response: Any) -> str:
+    """Extract text from the various agent response types (streams are joined)"""
+    if isinstance(response, str):
+        return response
+
+    if isinstance(response, ChatMessage):
+        # str() would prefix the role ("assistant: ...")
+        return response.content or ""
+
+    # Try common response attributes (workflow AgentOutput.response is a
+    # ChatMessage, the legacy Response.response a string)
+    if hasattr(response, 'response'):
+        if response.response is None:
+            return str(response)
+        return response_text(response.response)
+    if hasattr(response, 'output'):
+        return str(response.output)
+    if hasattr(response, 'text'):
+        return str(response.text)
+    if hasattr(response, 'message'):
+        return response_text(response.message)
+    if hasattr(response, 'source_nodes'):
+        # It's a Response object, try to get the response text
+        return str(response)
+    if hasattr(response, '__iter__'):
+        # Streaming response
+        return ''.join(response_text(chunk) for chunk in response)
+
+    # Last resort: convert to string
+    return str(response)
+
+
+class AgentBackend:
+    """
+    One agent API, picked once when the agent is built.
+
+    call() sends a message with the session history and returns the answer
+    text; it raises when the agent fails, the caller decides on a fallback.
+    """
+
+    name = "agent"
+
+    def __init__(self, agent: Any):
+        """
+        Initialize the backend
+
+        Args:
+            agent: Agent or chat engine object
+        """
+        self.agent = agent
+
+    def arguments(self, message: str, memory: Optional[ConversationMemory]) -> Tuple[tuple, dict]:
+        """Positional and keyword arguments of one call"""
+        raise NotImplementedError
+
+    def call(
+        self,
+        message: str,
+        memory: Optional[ConversationMemory] = None,
+        max_iterations: Optional[int] = None,
+    ) -> str:
+        """
+        Answer a message
+
+        Args:
+            message: User message/question
+            memory: Conversation history of the session
+            max_iterations: Maximum reasoning steps (ignored by backends
+                that cannot bound them)
+
+        Returns:
+            Answer text
+        """
+        raise NotImplementedError
+
+
+class WorkflowAgentBackend(AgentBackend):
+    """
+    Workflow agents (LlamaIndex 0.12+): run() returns an awaitable handler,
+    awaited on the background event loop
+    """
+
+    name = "workflow"
+
+    def __init__(self, agent: Any, timeout: Optional[float] = None):
+        """
+        Initialize the backend
+
+        Args:
+            agent: Workflow agent (e.g. ReActAgent)
+            timeout: Seconds after which a run is cancelled (None: no limit)
+        """
+        super().__init__(agent)
+        self.timeout = timeout
+
+    def arguments(self, message: str, memory: Optional[ConversationMemory]) -> Tuple[tuple, dict]:
+        if memory is None:
+            return (message,), {}
+        # Workflow agents take the history as chat messages
+        return (message,), {'chat_history': memory.to_chat_messages()}
+
+    def call(
+        self,
+        message: str,
+        memory: Optional[ConversationMemory] = None,
+        max_iterations: Optional[int] = None,
+    ) -> str:
+        args, kwargs = self.arguments(message, memory)
+        if max_iterations is not None:
+            # At the limit, write a final answer instead of raising
+            kwargs.update(max_iterations=max_iterations, early_stopping_method="generate")
+
+        # Context variables (LLM call budget, answer stream) follow the coroutine to the loop
+        async def run():
+            handler = self.agent.run(*args, **kwargs)
+            try:
+                if current_stream() is not None and AgentStream is not None:
+                    # Relay the final answer tokens as the LLM writes them
+                    answer_filter = ReActAnswerFilter()
+                    async for event in handler.stream_events():
+                        if isinstance(event, AgentStream):
+                            emit_token(answer_filter.feed(event.response))
+                return await handler
+            except asyncio.CancelledError:
+                # Stop the workflow too, not only our wait on it
+                if hasattr(handler, 'cancel_run'):
+                    await handler.cancel_run()
+                raise
+
+        return response_text(run_coroutine(run(), timeout=self.timeout))
+
+
+class MethodAgentBackend(AgentBackend):
+    """Agents and chat engines with a synchronous chat() or query() method"""
+
+    def __init__(self, agent: Any, method_name: str):
+        """
+        Initialize the backend
+
+        Args:
+            agent: Agent or chat engine
+            method_name: Name of the method answering a message
+        """
+        super().__init__(agent)
+        self.name = method_name
+        self.method = getattr(agent, method_name)
+
+    def arguments(self, message: str, memory: Optional[ConversationMemory]) -> Tuple[tuple, dict]:
+        history = memory.render() if memory else ""
+        if not history:
+            return (message,), {}
+        return (f"{history}\n\nQuestion actuelle : {message}",), {}
+
+    def call(
+        self,
+        message: str,
+        memory: Optional[ConversationMemory] = None,
+        max_iterations: Optional[int] = None,
+    ) -> str:
+        args, kwargs = self.arguments(message, memory)
+        return response_text(self.method(*args, **kwargs))
+
+
+def resolve_backend(agent: Any, timeout: Optional[float] = None) -> Optional[AgentBackend]:
+    """
+    Pick the backend of an agent object
+
+    Args:
+        agent: Agent or chat engine (None: no backend)
+        timeout: Timeout of workflow runs
+
+    Returns:
+        Backend, or None if the object has no supported API
+    """
+    if agent is None:
+        return None
+    if Workflow is not None and isinstance(agent, Workflow):
+        return WorkflowAgentBackend(agent, timeout=timeout)
+    for method_name in ('chat', 'query'):
+        method = getattr(agent, method_name, None)
+        if callable(method) and not asyncio.iscoroutinefunction(method):
+            return MethodAgentBackend(agent, method_name)
+    return None
@@ -0,0 +1,162 @@
+"""
+Per-message budget of LLM calls, counted from LlamaIndex instrumentation events
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+from llama_index.core.base.llms.base import BaseLLM
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.instrumentation.events.llm import (
+    LLMChatEndEvent,
+    LLMChatStartEvent,
+    LLMCompletionEndEvent,
+    LLMCompletionStartEvent,
+)
+from llama_index.core.rate_limiter import BaseRateLimiter
+
+_START_EVENTS = (LLMChatStartEvent, LLMCompletionStartEvent)
+_END_EVENTS = (LLMChatEndEvent, LLMCompletionEndEvent)
+
+# Budget of the message being answered, and LLM call nesting depth (an LLM
+# whose chat() calls its own complete() is counted once)
+_current_budget: ContextVar[Optional["LLMCallBudget"]] = ContextVar("llm_call_budget", default=None)
+_call_depth: ContextVar[int] = ContextVar("llm_call_depth", default=0)
+
+
+class _LLMCallCounter(BaseEventHandler):
+    """Counts LLM calls against the budget active in the caller's context"""
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LLMCallCounter"
+
+    def handle(self, event: BaseEvent, **kwargs) -> None:
+        budget = _current_budget.get()
+        if budget is None:
+            return
+        if isinstance(event, _START_EVENTS):
+            depth = _call_depth.get()
+            _call_depth.set(depth + 1)
+            if depth == 0:
+                budget.record()
+        elif isinstance(event, _END_EVENTS):
+            _call_depth.set(max(0, _call_depth.get() - 1))
+
+
+class LLMBudgetExceeded(RuntimeError):
+    """An LLM call was refused: the budget of the message is spent"""
+
+
+class _BudgetGuard(BaseRateLimiter):
+    """
+    Refuses the LLM calls past the active budget.
+
+    LLMs call their rate limiter before each request, after the start event
+    that counted it: instrumentation handlers cannot stop a call (their
+    errors are swallowed), this hook can. The LLM's own limiter, if any,
+    still applies afterwards.
+    """
+
+    def __init__(self, inner: Optional[BaseRateLimiter] = None):
+        self.inner = inner
+
+    @staticmethod
+    def _check():
+        budget = _current_budget.get()
+        if budget is not None and budget.used > budget.max_calls:
+            raise LLMBudgetExceeded(
+                f"LLM call budget spent ({budget.max_calls} calls for this message)"
+            )
+
+    def acquire(self, num_tokens: int = 0) -> None:
+        self._check()
+        if self.inner is not None:
+            self.inner.acquire(num_tokens)
+
+    async def async_acquire(self, num_tokens: int = 0) -> None:
+        self._check()
+        if self.inner is not None:
+            await self.inner.async_acquire(num_tokens)
+
+
+def enforce_budget(llm: Any) -> Any:
+    """
+    Make an LLM refuse calls once the budget active in the caller's context is spent
+
+    Calls outside a budget are not affected, so shared LLMs can be guarded
+    once for every agent using them.
+
+    Args:
+        llm: LLM (other objects, e.g. None, are returned unchanged)
+
+    Returns:
+        The same LLM
+    """
+    if isinstance(llm, BaseLLM) and not isinstance(llm.rate_limiter, _BudgetGuard):
+        _install_counter()
+        llm.rate_limiter = _BudgetGuard(llm.rate_limiter)
+    return llm
+
+
+_counter_installed = False
+_counter_lock = threading.Lock()
+
+
+def _install_counter():
+    global _counter_installed
+    with _counter_lock:
+        if not _counter_installed:
+            get_dispatcher().add_event_handler(_LLMCallCounter())
+            _counter_installed = True
+
+
+class LLMCallBudget:
+    """
+    Maximum number of LLM calls spent answering one message.
+
+    While active (see activate()), every LLM call made in the same context
+    is counted: in the calling thread, in asyncio tasks it spawns, and in
+    pool threads submitted with a copy of the context. LLMs guarded with
+    enforce_budget() raise LLMBudgetExceeded instead of exceeding it, also
+    for the calls tools make inside one agent step.
+    """
+
+    def __init__(self, max_calls: int):
+        """
+        Initialize the budget
+
+        Args:
+            max_calls: Maximum number of LLM calls
+        """
+        self.max_calls = max_calls
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def record(self):
+        """Count one LLM call"""
+        with self._lock:
+            self.used += 1
+
+    @property
+    def remaining(self) -> int:
+        """Calls left (never negative)"""
+        return max(0, self.max_calls - self.used)
+
+    def allows(self, calls: int) -> bool:
+        """True if `calls` more LLM calls fit in the budget"""
+        return self.remaining >= calls
+
+    @contextmanager
+    def activate(self):
+        """Count the LLM calls made in this context against the budget"""
+        _install_counter()
+        budget_token = _current_budget.set(self)
+        depth_token = _call_depth.set(0)
+        try:
+            yield self
+        finally:
+            _call_depth.reset(depth_token)
+            _current_budget.reset(budget_token)
@@ -0,0 +1,111 @@
+"""
+Long-lived background event loop that synchronous (Flask) code runs coroutines on
+"""
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Optional
+
+
+class BackgroundEventLoop:
+    """
+    One asyncio event loop running forever in a daemon thread.
+
+    Sync callers submit coroutines with run_coroutine_threadsafe and wait
+    for the result with a timeout; a timed out coroutine is cancelled.
+    Reusing one loop avoids creating a thread and a loop per call, and lets
+    async clients (LLM, HTTP) keep their connection pools across requests.
+    """
+
+    def __init__(self, name: str = "agent-event-loop"):
+        """
+        Initialize the loop (the thread starts on first use)
+
+        Args:
+            name: Name of the loop thread
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop (started if needed)"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                ready = threading.Event()
+                loop = asyncio.new_event_loop()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Cannot wait for the background loop from its own thread")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the loop and wait for its result
+
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait (None: no limit)
+
+        Returns:
+            Result of the coroutine
+
+        Raises:
+            TimeoutError: If the coroutine did not finish in time (it is cancelled)
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Coroutine did not finish within {timeout} seconds")
+
+    def stop(self):
+        """Stop the loop and wait for its thread"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=5)
+            if thread.is_alive():
+                # Still busy: the daemon thread dies with the process
+                return
+        loop.close()
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundEventLoop:
+    """Get the process-wide background event loop"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundEventLoop()
+            atexit.register(_background_loop.stop)
+        return _background_loop
+
+
+def run_coroutine(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the process-wide background loop (see BackgroundEventLoop.run)"""
+    return get_background_loop().run(coro, timeout=timeout)
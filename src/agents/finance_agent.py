@@ -1,15 +1,24 @@
 """
 ReAct Agent for autonomous financial analysis
 """
-import asyncio
+import contextvars
 import threading
-from typing import Optional, List
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, Optional, List, Tuple
 from llama_index.core.agent import ReActAgent
 from llama_index.core.llms import LLM
 from llama_index.core.tools import FunctionTool
 from src.rag.retrieval import AdvancedRAGRetriever
 from src.data.alpha_vantage import AlphaVantageClient
-from src.agents.tools import get_all_tools
+from src.agents.tools import ToolContext, ToolRegistry, get_tool_registry, report_search_status
+from src.agents.router import IntentRouter, Route, MARKET, TREND, REPORT
+from src.agents.memory import ConversationMemory
+from src.agents.backends import AgentBackend, resolve_backend, response_text
+from src.agents.budget import LLMBudgetExceeded, LLMCallBudget, enforce_budget
+from src.agents.streaming import (
+    AnswerStream, StreamEvent, DONE, ERROR, current_stream, emit_status, emit_token, reset_answer
+)
 
 # Try to import AgentRunner and AgentChatEngine if available
 try:
@@ -26,10 +35,72 @@ except ImportError:
 
 # Note: Some imports may not be available in all LlamaIndex versions
 
+# Independent tool calls of one question run concurrently on a bounded pool
+MAX_PARALLEL_TOOLS = 4
+TOOL_TIMEOUTS = {
+    'analyze_10k_report': 60.0,
+    'get_stock_metrics': 20.0,
+    'get_stock_time_series': 20.0,
+}
+DEFAULT_TOOL_TIMEOUT = 30.0
+# Maximum wait for a free worker of the shared tool pool (the tool timeout
+# only starts when the call runs)
+TOOL_QUEUE_TIMEOUT = 60.0
+
+# Maximum duration of one async agent run on the background event loop
+AGENT_TIMEOUT = 120.0
+
+# LLM calls allowed to answer one message (agent steps, tools and fallback)
+MAX_LLM_CALLS_PER_MESSAGE = 12
+# LLM calls of the direct tool execution fallback (report synthesis, final answer)
+DIRECT_TOOLS_LLM_CALLS = 2
+
+BUDGET_EXHAUSTED_MESSAGE = (
+    "❌ **Réponse impossible**\n\n"
+    "L'analyse de cette question a atteint la limite d'appels au modèle. "
+    "Reformulez-la de manière plus précise ou décomposez-la en plusieurs questions."
+)
+
+# Streamed answers are computed on their own pool (they use the tool pool themselves)
+MAX_STREAMING_ANSWERS = 8
+# Seconds without event after which a stream yields None (keep-alive)
+STREAM_KEEPALIVE = 15.0
+
+_tool_executor = None
+_tool_executor_lock = threading.Lock()
+_stream_executor = None
+_stream_executor_lock = threading.Lock()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Get the process-wide pool running agent tool calls"""
+    global _tool_executor
+    with _tool_executor_lock:
+        if _tool_executor is None:
+            _tool_executor = ThreadPoolExecutor(
+                max_workers=MAX_PARALLEL_TOOLS, thread_name_prefix="agent-tool"
+            )
+        return _tool_executor
+
+
+def get_stream_executor() -> ThreadPoolExecutor:
+    """Get the process-wide pool computing streamed answers"""
+    global _stream_executor
+    with _stream_executor_lock:
+        if _stream_executor is None:
+            _stream_executor = ThreadPoolExecutor(
+                max_workers=MAX_STREAMING_ANSWERS, thread_name_prefix="agent-stream"
+            )
+        return _stream_executor
+
 
 class FinanceAgent:
     """
     Autonomous financial analyst agent using ReAct pattern
+
+    One agent is shared by every session of a ticker: it keeps no
+    conversation state, the caller passes each session's ConversationMemory
+    to chat().
     """
     
     SYSTEM_PROMPT = """You are an expert financial analyst AI assistant. Your goal is to provide 
@@ -56,7 +127,11 @@ Your responses should be:
         rag_retriever: AdvancedRAGRetriever,
         alpha_vantage_client: AlphaVantageClient,
         llm: LLM,
-        verbose: bool = True
+        verbose: bool = True,
+        ticker: Optional[str] = None,
+        router: Optional[IntentRouter] = None,
+        tool_registry: Optional[ToolRegistry] = None,
+        max_llm_calls: int = MAX_LLM_CALLS_PER_MESSAGE
     ):
         """
         Initialize the finance agent
@@ -66,18 +141,31 @@ Your responses should be:
             alpha_vantage_client: AlphaVantageClient instance for market data
             llm: LLM instance for reasoning
             verbose: Whether to print agent reasoning steps
+            ticker: Ticker of the company, used for market data tool calls
+            router: Intent router of the fast path (simple lookups answered
+                without the agent); defaults to the rule-based IntentRouter
+            tool_registry: Registry the tools are bound from (default: the
+                process-wide registry)
+            max_llm_calls: LLM calls allowed to answer one message
         """
         self.rag_retriever = rag_retriever
         self.alpha_vantage_client = alpha_vantage_client
         self.llm = llm
         self.verbose = verbose
-        
-        # Get all tools
-        tools = get_all_tools(
+        self.ticker = ticker
+        self.router = router or IntentRouter()
+        self.max_llm_calls = max_llm_calls
+        # Calls past the budget fail, including the ones tools make (report synthesis)
+        enforce_budget(llm)
+        enforce_budget(getattr(rag_retriever, 'llm', None))
+
+        # Bind the shared tool definitions to this agent's retriever and client
+        tools = (tool_registry or get_tool_registry()).bind(ToolContext(
             rag_retriever=rag_retriever,
             alpha_vantage_client=alpha_vantage_client,
             llm=llm
-        )
+        ))
+        self.tools = {tool.metadata.name: tool for tool in tools}
         
         # Try to create AgentChatEngine first (newer API)
         self.agent = None
@@ -93,59 +181,71 @@ Your responses should be:
                     system_prompt=self.SYSTEM_PROMPT
                 )
                 print("Using AgentChatEngine")
-                return  # Success, exit early
             except Exception as e:
                 print(f"AgentChatEngine failed: {e}, trying ReActAgent...")
         
         # Method 2: Create ReAct agent
+        if self.chat_engine is None:
+            self.agent = self._create_react_agent(tools)
+
+        # The agent API is picked once here; chat() always calls this backend
+        self.backend: Optional[AgentBackend] = resolve_backend(
+            self.chat_engine if self.chat_engine is not None else self.agent,
+            timeout=AGENT_TIMEOUT
+        )
+        if self.backend is None:
+            print("No supported agent API, using direct tool execution")
+
+    def _create_react_agent(self, tools: List[FunctionTool]):
+        """Create the ReAct agent (handles the LlamaIndex API variants)"""
         # Handle different LlamaIndex versions and API changes
         try:
             # Check if from_tools method exists
             if hasattr(ReActAgent, 'from_tools'):
                 # Method 1: from_tools (LlamaIndex 0.10+)
                 try:
-                    self.agent = ReActAgent.from_tools(
+                    return ReActAgent.from_tools(
                         tools=tools,
-                        llm=llm,
-                        verbose=verbose,
+                        llm=self.llm,
+                        verbose=self.verbose,
                         system_prompt=self.SYSTEM_PROMPT,
                         max_iterations=10
                     )
                 except TypeError as e:
                     # Try with different parameter names
                     try:
-                        self.agent = ReActAgent.from_tools(
+                        return ReActAgent.from_tools(
                             tool_list=tools,
-                            llm=llm,
-                            verbose=verbose,
+                            llm=self.llm,
+                            verbose=self.verbose,
                             system_prompt=self.SYSTEM_PROMPT,
                             max_iterations=10
                         )
                     except Exception:
                         # Fallback to direct initialization
-                        self.agent = ReActAgent(
+                        return ReActAgent(
                             tools=tools,
-                            llm=llm,
-                            verbose=verbose,
+                            llm=self.llm,
+                            verbose=self.verbose,
                             system_prompt=self.SYSTEM_PROMPT,
                             max_iterations=10
                         )
             else:
                 # Method 2: Direct initialization (older versions)
-                self.agent = ReActAgent(
+                return ReActAgent(
                     tools=tools,
-                    llm=llm,
-                    verbose=verbose,
+                    llm=self.llm,
+                    verbose=self.verbose,
                     system_prompt=self.SYSTEM_PROMPT,
                     max_iterations=10
                 )
         except Exception as e:
             # Last resort: try with minimal parameters
             try:
-                self.agent = ReActAgent(
+                return ReActAgent(
                     tools=tools,
-                    llm=llm,
-                    verbose=verbose
+                    llm=self.llm,
+                    verbose=self.verbose
                 )
             except Exception as e2:
                 raise RuntimeError(
@@ -154,38 +254,89 @@ Your responses should be:
                     f"Please ensure LlamaIndex is properly installed and check the version compatibility."
                 )
     
-    def _run_with_event_loop(self, coro):
-        """Run async code with proper event loop handling"""
-        try:
-            # Try to get the current event loop
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If loop is already running, we need to use a different approach
-                # Create a new thread with a new event loop
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(asyncio.run, coro)
-                    return future.result(timeout=300)  # 5 minute timeout
-            else:
-                # Loop exists but not running, we can use it
-                return loop.run_until_complete(coro)
-        except RuntimeError:
-            # No event loop exists, create a new one
-            return asyncio.run(coro)
+    def _report_with_sources(self, question: str) -> str:
+        """10-K answer followed by its sources (empty if the answer is not meaningful)"""
+        emit_status(report_search_status())
+        # Answer and source nodes come from the same retrieval pass
+        result = self.rag_retriever.query_with_sources(question)
+        report_info = result.answer
+        if not report_info or len(str(report_info).strip()) <= 20:
+            return ""
+        sources_text = result.format_sources()
+        if sources_text:
+            report_info = f"{report_info}\n\n**Sources :**\n{sources_text}"
+        return report_info
     
-    def _execute_tools_directly(self, message: str) -> str:
+    def answer_fast(self, message: str) -> Optional[str]:
         """
-        Execute tools directly without using ReActAgent
-        This is a workaround for LlamaIndex version compatibility issues
+        Answer a simple lookup straight from the tools, without the agent
+
+        Args:
+            message: User question
+
+        Returns:
+            Templated answer, or None if the question needs the agent (open
+            question, another company than the agent's, no ticker for market
+            data, or a tool returned nothing)
         """
-        # Get tools
-        tools = get_all_tools(
-            rag_retriever=self.rag_retriever,
-            alpha_vantage_client=self.alpha_vantage_client,
-            llm=self.llm
-        )
+        route = self.router.route(message)
+        if any(ticker != (self.ticker or '').upper() for ticker in route.tickers):
+            # The tools only hold this agent's company
+            return None
+        try:
+            if route.intent in (MARKET, TREND):
+                return self._answer_market(route)
+            if route.intent == REPORT:
+                return self._answer_report(message, route)
+        except Exception as e:
+            print(f"Fast path failed: {e}")
+        return None
+
+    def _answer_market(self, route: Route) -> Optional[str]:
+        """Metric(s) or trend summary of the current ticker"""
+        name = 'get_stock_metrics' if route.intent == MARKET else 'get_stock_time_series'
+        tool = self.tools.get(name)
+        if not self.ticker or tool is None:
+            return None
+        output = tool.fn(symbol=self.ticker)
+        if not output or output.startswith("Error"):
+            return None
+        lines = [
+            line for line in output.splitlines()
+            if any(line.startswith(f"- {field}:") for field in route.fields)
+        ]
+        if lines:
+            return f"**Données de marché ({self.ticker}) :**\n" + "\n".join(lines)
+        return f"**Données de marché ({self.ticker}) :**\n{output}"
+
+    def _answer_report(self, message: str, route: Route) -> Optional[str]:
+        """10-K answer, from the section the question is about when it has matches"""
+        filters = [{'section': route.section}, None] if route.section else [None]
+        for metadata_filters in filters:
+            emit_status(
+                report_search_status(metadata_filters['section'] if metadata_filters else None)
+            )
+            result = self.rag_retriever.query_with_sources(
+                message, metadata_filters=metadata_filters
+            )
+            if result.source_nodes and len(str(result.answer).strip()) > 20:
+                answer = f"**Réponse basée sur le rapport 10-K :**\n\n{result.answer}"
+                sources_text = result.format_sources()
+                if sources_text:
+                    answer = f"{answer}\n\n**Sources :**\n{sources_text}"
+                return answer
+        return None
+
+    def plan_tool_calls(self, message: str) -> List[Tuple[str, Callable[..., str], dict]]:
+        """
+        Pick the tool calls a question needs; they are independent of each other
         
-        # Analyze the question to determine which tools to use
+        Args:
+            message: User question
+
+        Returns:
+            (tool name, function, keyword arguments) of each call
+        """
         message_lower = message.lower()
         
         # Check if question is about 10-K report
@@ -198,72 +349,95 @@ Your responses should be:
         market_keywords = ['prix', 'cours', 'action', 'bourse', 'volume', 'capitalisation',
                           'pe ratio', 'dividende', 'tendance', 'graphique', 'indicateur']
         is_market_question = any(keyword in message_lower for keyword in market_keywords)
+        trend_keywords = [
+            'tendance', 'graphique', 'indicateur', 'historique', 'évolution', 'rsi',
+            'moyenne mobile'
+        ]
+        is_trend_question = any(keyword in message_lower for keyword in trend_keywords)
         
-        # Collect information from tools
-        report_info = ""
-        market_info = ""
-        
-        # Get report information if relevant
+        calls = []
         if is_report_question:
-            try:
-                # Try direct RAG query first (most reliable)
-                try:
-                    report_info = self.rag_retriever.query(message)
-                        # Check if response is meaningful
-                    if report_info and len(str(report_info).strip()) > 20:
-                            # Good response, attach sources if available
-                            try:
-                                # Attempt to retrieve source nodes for attribution
-                                nodes = self.rag_retriever.retrieve_with_metadata_filter(message)
-                                if nodes and len(nodes) > 0:
-                                    sources = []
-                                    for n in nodes[:5]:
-                                        meta = getattr(n, 'metadata', {}) or {}
-                                        section = meta.get('section') or meta.get('title') or meta.get('part') or 'Unknown section'
-                                        ticker = meta.get('ticker') or meta.get('symbol') or ''
-                                        snippet = n.get_content()[:200].replace('\n', ' ')
-                                        src_desc = f"Section: {section}"
-                                        if ticker:
-                                            src_desc += f" (Ticker: {ticker})"
-                                        src_desc += f" — \"{snippet}...\""
-                                        sources.append(src_desc)
-                                    sources_text = "\n".join([f"- {s}" for s in sources])
-                                    report_info = f"{report_info}\n\n**Sources :**\n{sources_text}"
-                            except Exception as src_err:
-                                # If sources can't be fetched, ignore and return original report_info
-                                print(f"Could not fetch source nodes for attribution: {src_err}")
-                    else:
-                            # Empty or too short, try tool
-                            report_info = ""
-                except Exception as rag_error:
-                    print(f"Direct RAG query failed: {rag_error}")
-                    report_info = ""
-                
-                # If RAG didn't work, try tool
-                if not report_info or len(str(report_info).strip()) < 20:
-                    for tool in tools:
-                        tool_name = tool.metadata.name if hasattr(tool, 'metadata') and hasattr(tool.metadata, 'name') else (tool.name if hasattr(tool, 'name') else '')
-                        if 'analyze' in tool_name.lower() or '10k' in tool_name.lower() or 'report' in tool_name.lower():
-                            try:
-                                tool_result = tool.fn(question=message)
-                                if tool_result and len(str(tool_result).strip()) > 20:
-                                    report_info = tool_result
-                                    break
-                            except Exception as e:
-                                print(f"Tool execution error: {e}")
-            except Exception as e:
-                print(f"Error getting report info: {e}")
-                report_info = ""
+            calls.append(('analyze_10k_report', self._report_with_sources, {'question': message}))
+        # The market tools need a ticker symbol
+        if is_market_question and self.ticker:
+            for name, wanted in (
+                ('get_stock_metrics', True),
+                ('get_stock_time_series', is_trend_question),
+            ):
+                tool = self.tools.get(name)
+                if wanted and tool is not None:
+                    calls.append((name, tool.fn, {'symbol': self.ticker}))
+        return calls
+
+    def run_tools_parallel(
+        self, calls: List[Tuple[str, Callable[..., str], dict]]
+    ) -> Dict[str, str]:
+        """
+        Run independent tool calls concurrently, each with its own timeout
+
+        Args:
+            calls: Tool calls (see plan_tool_calls)
+
+        Returns:
+            Result of each tool by name ('' for a failed or timed out call);
+            the whole batch takes as long as the slowest call. Each timeout
+            starts when its call starts running on the shared pool.
+        """
+        executor = get_tool_executor()
+        submitted = time.monotonic()
+        pending = []
+        for name, fn, kwargs in calls:
+            started = {}
+            ready = threading.Event()
+
+            def run(fn=fn, kwargs=kwargs, started=started, ready=ready):
+                started['at'] = time.monotonic()
+                ready.set()
+                return fn(**kwargs)
+
+            # Each call runs in a copy of the caller's context (LLM call budget)
+            pending.append(
+                (name, started, ready, executor.submit(contextvars.copy_context().run, run))
+            )
         
-        # Get market information if relevant
-        if is_market_question:
+        results = {}
+        for name, started, ready, future in pending:
+            # Calls queued behind other sessions' tools are not charged for the wait
+            if not ready.wait(max(0.0, submitted + TOOL_QUEUE_TIMEOUT - time.monotonic())):
+                if future.cancel():
+                    print(f"Tool {name} not started: tool pool busy")
+                    results[name] = ""
+                    continue
+                ready.wait()
+            deadline = started['at'] + TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT)
             try:
-                # Try to extract ticker from context (this could be improved)
-                # For now, we'll skip market data if no ticker is available
-                # The market tools require a ticker symbol
-                pass
+                results[name] = future.result(timeout=max(0.0, deadline - time.monotonic())) or ""
+            except FutureTimeoutError:
+                print(f"Tool {name} timed out")
+                results[name] = ""
             except Exception as e:
-                print(f"Error getting market info: {e}")
+                print(f"Tool {name} failed: {e}")
+                results[name] = ""
+        return results
+
+    def _execute_tools_directly(
+        self, message: str, memory: Optional[ConversationMemory] = None
+    ) -> str:
+        """
+        Execute tools directly without using ReActAgent
+        This is a workaround for LlamaIndex version compatibility issues
+
+        The tools the question needs are called concurrently, then their
+        results are combined in a single LLM call (with the conversation
+        history, if any).
+        """
+        results = self.run_tools_parallel(self.plan_tool_calls(message))
+        report_info = results.get('analyze_10k_report', "")
+        market_info = "\n\n".join(
+            results[name]
+            for name in ('get_stock_metrics', 'get_stock_time_series')
+            if results.get(name)
+        )
         
         # Combine information and generate response
         from llama_index.core.llms import ChatMessage
@@ -276,35 +450,32 @@ Your responses should be:
             context_parts.append(f"**Données de marché :**\n{str(market_info)}")
         
         context = "\n\n".join(context_parts) if context_parts else ""
+        history = memory.render() if memory else ""
+        system_prompt = (
+            f"{self.SYSTEM_PROMPT}\n\n**Historique de la conversation :**\n{history}"
+            if history
+            else self.SYSTEM_PROMPT
+        )
         
         # Create prompt
         if context and len(context.strip()) > 50:
-            prompt = f"{self.SYSTEM_PROMPT}\n\n{context}\n\n**Question de l'utilisateur :** {message}\n\n**Réponse :**"
+            prompt = (
+                f"{system_prompt}\n\n{context}\n\n"
+                f"**Question de l'utilisateur :** {message}\n\n**Réponse :**"
+            )
         else:
             # If no context, try RAG directly with multiple attempts
             rag_response = None
             try:
-                rag_response = self.rag_retriever.query(message)
+                result = self.rag_retriever.query_with_sources(message)
+                rag_response = result.answer
                 if rag_response and len(str(rag_response).strip()) > 50:
-                    # Try to fetch source nodes and append attribution
-                    try:
-                        nodes = self.rag_retriever.retrieve_with_metadata_filter(message)
-                        if nodes and len(nodes) > 0:
-                            sources = []
-                            for n in nodes[:5]:
-                                meta = getattr(n, 'metadata', {}) or {}
-                                section = meta.get('section') or meta.get('title') or meta.get('part') or 'Unknown section'
-                                ticker = meta.get('ticker') or meta.get('symbol') or ''
-                                snippet = n.get_content()[:200].replace('\n', ' ')
-                                src_desc = f"Section: {section}"
-                                if ticker:
-                                    src_desc += f" (Ticker: {ticker})"
-                                src_desc += f" — \"{snippet}...\""
-                                sources.append(src_desc)
-                            sources_text = "\n".join([f"- {s}" for s in sources])
-                            return f"**Réponse basée sur le rapport 10-K :**\n\n{str(rag_response)}\n\n**Sources :**\n{sources_text}"
-                    except Exception as src_err:
-                        print(f"Could not fetch source nodes for attribution: {src_err}")
+                    sources_text = result.format_sources()
+                    if sources_text:
+                        return (
+                            f"**Réponse basée sur le rapport 10-K :**\n\n{str(rag_response)}"
+                            f"\n\n**Sources :**\n{sources_text}"
+                        )
                     return f"**Réponse basée sur le rapport 10-K :**\n\n{str(rag_response)}"
             except Exception as e:
                 print(f"RAG query error: {e}")
@@ -313,7 +484,9 @@ Your responses should be:
             if not rag_response or len(str(rag_response).strip()) < 50:
                 return "❌ **Aucune information trouvée**\n\nJe n'ai pas pu trouver d'informations pertinentes dans le rapport 10-K pour répondre à votre question.\n\n**Suggestions :**\n1. Vérifiez que le rapport 10-K a été correctement chargé dans l'onglet 'Explorateur de Documents'\n2. Reformulez votre question avec des termes plus spécifiques\n3. Essayez des questions comme :\n   - 'Quels sont les principaux risques de cette entreprise ?'\n   - 'Quelle est la stratégie de l'entreprise ?'\n   - 'Quels sont les revenus de cette entreprise ?'"
             
-            prompt = f"{self.SYSTEM_PROMPT}\n\n**Question de l'utilisateur :** {message}\n\n**Réponse :**"
+            prompt = (
+                f"{system_prompt}\n\n**Question de l'utilisateur :** {message}\n\n**Réponse :**"
+            )
         
         # Get response from LLM
         try:
@@ -322,7 +495,14 @@ Your responses should be:
                 ChatMessage(role="user", content=message)
             ]
             
-            if hasattr(self.llm, 'chat'):
+            if current_stream() is not None and hasattr(self.llm, 'stream_chat'):
+                # Relay the answer tokens as they are generated
+                parts = []
+                for chunk in self.llm.stream_chat(messages):
+                    emit_token(chunk.delta or "")
+                    parts.append(chunk.delta or "")
+                return "".join(parts)
+            elif hasattr(self.llm, 'chat'):
                 response = self.llm.chat(messages)
                 return self._extract_response_text(response)
             elif hasattr(self.llm, 'complete'):
@@ -335,79 +515,71 @@ Your responses should be:
                 return f"**Réponse basée sur le rapport 10-K :**\n\n{str(report_info)}"
             return f"Erreur lors de la génération de la réponse: {str(e)}"
     
-    def chat(self, message: str) -> str:
+    def chat(self, message: str, memory: Optional[ConversationMemory] = None) -> str:
         """
         Chat with the agent
         
+        The message goes through the fast path, then the agent backend. If
+        the backend fails or answers nothing, the tools are executed directly,
+        once, and only if the LLM call budget of the message still covers it.
+
         Args:
             message: User message/question
+            memory: Conversation history of the session (not modified; the
+                caller records the turn)
             
         Returns:
             Agent response
         """
+        budget = LLMCallBudget(self.max_llm_calls)
+        with budget.activate():
+            return self._chat(message, memory, budget)
+
+    def _agent_iterations(self, budget: LLMCallBudget) -> int:
+        """Agent steps that leave room for the final answer and the fallback"""
+        return max(1, budget.remaining - DIRECT_TOOLS_LLM_CALLS - 1)
+
+    def _chat(
+        self, message: str, memory: Optional[ConversationMemory], budget: LLMCallBudget
+    ) -> str:
         try:
-            # Method 1: Try AgentChatEngine first (if available)
-            if self.chat_engine is not None:
+            # Fast path: simple lookups skip the agent loop
+            fast_answer = self.answer_fast(message)
+            if fast_answer is not None:
+                return fast_answer
+
+            if self.backend is not None:
                 try:
-                    if hasattr(self.chat_engine, 'chat'):
-                        response = self.chat_engine.chat(message)
-                        return self._extract_response_text(response)
-                    elif hasattr(self.chat_engine, 'stream_chat'):
-                        response_parts = []
-                        for chunk in self.chat_engine.stream_chat(message):
-                            response_parts.append(self._extract_response_text(chunk))
-                        return ''.join(response_parts)
+                    answer = self.backend.call(
+                        message, memory, max_iterations=self._agent_iterations(budget)
+                    )
+                    if answer and answer.strip():
+                        return answer
+                    print(f"Agent backend {self.backend.name} returned an empty answer")
                 except Exception as e:
-                    print(f"AgentChatEngine failed: {e}, using direct tool execution...")
-            
-            # Method 2: Try ReActAgent methods (if available)
-            if self.agent is not None:
-                # Try standard methods first
-                for method_name in ['run', 'query', 'chat', 'stream_chat', 'stream_query']:
-                    if hasattr(self.agent, method_name):
-                        try:
-                            method = getattr(self.agent, method_name)
-                            if asyncio.iscoroutinefunction(method):
-                                response = self._run_with_event_loop(method(message))
-                            else:
-                                response = method(message)
-                            
-                            # Handle streaming responses
-                            if hasattr(response, '__iter__') and not isinstance(response, str):
-                                response_parts = []
-                                for chunk in response:
-                                    response_parts.append(self._extract_response_text(chunk))
-                                return ''.join(response_parts)
-                            
-                            return self._extract_response_text(response)
-                        except Exception as e:
-                            error_str = str(e).lower()
-                            if 'not callable' not in error_str and 'event loop' not in error_str:
-                                continue  # Try next method
-                            if 'event loop' in error_str:
-                                try:
-                                    if asyncio.iscoroutinefunction(method):
-                                        response = asyncio.run(method(message))
-                                    else:
-                                        response = method(message)
-                                    return self._extract_response_text(response)
-                                except:
-                                    continue
-            
-            # Method 3: Use direct tool execution (workaround for LlamaIndex compatibility)
-            print("Using direct tool execution (ReActAgent not compatible)")
-            return self._execute_tools_directly(message)
+                    print(f"Agent backend {self.backend.name} failed: {e}")
+
+                if not budget.allows(DIRECT_TOOLS_LLM_CALLS):
+                    print(f"LLM call budget spent ({budget.used}/{budget.max_calls}), no fallback")
+                    return BUDGET_EXHAUSTED_MESSAGE
+                print("Falling back to direct tool execution")
+                reset_answer()
             
+            return self._execute_tools_directly(message, memory)
+
+        except LLMBudgetExceeded:
+            return BUDGET_EXHAUSTED_MESSAGE
         except Exception as e:
             error_msg = str(e)
             print(f"Chat error: {error_msg}")
             # Try direct RAG as last resort
-            try:
-                rag_response = self.rag_retriever.query(message)
-                if rag_response:
-                    return f"**Réponse basée sur le rapport 10-K :**\n\n{str(rag_response)}"
-            except:
-                pass
+            if budget.allows(1):
+                try:
+                    rag_response = self.rag_retriever.query(message)
+                    if rag_response:
+                        return f"**Réponse basée sur le rapport 10-K :**\n\n{str(rag_response)}"
+                except Exception:
+                    pass
             
             if 'event loop' in error_msg.lower():
                 return f"Erreur technique : Problème de gestion asynchrone. Veuillez réessayer ou contacter le support. Détails: {error_msg}"
@@ -415,56 +587,36 @@ Your responses should be:
     
     def _extract_response_text(self, response) -> str:
         """Extract text from various response object types"""
-        if isinstance(response, str):
-            return response
-        
-        # Try common response attributes
-        if hasattr(response, 'response'):
-            return str(response.response)
-        if hasattr(response, 'output'):
-            return str(response.output)
-        if hasattr(response, 'text'):
-            return str(response.text)
-        if hasattr(response, 'message'):
-            return str(response.message)
-        if hasattr(response, 'source_nodes'):
-            # It's a Response object, try to get the response text
-            return str(response)
-        
-        # Last resort: convert to string
-        return str(response)
+        return response_text(response)
     
-    def stream_chat(self, message: str):
+    def stream_chat(
+        self, message: str, memory: Optional[ConversationMemory] = None
+    ) -> Iterator[Optional[StreamEvent]]:
         """
         Stream chat response (for real-time UI updates)
         
+        The answer is computed by chat() on the stream pool; tool progress
+        and answer tokens are yielded as they are produced.
+
         Args:
             message: User message/question
+            memory: Conversation history of the session
             
         Yields:
-            Response chunks
+            STATUS, TOKEN and RESET events, then DONE (with the complete
+            answer) or ERROR; None after STREAM_KEEPALIVE seconds without event
         """
-        try:
-            if hasattr(self.agent, 'stream_chat'):
-                response_stream = self.agent.stream_chat(message)
-                for chunk in response_stream:
-                    if hasattr(chunk, 'response'):
-                        yield str(chunk.response)
-                    else:
-                        yield str(chunk)
-            elif hasattr(self.agent, 'stream_query'):
-                response_stream = self.agent.stream_query(message)
-                for chunk in response_stream:
-                    if hasattr(chunk, 'response'):
-                        yield str(chunk.response)
-                    else:
-                        yield str(chunk)
-            else:
-                # Fallback: use regular query and yield as single chunk
-                response = self.chat(message)
-                yield response
-        except Exception as e:
-            yield f"Error: {str(e)}"
+        stream = AnswerStream()
+
+        def answer():
+            with stream.activate():
+                try:
+                    stream.put(StreamEvent(DONE, self.chat(message, memory)))
+                except Exception as e:
+                    stream.put(StreamEvent(ERROR, f"Error: {str(e)}"))
+
+        get_stream_executor().submit(answer)
+        yield from stream.events(timeout=STREAM_KEEPALIVE)
     
     def reset(self):
         """Reset agent conversation history"""
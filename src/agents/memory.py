@@ -0,0 +1,250 @@
+"""
+Per-conversation memory: a token-bounded window of recent turns plus a summary of older ones
+"""
+import re
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from llama_index.core.llms import LLM, ChatMessage
+from llama_index.core.utils import get_tokenizer
+
+# summarizer(previous summary, turns folded out of the window) -> new summary
+Summarizer = Callable[[str, List[Tuple[str, str]]], str]
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text if len(text) <= limit else f"{text[:limit].rstrip()}…"
+
+
+def extractive_summary(summary: str, turns: List[Tuple[str, str]]) -> str:
+    """Summary without LLM: one line per folded turn (question and start of the answer)"""
+    lines = [summary] if summary else []
+    lines += [
+        f"- Q : {_shorten(question, 150)} / R : {_shorten(answer, 250)}"
+        for question, answer in turns
+    ]
+    return "\n".join(lines)
+
+
+def llm_summarizer(llm: LLM) -> Summarizer:
+    """
+    Summarizer using an LLM (falls back to the extractive summary on error)
+
+    Args:
+        llm: LLM instance
+
+    Returns:
+        Summarizer function
+    """
+    def summarize(summary: str, turns: List[Tuple[str, str]]) -> str:
+        exchanges = "\n".join(f"Utilisateur : {q}\nAssistant : {a}" for q, a in turns)
+        prompt = (
+            "Mettez à jour le résumé de cette conversation sur une entreprise cotée, "
+            "en quelques phrases, "
+            "en gardant les faits, chiffres et sujets abordés.\n\n"
+            f"Résumé actuel :\n{summary or '(vide)'}\n\n"
+            f"Nouveaux échanges :\n{exchanges}\n\n"
+            "Résumé mis à jour :"
+        )
+        try:
+            return str(llm.complete(prompt)).strip()
+        except Exception as e:
+            print(f"Conversation summary failed: {e}")
+            return extractive_summary(summary, turns)
+    return summarize
+
+
+# Threads folding old turns into conversation summaries (LLM calls off the request path)
+_summary_executor = None
+_summary_executor_lock = threading.Lock()
+
+
+def get_summary_executor() -> ThreadPoolExecutor:
+    """Get the process-wide pool running conversation summaries"""
+    global _summary_executor
+    with _summary_executor_lock:
+        if _summary_executor is None:
+            _summary_executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="conversation-summary"
+            )
+        return _summary_executor
+
+
+class ConversationMemory:
+    """
+    Memory of one conversation, injected into the shared (stateless) agent
+    on each request.
+
+    Recent turns are kept verbatim (answers capped at max_turn_tokens) as
+    long as they fit in token_budget; older turns are folded into a running
+    summary capped at summary_token_budget, so the history added to a prompt
+    stays bounded however long the conversation gets.
+
+    With an executor, the summary is updated in the background: add_turn()
+    returns at once and folded turns are shown as extractive lines until the
+    summary includes them. One summary update runs at a time per memory, so
+    concurrent turns never overwrite each other's summary.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        summary_token_budget: int = 300,
+        max_turn_tokens: int = 400,
+        tokenizer: Optional[Callable[[str], List]] = None,
+        summarizer: Optional[Summarizer] = None,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Initialize an empty memory
+
+        Args:
+            token_budget: Maximum tokens of the recent turns window
+            summary_token_budget: Maximum tokens of the summary of older turns
+            max_turn_tokens: Maximum tokens kept of each answer
+            tokenizer: Tokenizer used to count tokens (defaults to LlamaIndex's)
+            summarizer: Folds older turns into the summary (default: extractive)
+            executor: Runs the summarizer in the background (None: in add_turn)
+        """
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.max_turn_tokens = max_turn_tokens
+        self.summarizer = summarizer or extractive_summary
+        self.executor = executor
+        self._tokenizer = tokenizer or get_tokenizer()
+        self._lock = threading.Lock()
+        # Held across read / summarize / write of the summary
+        self._summary_lock = threading.Lock()
+        self.summary = ""
+        self._turns: List[Tuple[str, str, int]] = []
+        # Turns folded out of the window, not yet in the summary
+        self._pending: List[Tuple[str, str]] = []
+        # Bumped by clear(): an update started before is dropped
+        self._generation = 0
+
+    def _count(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _cap(self, text: str, max_tokens: int) -> str:
+        """Cut a text to about max_tokens (proportionally, on characters)"""
+        tokens = self._count(text)
+        if tokens <= max_tokens:
+            return text
+        return f"{text[:max(1, len(text) * max_tokens // tokens)].rstrip()}…"
+
+    @property
+    def turns(self) -> List[Tuple[str, str]]:
+        """Recent (question, answer) turns, oldest first"""
+        with self._lock:
+            return [(question, answer) for question, answer, _ in self._turns]
+
+    def _summary_locked(self) -> str:
+        """Summary including the folded turns not summarized yet"""
+        if not self._pending:
+            return self.summary
+        return extractive_summary(self.summary, self._pending)
+
+    @property
+    def token_count(self) -> int:
+        """Tokens of the history (summary and recent turns)"""
+        with self._lock:
+            return self._count(self._summary_locked()) + sum(tokens for _, _, tokens in self._turns)
+
+    def add_turn(self, question: str, answer: str):
+        """
+        Record a turn; older turns beyond the window are folded into the summary
+
+        Args:
+            question: User message
+            answer: Assistant answer
+        """
+        answer = self._cap(str(answer), self.max_turn_tokens)
+        with self._lock:
+            self._turns.append((question, answer, self._count(question) + self._count(answer)))
+            folded = False
+            while (
+                len(self._turns) > 1
+                and sum(tokens for _, _, tokens in self._turns) > self.token_budget
+            ):
+                question_, answer_, _ = self._turns.pop(0)
+                self._pending.append((question_, answer_))
+                folded = True
+        if not folded:
+            return
+        if self.executor is not None:
+            self.executor.submit(self.update_summary)
+        else:
+            self.update_summary()
+
+    def update_summary(self):
+        """Fold the pending turns into the summary (may call an LLM)"""
+        with self._summary_lock:
+            with self._lock:
+                folded = list(self._pending)
+                summary = self.summary
+                generation = self._generation
+            if not folded:
+                # An earlier update already took them
+                return
+            summary = self.summarizer(summary, folded)
+            if self._count(summary) > self.summary_token_budget:
+                # Keep the most recent part of an extractive summary
+                lines = summary.splitlines()
+                while len(lines) > 1 and self._count("\n".join(lines)) > self.summary_token_budget:
+                    lines.pop(0)
+                summary = self._cap("\n".join(lines), self.summary_token_budget)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self.summary = summary
+                del self._pending[:len(folded)]
+
+    def clear(self):
+        """Forget the conversation"""
+        with self._lock:
+            self.summary = ""
+            self._turns = []
+            self._pending = []
+            self._generation += 1
+
+    def size_bytes(self) -> int:
+        """Approximate memory used by the stored text"""
+        with self._lock:
+            return len(self.summary.encode('utf-8')) + sum(
+                len(q.encode('utf-8')) + len(a.encode('utf-8'))
+                for q, a, *_ in self._turns + self._pending
+            )
+
+    def to_chat_messages(self) -> List[ChatMessage]:
+        """History as chat messages (summary as a system message, then the recent turns)"""
+        with self._lock:
+            messages = []
+            summary = self._summary_locked()
+            if summary:
+                messages.append(
+                    ChatMessage(
+                        role="system", content=f"Résumé de la conversation précédente :\n{summary}"
+                    )
+                )
+            for question, answer, _ in self._turns:
+                messages.append(ChatMessage(role="user", content=question))
+                messages.append(ChatMessage(role="assistant", content=answer))
+            return messages
+
+    def render(self) -> str:
+        """History as text for single-prompt LLM calls ('' if empty)"""
+        with self._lock:
+            parts = []
+            summary = self._summary_locked()
+            if summary:
+                parts.append(f"Résumé de la conversation précédente :\n{summary}")
+            if self._turns:
+                parts.append(
+                    "Échanges récents :\n"
+                    + "\n".join(
+                        f"Utilisateur : {question}\nAssistant : {answer}"
+                        for question, answer, _ in self._turns
+                    )
+                )
+            return "\n\n".join(parts)
@@ -0,0 +1,296 @@
+"""
+Intent router: answers simple lookups without the ReAct loop
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Intents
+MARKET = 'market'
+TREND = 'trend'
+REPORT = 'report'
+OPEN = 'open'
+
+# Metric line of get_stock_metrics -> patterns of questions asking for it
+MARKET_FIELDS = {
+    'Current Price': r'\b(prix|cours|cotation|price|quote|vaut)\b',
+    'Change': r'\b(variation|change)\b',
+    'Volume': (
+        r"(\bvolumes? (d.echanges?|echanges?|de transactions?|negocies?|de l.action|du titre)\b|"
+        r"\btrading volume|\bvolume boursier)"
+    ),
+    'Market Cap': r'\b(capitalisation|market cap|valorisation)\b',
+    'PE Ratio': r'(\bp\s*/\s*e\b|\bpe\b|\bper\b|price.to.earnings)',
+    'EPS': r'(\beps\b|benefice par action)',
+    # "rendement" alone is often a 10-K ratio ("rendement des capitaux propres")
+    'Dividend Yield': (
+        r"(\b(dividendes?|dividend)\b|"
+        r"\brendement (du |de l.)?(dividende|action|titre|boursier)|"
+        r"\brendement (de|du) \w+ en bourse)"
+    ),
+    '52 Week High': r'(plus haut|52.(semaines|weeks?).*haut|52.week high)',
+    '52 Week Low': r'(plus bas|52.(semaines|weeks?).*bas|52.week low)',
+    'Beta': r'\bbeta\b',
+    'Sector': r"(\bsecteur (d.activite )?(de l.action|du titre)\b|\b(stock|share) sector\b)",
+    'Industry': r"(\bindustrie (de l.action|du titre)\b|\b(stock|share) industry\b)",
+}
+
+# "au cours de" means "during", not the stock price: replaced before matching
+DURING_PATTERN = r"\bau cours (d(e|u|es)\b|d\W)"
+
+# Words that name a metric only in a market context ("volume des ventes",
+# "secteur automobile" are 10-K topics): without one, the agent decides
+AMBIGUOUS_MARKET_PATTERN = r'\b(volumes?|secteurs?|sectors?|industries?|industry)\b'
+
+# Ticker-like words (written in capitals) and well-known company names
+TICKER_WORD_PATTERN = r'\b[A-Z]{2,5}(?:\.[A-Z])?\b'
+NOT_TICKERS = {
+    'PE', 'PER', 'EPS', 'BPA', 'RSI', 'SMA', 'EMA', 'MACD', 'ROE', 'ROA', 'TTM', 'YTD', 'IPO',
+    'ETF', 'CEO', 'CFO', 'PDG', 'USD', 'EUR', 'US', 'USA', 'SEC', 'IA', 'AI', 'MDA', 'EBIT', 'OK',
+    'CA', 'PIB', 'TVA', 'FCF', 'ESG', 'GAAP', 'NYSE',
+}
+COMPANY_TICKERS = {
+    'apple': 'AAPL', 'microsoft': 'MSFT', 'alphabet': 'GOOGL', 'google': 'GOOGL', 'amazon': 'AMZN',
+    'meta': 'META', 'facebook': 'META', 'nvidia': 'NVDA', 'tesla': 'TSLA', 'netflix': 'NFLX',
+    'intel': 'INTC', 'amd': 'AMD', 'ibm': 'IBM', 'oracle': 'ORCL', 'salesforce': 'CRM',
+    'adobe': 'ADBE', 'coca-cola': 'KO', 'pepsico': 'PEP', 'walmart': 'WMT', 'disney': 'DIS',
+    'boeing': 'BA', 'jpmorgan': 'JPM', 'mastercard': 'MA', 'exxon': 'XOM',
+}
+
+TREND_PATTERN = (
+    r'\b(tendance|historique|evolution|rsi|sma|moyenne mobile|indicateurs?|graphique|trend)\b'
+)
+
+# 10-K section -> patterns of questions answered from it (most specific first)
+REPORT_SECTIONS = [
+    ('Item 7A', r'(risques? de marche|market risk)'),
+    ('Item 1A', r'\b(risques?|facteurs de risque|risk factors?|menaces?)\b'),
+    ('Item 7', r'(\bmd&a\b|discussion de la direction|management.s discussion'
+               r'|resultats d.exploitation)'),
+    ('Item 8', r'(etats financiers|financial statements|bilan)'),
+    ('Item 1', r'(\bactivites?\b|description de l.entreprise|modele economique|business model)'),
+]
+
+# Other questions answered from the 10-K (no single section)
+REPORT_PATTERN = (
+    r"(\b(strategie|rapport|annuel|revenus?|concurrents?|concurrence|croissance|gouvernance|"
+    r"dirigeants|employes|produits)\b|10-k|chiffre d.affaires)"
+)
+
+# Questions comparing companies (their tickers may not be loaded yet)
+COMPARISON_PATTERN = r'\b(compar\w*|versus|vs|face a|par rapport a|contre)\b'
+
+# Questions that need reasoning, comparison or advice go to the agent
+OPEN_PATTERN = (
+    r'\b(pourquoi|comment|compar\w*|versus|vs|analys\w*|expliqu\w*|recommand\w*|devrais|'
+    r'conseil\w*|prevision\w*|predi\w*|pense[sz]?|avis|impact|why|how|should|explain)\b'
+)
+
+# Longer messages are rarely simple lookups
+MAX_LOOKUP_WORDS = 20
+
+# Seed examples of the local classifier, for questions the rules do not catch
+TRAINING_EXAMPLES = [
+    (MARKET, "combien coute l'action"),
+    (MARKET, "a combien se negocie le titre"),
+    (MARKET, "valeur actuelle de l'action"),
+    (MARKET, "quel est le ratio cours benefice"),
+    (MARKET, "combien vaut l'entreprise en bourse"),
+    (MARKET, "donnees de marche du titre"),
+    (MARKET, "metriques boursieres"),
+    (TREND, "le titre a t il monte ce mois ci"),
+    (TREND, "performance de l'action sur 30 jours"),
+    (TREND, "le cours a baisse recemment"),
+    (TREND, "mouvement du titre ces dernieres semaines"),
+    (REPORT, "que dit le rapport annuel"),
+    (REPORT, "resume du 10-k"),
+    (REPORT, "quels sont les principaux produits de l'entreprise"),
+    (REPORT, "quels sont les revenus de l'entreprise"),
+    (REPORT, "qui sont les concurrents"),
+    (REPORT, "quelle est la strategie de l'entreprise"),
+    (OPEN, "faut il acheter cette action"),
+    (OPEN, "quel est le meilleur investissement"),
+    (OPEN, "que se passerait il si les taux montaient"),
+    (OPEN, "donne moi une synthese complete de la situation"),
+    (OPEN, "bonjour"),
+    (OPEN, "merci"),
+]
+
+
+def normalize(text: str) -> str:
+    """Lowercase text without accents"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def mentioned_tickers(message: str) -> List[str]:
+    """
+    Companies a message names, as tickers, in order of mention
+
+    Args:
+        message: User question
+
+    Returns:
+        Tickers written in capitals ("MSFT") and tickers of known company
+        names ("Microsoft")
+    """
+    found = []
+    for word in re.findall(TICKER_WORD_PATTERN, message):
+        if word not in NOT_TICKERS and word not in found:
+            found.append(word)
+    text = normalize(message)
+    for name, ticker in COMPANY_TICKERS.items():
+        if re.search(rf'\b{re.escape(name)}\b', text) and ticker not in found:
+            found.append(ticker)
+    return found
+
+
+def compared_tickers(message: str) -> List[str]:
+    """
+    Companies a comparison question names, as tickers
+
+    Capitalized words are only taken for tickers in a comparison ("compare
+    AAPL et MSFT"), where a wrong guess costs a failed ingestion job.
+
+    Args:
+        message: User question
+
+    Returns:
+        Tickers of mentioned_tickers(), or [] if the message compares nothing
+    """
+    if not re.search(COMPARISON_PATTERN, normalize(message)):
+        return []
+    return mentioned_tickers(message)
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", normalize(text))
+
+
+class NaiveBayesClassifier:
+    """Small multinomial Naive Bayes over words (Laplace smoothing)"""
+
+    def __init__(self, examples: List[Tuple[str, str]]):
+        """
+        Train the classifier
+
+        Args:
+            examples: (label, text) pairs
+        """
+        self._counts: Dict[str, Counter] = {}
+        labels = Counter()
+        for label, text in examples:
+            labels[label] += 1
+            self._counts.setdefault(label, Counter()).update(_tokens(text))
+        total = sum(labels.values())
+        self._log_priors = {label: math.log(count / total) for label, count in labels.items()}
+        self._vocabulary = set().union(*self._counts.values())
+        self._totals = {label: sum(counts.values()) for label, counts in self._counts.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely label of a text and its probability"""
+        tokens = [t for t in _tokens(text) if t in self._vocabulary]
+        size = len(self._vocabulary)
+        scores = {}
+        for label, log_prior in self._log_priors.items():
+            counts, total = self._counts[label], self._totals[label]
+            scores[label] = log_prior + sum(
+                math.log((counts[t] + 1) / (total + size)) for t in tokens
+            )
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / norm
+
+
+@dataclass
+class Route:
+    """Routing decision of a message"""
+    intent: str
+    confidence: float = 1.0
+    fields: List[str] = field(default_factory=list)
+    section: Optional[str] = None
+    tickers: List[str] = field(default_factory=list)
+
+    @property
+    def is_fast(self) -> bool:
+        """True if the message can be answered without the agent"""
+        return self.intent != OPEN
+
+
+class IntentRouter:
+    """
+    Routes a question to a fast path or to the agent.
+
+    Keyword/regex rules recognize pure market-data questions (price, P/E...),
+    trend questions and single-section 10-K lookups; a small local classifier
+    handles phrasings the rules miss. Questions mixing intents, asking for
+    reasoning or advice, or that are long stay with the LLM agent.
+    """
+
+    def __init__(
+        self, min_confidence: float = 0.6, classifier: Optional[NaiveBayesClassifier] = None
+    ):
+        """
+        Initialize the router
+
+        Args:
+            min_confidence: Minimum classifier probability to take a fast path
+            classifier: Classifier used when no rule matches (defaults to the seed examples)
+        """
+        self.min_confidence = min_confidence
+        self.classifier = classifier or NaiveBayesClassifier(TRAINING_EXAMPLES)
+
+    def route(self, message: str) -> Route:
+        """
+        Route a message
+
+        Args:
+            message: User question
+
+        Returns:
+            Route with the intent, the metric fields or the 10-K section asked
+            for, and the companies named (the caller checks they are its own)
+        """
+        text = re.sub(DURING_PATTERN, "pendant ", normalize(message)).strip()
+        tickers = mentioned_tickers(message)
+        if not text or len(text.split()) > MAX_LOOKUP_WORDS or re.search(OPEN_PATTERN, text):
+            return Route(OPEN, tickers=tickers)
+
+        fields = [name for name, pattern in MARKET_FIELDS.items() if re.search(pattern, text)]
+        if re.search(AMBIGUOUS_MARKET_PATTERN, text) and not any(
+            name in fields for name in ('Volume', 'Sector', 'Industry')
+        ):
+            return Route(OPEN, tickers=tickers)
+        is_trend = bool(re.search(TREND_PATTERN, text))
+        section = next(
+            (name for name, pattern in REPORT_SECTIONS if re.search(pattern, text)), None
+        )
+        is_report = bool(section or re.search(REPORT_PATTERN, text))
+
+        matched = [
+            intent
+            for intent, hit in (
+                (MARKET, fields and not is_trend),
+                (TREND, is_trend),
+                (REPORT, is_report),
+            )
+            if hit
+        ]
+        if len(matched) == 1:
+            return Route(
+                matched[0],
+                fields=fields if matched[0] == MARKET else [],
+                section=section,
+                tickers=tickers,
+            )
+        if matched:
+            # Mixed questions need the agent to combine several sources
+            return Route(OPEN, tickers=tickers)
+
+        intent, confidence = self.classifier.predict(text)
+        if confidence < self.min_confidence:
+            return Route(OPEN, confidence=confidence, tickers=tickers)
+        return Route(intent, confidence=confidence, tickers=tickers)
@@ -0,0 +1,135 @@
+"""
+Relay of agent progress (tool status, answer tokens) to a streaming HTTP response
+"""
+import queue
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, Optional
+
+STATUS = "status"
+TOKEN = "token"
+RESET = "reset"  # discard the tokens sent so far (the answer is restarted)
+DONE = "done"
+ERROR = "error"
+
+
+@dataclass
+class StreamEvent:
+    """One event of an answer stream"""
+    type: str
+    text: str = ""
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+# Stream of the message being answered (None: nobody listens)
+_current_stream: ContextVar[Optional["AnswerStream"]] = ContextVar("answer_stream", default=None)
+
+
+class AnswerStream:
+    """
+    Thread-safe queue of the events produced while answering one message.
+
+    While active (see activate()), emit_status() and emit_token() calls made
+    in the same context - including the background event loop and the tool
+    pool threads - are queued; the HTTP response reads them with events().
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[StreamEvent]" = queue.Queue()
+        self.tokens = 0
+
+    def put(self, event: StreamEvent):
+        """Queue an event"""
+        if event.type == TOKEN:
+            self.tokens += 1
+        elif event.type == RESET:
+            self.tokens = 0
+        self._queue.put(event)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[StreamEvent]:
+        """Next event, or None if none arrived within timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[Optional[StreamEvent]]:
+        """
+        Events until the DONE or ERROR event (included)
+
+        Args:
+            timeout: Seconds to wait for each event; None is yielded when it
+                expires (lets the caller send a keep-alive)
+        """
+        while True:
+            event = self.get(timeout=timeout)
+            yield event
+            if event is not None and event.type in (DONE, ERROR):
+                return
+
+    @contextmanager
+    def activate(self):
+        """Relay the events emitted in this context to this stream"""
+        token = _current_stream.set(self)
+        try:
+            yield self
+        finally:
+            _current_stream.reset(token)
+
+
+def current_stream() -> Optional[AnswerStream]:
+    """Stream of the message being answered, if any"""
+    return _current_stream.get()
+
+
+def emit_status(text: str):
+    """Report a progress step (e.g. a tool call) to the active stream, if any"""
+    stream = _current_stream.get()
+    if stream is not None:
+        stream.put(StreamEvent(STATUS, text))
+
+
+def emit_token(text: str):
+    """Send a piece of the answer to the active stream, if any"""
+    stream = _current_stream.get()
+    if stream is not None and text:
+        stream.put(StreamEvent(TOKEN, text))
+
+
+def reset_answer():
+    """Discard the answer tokens already streamed (before a fallback answer)"""
+    stream = _current_stream.get()
+    if stream is not None and stream.tokens:
+        stream.put(StreamEvent(RESET))
+
+
+class ReActAnswerFilter:
+    """
+    Keeps the final answer out of streamed ReAct output.
+
+    ReAct steps stream "Thought: ... Action: ..." text; only what follows
+    "Answer:" is meant for the user. feed() takes the cumulative text of the
+    current LLM call and returns the new answer characters.
+    """
+
+    MARKER = "Answer:"
+
+    def __init__(self):
+        self._text = ""
+        self._sent = 0
+
+    def feed(self, response: str) -> str:
+        if not response.startswith(self._text):
+            # New LLM call (next reasoning step)
+            self._sent = 0
+        self._text = response
+        start = response.find(self.MARKER)
+        if start < 0:
+            return ""
+        answer = response[start + len(self.MARKER):].lstrip()
+        delta = answer[self._sent:]
+        self._sent = len(answer)
+        return delta
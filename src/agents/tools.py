@@ -1,88 +1,88 @@
 """
 Tools for the financial agent
 """
-from typing import Dict, Optional
-from llama_index.core.tools import FunctionTool
+import threading
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from llama_index.core.tools import FunctionTool, ToolMetadata
 from llama_index.core.llms import LLM
 from src.data.alpha_vantage import AlphaVantageClient
 from src.rag.retrieval import AdvancedRAGRetriever
+from src.agents.streaming import emit_status
 
 
-def create_financial_report_tool(
-    rag_retriever: AdvancedRAGRetriever,
+@dataclass(frozen=True)
+class ToolContext:
+    """Per-agent objects the tools act on"""
+    rag_retriever: AdvancedRAGRetriever
+    alpha_vantage_client: AlphaVantageClient
     llm: Optional[LLM] = None
-) -> FunctionTool:
+
+
+def report_search_status(section: Optional[str] = None) -> str:
+    """Progress message of a 10-K search"""
+    if section:
+        return f"Recherche dans le rapport 10-K ({section})…"
+    return "Recherche dans le rapport 10-K…"
+
+
+def analyze_10k_report(context: ToolContext, question: str, section: Optional[str] = None) -> str:
     """
-    Create a tool for analyzing financial reports using RAG
+    Use this tool to answer qualitative questions about the company's strategy,
+    risks, and performance based on their annual report (10-K).
     
     Args:
-        rag_retriever: AdvancedRAGRetriever instance
-        llm: Optional LLM for synthesis
+        context: Bound tool context (not exposed to the LLM)
+        question: The question to ask about the financial report
+        section: Optional section filter (e.g., 'Item 1A' for Risk Factors)
         
     Returns:
-        FunctionTool instance
+        Answer based on the financial report
     """
-    def analyze_10k_report(question: str, section: Optional[str] = None) -> str:
-        """
-        Use this tool to answer qualitative questions about the company's strategy, 
-        risks, and performance based on their annual report (10-K).
-        
-        Args:
-            question: The question to ask about the financial report
-            section: Optional section filter (e.g., 'Item 1A' for Risk Factors)
-            
-        Returns:
-            Answer based on the financial report
-        """
-        metadata_filters = None
-        if section:
-            metadata_filters = {'section': section}
-        
-        response = rag_retriever.query(
-            query=question,
-            metadata_filters=metadata_filters
-        )
-        return response
+    emit_status(report_search_status(section))
+    metadata_filters = None
+    if section:
+        metadata_filters = {'section': section}
     
-    return FunctionTool.from_defaults(
-        fn=analyze_10k_report,
-        name="analyze_10k_report",
-        description="""Use this tool to answer qualitative questions about the company's 
-        strategy, risks, and performance based on their annual report (10-K). 
-        You can optionally filter by section (e.g., 'Item 1A' for Risk Factors)."""
+    response = context.rag_retriever.query(
+        query=question,
+        metadata_filters=metadata_filters
+    )
+    return response
+
+
+async def aanalyze_10k_report(
+    context: ToolContext, question: str, section: Optional[str] = None
+) -> str:
+    """Async analyze_10k_report, used when the agent runs tools asynchronously"""
+    emit_status(report_search_status(section))
+    metadata_filters = {'section': section} if section else None
+    return await context.rag_retriever.aquery(
+        query=question,
+        metadata_filters=metadata_filters
     )
 
 
-def create_market_data_tool(alpha_vantage_client: AlphaVantageClient) -> FunctionTool:
+def get_stock_metrics(context: ToolContext, symbol: str) -> str:
     """
-    Create a tool for retrieving market data
+    Use this tool to get the current stock price, PE ratio, market cap,
+    and other key financial metrics for a company.
     
     Args:
-        alpha_vantage_client: AlphaVantageClient instance
+        context: Bound tool context (not exposed to the LLM)
+        symbol: Stock ticker symbol (e.g., 'AAPL', 'MSFT')
         
     Returns:
-        FunctionTool instance
+        Formatted string with stock metrics
     """
-    def get_stock_metrics(symbol: str) -> str:
-        """
-        Use this tool to get the current stock price, PE ratio, market cap, 
-        and other key financial metrics for a company.
+    emit_status(f"Récupération des données de marché de {symbol}…")
+    try:
+        # Get quote and company overview (requested concurrently)
+        quote, overview = context.alpha_vantage_client.get_quote_and_overview(symbol)
         
-        Args:
-            symbol: Stock ticker symbol (e.g., 'AAPL', 'MSFT')
-            
-        Returns:
-            Formatted string with stock metrics
-        """
-        try:
-            # Get quote
-            quote = alpha_vantage_client.get_quote(symbol)
-            
-            # Get company overview
-            overview = alpha_vantage_client.get_company_overview(symbol)
-            
-            # Format response
-            metrics = f"""
+        # Format response
+        metrics = f"""
 Stock Metrics for {symbol}:
 - Current Price: ${quote['price']:.2f}
 - Change: {quote['change']:.2f} ({quote['change_percent']})
@@ -97,73 +97,202 @@ Stock Metrics for {symbol}:
 - Sector: {overview.get('sector', 'N/A')}
 - Industry: {overview.get('industry', 'N/A')}
 """
-            return metrics.strip()
-            
-        except Exception as e:
-            return f"Error retrieving market data for {symbol}: {str(e)}"
+        return metrics.strip()
+
+    except Exception as e:
+        return f"Error retrieving market data for {symbol}: {str(e)}"
+
+
+def get_stock_time_series(context: ToolContext, symbol: str, days: int = 30) -> str:
+    """
+    Use this tool to get historical stock price data and technical indicators.
     
-    def get_stock_time_series(symbol: str, days: int = 30) -> str:
-        """
-        Use this tool to get historical stock price data and technical indicators.
+    Args:
+        context: Bound tool context (not exposed to the LLM)
+        symbol: Stock ticker symbol
+        days: Number of days of historical data to analyze
         
-        Args:
-            symbol: Stock ticker symbol
-            days: Number of days of historical data to analyze
-            
-        Returns:
-            Formatted string with time series summary
-        """
-        try:
-            df = alpha_vantage_client.get_time_series_daily(symbol)
-            
-            # Limit to requested days
-            if len(df) > days:
-                df = df.tail(days)
-            
-            # Calculate indicators
-            sma_20 = alpha_vantage_client.calculate_sma(df, window=20)
-            rsi = alpha_vantage_client.calculate_rsi(df, window=14)
-            
-            # Get latest values
-            latest_price = df['close'].iloc[-1]
-            latest_sma = sma_20.iloc[-1] if not sma_20.isna().iloc[-1] else None
-            latest_rsi = rsi.iloc[-1] if not rsi.isna().iloc[-1] else None
-            
-            # Calculate price change
-            price_change = latest_price - df['close'].iloc[0]
-            price_change_pct = (price_change / df['close'].iloc[0]) * 100
-            
-            summary = f"""
+    Returns:
+        Formatted string with time series summary
+    """
+    emit_status(f"Analyse de l'historique des cours de {symbol}…")
+    client = context.alpha_vantage_client
+    try:
+        # Shared, already parsed series (one fetch per symbol and day)
+        full_df = client.get_time_series_daily(symbol)
+
+        # Calculate indicators on the full series so their windows are filled
+        sma_20 = client.calculate_sma(full_df, window=20)
+        rsi = client.calculate_rsi(full_df, window=14)
+
+        # Limit to requested days
+        df = full_df.tail(days)
+
+        # Get latest values
+        latest_price = df['close'].iloc[-1]
+        latest_sma = f"${sma_20.iloc[-1]:.2f}" if not sma_20.isna().iloc[-1] else 'N/A'
+        latest_rsi = f"{rsi.iloc[-1]:.2f}" if not rsi.isna().iloc[-1] else 'N/A'
+
+        # Calculate price change
+        price_change = latest_price - df['close'].iloc[0]
+        price_change_pct = (price_change / df['close'].iloc[0]) * 100
+
+        summary = f"""
 Time Series Analysis for {symbol} (Last {days} days):
 - Latest Price: ${latest_price:.2f}
 - Price Change: ${price_change:.2f} ({price_change_pct:+.2f}%)
-- 20-Day SMA: ${latest_sma:.2f if latest_sma else 'N/A'}
-- RSI (14): {latest_rsi:.2f if latest_rsi else 'N/A'}
+- 20-Day SMA: {latest_sma}
+- RSI (14): {latest_rsi}
 - High: ${df['high'].max():.2f}
 - Low: ${df['low'].min():.2f}
 - Average Volume: {df['volume'].mean():,.0f}
 """
-            return summary.strip()
-            
-        except Exception as e:
-            return f"Error retrieving time series for {symbol}: {str(e)}"
-    
-    # Create tools
-    metrics_tool = FunctionTool.from_defaults(
-        fn=get_stock_metrics,
-        name="get_stock_metrics",
-        description="""Use this tool to get the current stock price, PE ratio, market cap, 
+        return summary.strip()
+
+    except Exception as e:
+        return f"Error retrieving time series for {symbol}: {str(e)}"
+
+
+# Tool definitions: (name, function, async function, description)
+REPORT_TOOLS = [
+    (
+        "analyze_10k_report",
+        analyze_10k_report,
+        aanalyze_10k_report,
+        """Use this tool to answer qualitative questions about the company's
+        strategy, risks, and performance based on their annual report (10-K).
+        You can optionally filter by section (e.g., 'Item 1A' for Risk Factors)."""
+    ),
+]
+MARKET_DATA_TOOLS = [
+    (
+        "get_stock_metrics",
+        get_stock_metrics,
+        None,
+        """Use this tool to get the current stock price, PE ratio, market cap,
         and other key financial metrics for a company. Provide the stock ticker symbol."""
-    )
-    
-    time_series_tool = FunctionTool.from_defaults(
-        fn=get_stock_time_series,
-        name="get_stock_time_series",
-        description="""Use this tool to get historical stock price data and technical indicators 
+    ),
+    (
+        "get_stock_time_series",
+        get_stock_time_series,
+        None,
+        """Use this tool to get historical stock price data and technical indicators
         (SMA, RSI) for analysis. Provide the stock ticker symbol and optionally the number of days."""
-    )
+    ),
+]
+
+
+class ToolRegistry:
+    """
+    Agent tools, defined once per process and shared by every agent.
+
+    Building a FunctionTool introspects the function and creates its pydantic
+    schema; the registry does it once per tool. Binding the tools to an
+    agent's context (retriever, market data client) only wraps the functions,
+    reusing the same metadata and schema.
+    """
+
+    def __init__(self, definitions: Optional[List[Tuple]] = None):
+        """
+        Initialize the registry
+
+        Args:
+            definitions: (name, fn, async_fn, description) of each tool;
+                functions take the ToolContext as `context` keyword argument
+        """
+        self._tools: Dict[str, Tuple[Callable, Optional[Callable], ToolMetadata]] = {}
+        for definition in (
+            definitions if definitions is not None else REPORT_TOOLS + MARKET_DATA_TOOLS
+        ):
+            self.register(*definition)
+
+    def register(
+        self,
+        name: str,
+        fn: Callable,
+        async_fn: Optional[Callable] = None,
+        description: Optional[str] = None,
+    ):
+        """Define a tool (its schema is built here, once)"""
+        metadata = FunctionTool.from_defaults(
+            fn=fn,
+            async_fn=async_fn,
+            name=name,
+            description=description,
+            partial_params={'context': None}
+        ).metadata
+        self._tools[name] = (fn, async_fn, metadata)
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the registered tools"""
+        return list(self._tools)
+
+    def bind(self, context: ToolContext, names: Optional[List[str]] = None) -> List[FunctionTool]:
+        """
+        Tools acting on a context
+
+        Args:
+            context: Objects the tools act on
+            names: Tools to bind (default: all)
+
+        Returns:
+            FunctionTool instances sharing the registry's metadata
+        """
+        tools = []
+        for name in names or self.names:
+            fn, async_fn, metadata = self._tools[name]
+            tools.append(FunctionTool(
+                fn=partial(fn, context=context),
+                async_fn=partial(async_fn, context=context) if async_fn else None,
+                metadata=metadata
+            ))
+        return tools
+
+
+_tool_registry = None
+_tool_registry_lock = threading.Lock()
+
+
+def get_tool_registry() -> ToolRegistry:
+    """Get the process-wide tool registry"""
+    global _tool_registry
+    with _tool_registry_lock:
+        if _tool_registry is None:
+            _tool_registry = ToolRegistry()
+        return _tool_registry
+
+
+def create_financial_report_tool(
+    rag_retriever: AdvancedRAGRetriever,
+    llm: Optional[LLM] = None
+) -> FunctionTool:
+    """
+    Create a tool for analyzing financial reports using RAG
     
-    return [metrics_tool, time_series_tool]
+    Args:
+        rag_retriever: AdvancedRAGRetriever instance
+        llm: Optional LLM for synthesis
+
+    Returns:
+        FunctionTool instance
+    """
+    context = ToolContext(rag_retriever=rag_retriever, alpha_vantage_client=None, llm=llm)
+    return get_tool_registry().bind(context, ["analyze_10k_report"])[0]
+
+
+def create_market_data_tool(alpha_vantage_client: AlphaVantageClient) -> list:
+    """
+    Create a tool for retrieving market data
+
+    Args:
+        alpha_vantage_client: AlphaVantageClient instance
+
+    Returns:
+        List of FunctionTool instances
+    """
+    context = ToolContext(rag_retriever=None, alpha_vantage_client=alpha_vantage_client)
+    return get_tool_registry().bind(context, [name for name, _, _, _ in MARKET_DATA_TOOLS])
 
 
 def get_all_tools(
@@ -174,6 +303,9 @@ def get_all_tools(
     """
     Get all available tools for the agent
     
+    Tools are bound to the given objects; their definitions and schemas come
+    from the shared registry and are not rebuilt.
+
     Args:
         rag_retriever: AdvancedRAGRetriever instance
         alpha_vantage_client: AlphaVantageClient instance
@@ -182,19 +314,9 @@ def get_all_tools(
     Returns:
         List of FunctionTool instances
     """
-    tools = []
-    
-    # Add RAG tool
-    tools.append(create_financial_report_tool(rag_retriever, llm))
-    
-    # Add market data tools
-    market_tools = create_market_data_tool(alpha_vantage_client)
-    tools.extend(market_tools)
-    
-    return tools
-
-
-
-
-
-
+    context = ToolContext(
+        rag_retriever=rag_retriever,
+        alpha_vantage_client=alpha_vantage_client,
+        llm=llm
+    )
+    return get_tool_registry().bind(context)
@@ -4,8 +4,10 @@ Alpha Vantage API Client with rate limiting and caching
 import time
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from typing import Dict, List, Optional
+from typing import Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import requests
 import pandas as pd
@@ -14,23 +16,44 @@ import pandas as pd
 def rate_limited(max_per_minute: int = 5):
     """
     Decorator to limit API calls per minute
+
+    Thread-safe: each call reserves the next free slot under a lock and
+    sleeps outside of it, so concurrent callers are spaced by the minimum
+    interval instead of firing together.
     """
     min_interval = 60.0 / max_per_minute
-    last_called = [0.0]
+    next_slot = [0.0]
+    lock = threading.Lock()
 
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            elapsed = time.time() - last_called[0]
-            if elapsed < min_interval:
-                time.sleep(min_interval - elapsed)
-            ret = func(*args, **kwargs)
-            last_called[0] = time.time()
-            return ret
+            with lock:
+                now = time.monotonic()
+                start = max(now, next_slot[0])
+                next_slot[0] = start + min_interval
+            if start > now:
+                time.sleep(start - now)
+            return func(*args, **kwargs)
         return wrapper
     return decorator
 
 
+_request_executor = None
+_request_executor_lock = threading.Lock()
+
+
+def get_request_executor() -> ThreadPoolExecutor:
+    """Shared thread pool used to issue independent API requests concurrently"""
+    global _request_executor
+    with _request_executor_lock:
+        if _request_executor is None:
+            _request_executor = ThreadPoolExecutor(
+                max_workers=4, thread_name_prefix="alpha-vantage"
+            )
+        return _request_executor
+
+
 class AlphaVantageClient:
     """
     Client for Alpha Vantage API with rate limiting and caching
@@ -38,6 +61,13 @@ class AlphaVantageClient:
     
     BASE_URL = "https://www.alphavantage.co/query"
     
+    # Parsed daily time series shared by every client of the process, keyed
+    # by cache file (symbol and day), so charts, metrics and indicators parse
+    # and fetch a series only once
+    _series_cache: Dict[str, pd.DataFrame] = {}
+    _series_locks: Dict[str, threading.Lock] = {}
+    _series_lock = threading.Lock()
+
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("ALPHA_VANTAGE_API_KEY")
         if not self.api_key:
@@ -126,16 +156,30 @@ class AlphaVantageClient:
         Returns: DataFrame with columns [date, open, high, low, close, volume]
         """
         cache_path = self._get_cache_path(symbol, "timeseries")
+        with self._series_lock:
+            key_lock = self._series_locks.setdefault(cache_path, threading.Lock())
+
+        # Concurrent callers of the same series wait for a single fetch
+        with key_lock:
+            df = self._series_cache.get(cache_path)
+            if df is None:
+                df = self._fetch_time_series_daily(symbol, outputsize, cache_path)
+                today_suffix = f"_{datetime.now().strftime('%Y-%m-%d')}.json"
+                with self._series_lock:
+                    # Keep only today's series
+                    for path in [p for p in self._series_cache if not p.endswith(today_suffix)]:
+                        del self._series_cache[path]
+                        self._series_locks.pop(path, None)
+                    self._series_cache[cache_path] = df
+        return df.copy()
+
+    def _fetch_time_series_daily(
+        self, symbol: str, outputsize: str, cache_path: str
+    ) -> pd.DataFrame:
+        """Load the daily series from the file cache or the API"""
         cached = self._load_from_cache(cache_path)
         if cached and 'Time Series (Daily)' in cached:
-            # Convert cached data to DataFrame
-            time_series = cached['Time Series (Daily)']
-            df = pd.DataFrame.from_dict(time_series, orient='index')
-            df.index = pd.to_datetime(df.index)
-            df.columns = ['open', 'high', 'low', 'close', 'volume']
-            df = df.astype(float)
-            df = df.sort_index()
-            return df
+            return self._series_to_frame(cached['Time Series (Daily)'])
         
         params = {
             'function': 'TIME_SERIES_DAILY',
@@ -148,15 +192,20 @@ class AlphaVantageClient:
         if 'Time Series (Daily)' not in data:
             raise ValueError(f"No time series data found for {symbol}")
         
-        time_series = data['Time Series (Daily)']
+        df = self._series_to_frame(data['Time Series (Daily)'])
+
+        # Save to cache
+        self._save_to_cache(cache_path, data)
+        return df
+
+    @staticmethod
+    def _series_to_frame(time_series: Dict) -> pd.DataFrame:
+        """Convert an API time series to a DataFrame sorted by date"""
         df = pd.DataFrame.from_dict(time_series, orient='index')
         df.index = pd.to_datetime(df.index)
         df.columns = ['open', 'high', 'low', 'close', 'volume']
         df = df.astype(float)
         df = df.sort_index()
-        
-        # Save to cache
-        self._save_to_cache(cache_path, data)
         return df
     
     def get_company_overview(self, symbol: str) -> Dict:
@@ -198,6 +247,17 @@ class AlphaVantageClient:
         self._save_to_cache(cache_path, result)
         return result
     
+    def get_quote_and_overview(self, symbol: str) -> Tuple[Dict, Dict]:
+        """
+        Get the quote and the company overview of a symbol concurrently
+        (both requests still go through the rate limiter)
+        Returns: (quote, overview)
+        """
+        executor = get_request_executor()
+        quote = executor.submit(self.get_quote, symbol)
+        overview = executor.submit(self.get_company_overview, symbol)
+        return quote.result(), overview.result()
+
     def calculate_sma(self, df: pd.DataFrame, window: int = 20) -> pd.Series:
         """Calculate Simple Moving Average"""
         return df['close'].rolling(window=window).mean()
@@ -387,25 +387,42 @@ class SecEdgarClient:
         for comment in soup.find_all(string=lambda text: isinstance(text, type(soup.original_encoding))):
             pass
 
+        # Keep tables intact as serialized rows and mark block boundaries so
+        # paragraphs survive text extraction (used by the structure-aware chunker)
+        self._mark_block_structure(soup)
+
         # Get visible text with line breaks for heading detection
-        text = '\n'.join([line.strip() for line in soup.get_text(separator='\n').splitlines() if line.strip()])
+        raw_text = soup.get_text(separator='\n')
+        text = '\n'.join([line.strip() for line in raw_text.splitlines() if line.strip()])
 
-        # Stronger XBRL/IDEA noise removal up-front
-        lines = []
-        for line in text.split('\n'):
-            low = line.lower()
-            # Skip obvious XBRL/IDEA metadata lines or file listing lines
-            if any(token in low for token in ['xbrl', 'idea:', 'document>', 'file:', '<text>', 'xml', 'schema', 'accession', 'sequence', 'filename', 'sec-']):
-                continue
-            # Skip lines that look like file names (e.g., r36.htm) or html doc markers
-            if re.match(r'^[rR]\d+\.htm', low) or re.match(r'^[a-z0-9_\-]{1,20}\.(htm|html|xml|txt)$', low):
-                continue
-            # Skip very short lines or header noise
-            if len(low) < 30 and low.isupper():
-                continue
-            lines.append(line)
+        # Stronger XBRL/IDEA noise removal up-front (paragraph by paragraph)
+        paragraphs = []
+        for paragraph in re.split(r'\u2029|\n\s*\n', raw_text):
+            lines = []
+            for line in paragraph.split('\n'):
+                line = line.strip()
+                if not line:
+                    continue
+                low = line.lower()
+                # Skip obvious XBRL/IDEA metadata lines or file listing lines
+                if any(token in low for token in [
+                    'xbrl', 'idea:', 'document>', 'file:', '<text>', 'xml', 'schema', 'accession',
+                    'sequence', 'filename', 'sec-'
+                ]):
+                    continue
+                # Skip lines that look like file names (e.g., r36.htm) or html doc markers
+                if re.match(r'^[rR]\d+\.htm', low) or re.match(
+                    r'^[a-z0-9_\-]{1,20}\.(htm|html|xml|txt)$', low
+                ):
+                    continue
+                # Skip very short lines or header noise
+                if len(low) < 30 and low.isupper():
+                    continue
+                lines.append(line)
+            if lines:
+                paragraphs.append('\n'.join(lines))
 
-        cleaned_text = '\n'.join(lines)
+        cleaned_text = '\n\n'.join(paragraphs)
 
         # Attempt to split document by 'Item' headings (Item 1, Item 1A, etc.)
         sections: Dict[str, str] = {}
@@ -431,8 +448,8 @@ class SecEdgarClient:
                 # Extract content (from Item line through end of section)
                 item_section = cleaned_text[start_pos:end_pos].strip()
                 
-                # Clean: normalize whitespace, remove excessive metadata
-                item_section_clean = re.sub(r'\s+', ' ', item_section)[:80000]
+                # Clean: normalize whitespace inside paragraphs, keep paragraph/table breaks
+                item_section_clean = self._normalize_section_text(item_section)[:80000]
                 
                 key = f'Item {item_id.upper()}'
                 if item_section_clean and len(item_section_clean) > 50:  # Only keep if substantial content
@@ -450,14 +467,62 @@ class SecEdgarClient:
             for name, pattern in section_patterns.items():
                 m = re.search(pattern, cleaned_text, re.IGNORECASE | re.DOTALL)
                 if m:
-                    sections[name] = re.sub(r'\s+', ' ', m.group(1).strip())[:100000]
+                    sections[name] = self._normalize_section_text(m.group(1))[:100000]
 
         # Final fallback: use cleaned_text as Full Document but trimmed
         if not sections:
-            fallback = re.sub(r'\s+', ' ', cleaned_text)[:100000]
+            fallback = self._normalize_section_text(cleaned_text)[:100000]
             sections['Full Document'] = fallback if fallback else re.sub(r'\s+', ' ', text)[:100000]
 
         return sections
+
+    # Tags that start a new block of text (paragraph, heading, list item...)
+    BLOCK_TAGS = ['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'pre', 'center', 'hr']
+
+    def _mark_block_structure(self, soup: BeautifulSoup) -> None:
+        """
+        Prepare the parsed HTML so that block boundaries survive get_text():
+        data tables are replaced by a serialized "| cell | cell |" form and
+        every block-level tag is preceded by a paragraph separator (U+2029).
+        """
+        for table in soup.find_all('table'):
+            rows = []
+            for tr in table.find_all('tr'):
+                cells = [cell.get_text(' ', strip=True) for cell in tr.find_all(['td', 'th'])]
+                cells = [re.sub(r'\s+', ' ', c) for c in cells if c and c not in ('$', '%', ')')]
+                if cells:
+                    rows.append(cells)
+            if not rows:
+                table.decompose()
+                continue
+            # Layout tables (one cell per row) are plain text, not data
+            if all(len(row) == 1 for row in rows):
+                serialized = '\n'.join(row[0] for row in rows)
+            else:
+                serialized = '\n'.join('| ' + ' | '.join(row) + ' |' for row in rows)
+            table.replace_with('\u2029' + serialized + '\u2029')
+
+        for tag in soup.find_all(self.BLOCK_TAGS):
+            tag.insert_before('\u2029')
+        for br in soup.find_all('br'):
+            br.replace_with('\n')
+
+    @staticmethod
+    def _normalize_section_text(text: str) -> str:
+        """
+        Collapse whitespace inside paragraphs while keeping paragraph breaks
+        ("\\n\\n") and table rows (one "| ... |" row per line)
+        """
+        blocks = []
+        for paragraph in re.split(r'\n\s*\n', text.strip()):
+            lines = [line.strip() for line in paragraph.split('\n') if line.strip()]
+            if not lines:
+                continue
+            if all(line.startswith('|') for line in lines):
+                blocks.append('\n'.join(re.sub(r'[ \t\xa0]+', ' ', line) for line in lines))
+            else:
+                blocks.append(re.sub(r'\s+', ' ', ' '.join(lines)))
+        return '\n\n'.join(blocks)
     
     def get_10k_text(self, ticker: str) -> Dict[str, str]:
         """
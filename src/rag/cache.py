@@ -0,0 +1,176 @@
+"""
+Query caches for RAG: query embeddings and semantically similar answers
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+import numpy as np
+from llama_index.core.embeddings import BaseEmbedding
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a question for exact-match caching (case, spaces, final punctuation)"""
+    query = re.sub(r'\s+', ' ', query.strip().lower())
+    return re.sub(r'[\s?!.]+$', '', query)
+
+
+# Parts of a question an embedding barely sees: figures, years, quarters, tickers
+NUMBER_PATTERN = re.compile(r'(?<![\d.,])\d+(?:[.,]\d+)*')
+TICKER_PATTERN = re.compile(r'\b[A-Z]{2,5}(?:\.[A-Z])?\b')
+
+
+def query_facets(query: str) -> tuple:
+    """
+    Exact-match part of the semantic cache key of a question
+
+    "revenus 2022" and "revenus 2023" embed almost identically but must not
+    share an answer: the numbers (years, quarters, amounts) and tickers of
+    the question have to match exactly.
+    """
+    numbers = sorted({number.replace(',', '.') for number in NUMBER_PATTERN.findall(query)})
+    tickers = sorted(set(TICKER_PATTERN.findall(query)))
+    return tuple(numbers), tuple(tickers)
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by normalized query text, so a
+    repeated question is not embedded again.
+    """
+
+    def __init__(self, embed_model: BaseEmbedding, max_size: int = 1024):
+        """
+        Initialize the cache
+
+        Args:
+            embed_model: Embedding model used on cache misses
+            max_size: Maximum number of cached embeddings
+        """
+        self.embed_model = embed_model
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def get(self, query: str) -> List[float]:
+        """Embedding of a query, computed at most once per normalized text"""
+        key = normalize_query(query)
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is not None:
+                self._embeddings.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+
+        embedding = self.embed_model.get_query_embedding(query)
+
+        with self._lock:
+            self._embeddings[key] = embedding
+            self._embeddings.move_to_end(key)
+            while len(self._embeddings) > self.max_size:
+                self._embeddings.popitem(last=False)
+        return embedding
+
+    def stats(self) -> Dict[str, int]:
+        """Cache statistics"""
+        with self._lock:
+            return {'entries': len(self._embeddings), 'hits': self.hits, 'misses': self.misses}
+
+
+class SemanticResponseCache:
+    """
+    Cache of answers looked up by query embedding: a new question whose
+    embedding has a cosine similarity above the threshold with a cached
+    question (same collection version, same filters) reuses its answer.
+
+    Entries are dropped as soon as the collection version changes, so a
+    re-ingested report never serves stale answers. Callers put the
+    query_facets() of the question in the exact key.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 256):
+        """
+        Initialize the cache
+
+        Args:
+            threshold: Minimum cosine similarity to reuse an answer
+            max_entries: Maximum number of cached answers (LRU)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._version: Optional[Hashable] = None
+        self._keys: List[Hashable] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._values: List[Any] = []
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _check_version(self, version: Hashable):
+        if version != self._version:
+            self._version = version
+            self._keys = []
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._values = []
+
+    def lookup(self, version: Hashable, key: Hashable, embedding: List[float]) -> Optional[Any]:
+        """
+        Find a cached answer
+
+        Args:
+            version: Collection version the answer must have been computed on
+            key: Exact part of the key (filters, response mode...)
+            embedding: Query embedding
+
+        Returns:
+            Cached value, or None
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            rows = [i for i, k in enumerate(self._keys) if k == key]
+            if rows:
+                scores = self._vectors[rows] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    row = rows[best]
+                    value = self._values[row]
+                    self._move_to_end(row)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def store(self, version: Hashable, key: Hashable, embedding: List[float], value: Any):
+        """Cache an answer computed on a collection version"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            self._keys.append(key)
+            self._values.append(value)
+            self._vectors = (
+                vector[None, :] if len(self._vectors) == 0 else np.vstack([self._vectors, vector])
+            )
+            if len(self._values) > self.max_entries:
+                self._keys.pop(0)
+                self._values.pop(0)
+                self._vectors = self._vectors[1:]
+
+    def _move_to_end(self, row: int):
+        """Mark an entry as most recently used"""
+        self._keys.append(self._keys.pop(row))
+        self._values.append(self._values.pop(row))
+        self._vectors = np.vstack([np.delete(self._vectors, row, axis=0), self._vectors[row]])
+
+    def stats(self) -> Dict[str, int]:
+        """Cache statistics"""
+        with self._lock:
+            return {'entries': len(self._values), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,331 @@
+"""
+Structure-aware chunking for 10-K sections (headings, paragraphs, tables)
+"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from llama_index.core import Document
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import NodeRelationship, TextNode
+from llama_index.core.utils import get_tokenizer
+
+
+# Metadata added by the chunker that should not pollute embeddings or prompts
+CHUNK_METADATA_KEYS = ['chunk_type', 'heading', 'table_rows', 'table_columns']
+
+# Metadata key linking a child chunk to its parent (parent/child indexing)
+PARENT_ID_KEY = 'parent_id'
+
+# Page furniture left over by HTML extraction ("86", "Table of Contents")
+NOISE_BLOCK_PATTERN = re.compile(r'^(\d{1,3}|table of contents|[|\s]+)$', flags=re.IGNORECASE)
+
+
+@dataclass
+class Block:
+    """A structural block of a section: heading, paragraph or table"""
+    kind: str
+    text: str
+    start: int
+    end: int
+
+
+def is_table_block(text: str) -> bool:
+    """A block is a table when every line is a serialized "| ... |" row"""
+    lines = [line for line in text.split('\n') if line.strip()]
+    return bool(lines) and all(line.lstrip().startswith('|') for line in lines)
+
+
+def is_heading_block(text: str) -> bool:
+    """Short, unterminated lines such as "Item 1A. Risk Factors" or "Competition" """
+    stripped = text.strip()
+    if not stripped or '\n' in stripped or len(stripped) > 120:
+        return False
+    if stripped.endswith(('.', ',', ';', ':')):
+        return False
+    if re.match(r'^(item|part)\s+[0-9IVX]+[A-Z]?\b', stripped, flags=re.IGNORECASE):
+        return True
+    return stripped.isupper() or stripped.istitle()
+
+
+def split_blocks(text: str) -> List[Block]:
+    """
+    Split section text into blocks on blank lines (the separator produced
+    by SecEdgarClient.parse_10k_html), keeping character offsets
+    """
+    spans = []
+    position = 0
+    for separator in re.finditer(r'\n\s*\n', text):
+        spans.append((position, separator.start()))
+        position = separator.end()
+    spans.append((position, len(text)))
+
+    blocks = []
+    for start, end in spans:
+        raw = text[start:end]
+        block_text = raw.strip()
+        if not block_text or NOISE_BLOCK_PATTERN.match(block_text):
+            continue
+        start += len(raw) - len(raw.lstrip())
+        if is_table_block(block_text):
+            kind = 'table'
+        elif is_heading_block(block_text):
+            kind = 'heading'
+        else:
+            kind = 'paragraph'
+        blocks.append(Block(kind=kind, text=block_text, start=start, end=start + len(block_text)))
+    return blocks
+
+
+class StructuredChunker:
+    """
+    Chunk documents along their structure instead of a fixed token window.
+
+    - Paragraphs are packed whole into chunks; every heading starts a new
+      chunk and is kept with the content that follows it
+    - Tables are emitted as their own chunks, together with a short caption
+      that precedes them (split by rows with the header repeated when they
+      are larger than the maximum chunk size); one-row or very small table
+      fragments (e.g. "| PART I |") join the neighbouring chunk instead
+    - The chunk size adapts to each section so that chunks are balanced
+      (no tiny tail chunk) and short sections stay in a single chunk
+    - Overlap is only applied when a single paragraph must be split
+    """
+
+    def __init__(
+        self,
+        max_chunk_size: int = 1024,
+        min_chunk_size: int = 256,
+        chunk_overlap: int = 64,
+        tokenizer: Optional[Callable[[str], List]] = None
+    ):
+        """
+        Initialize the chunker
+
+        Args:
+            max_chunk_size: Maximum size of a chunk in tokens
+            min_chunk_size: Lower bound for the adaptive chunk size in tokens
+            chunk_overlap: Overlap in tokens used only when a block is split
+            tokenizer: Tokenizer used to count tokens (defaults to LlamaIndex's)
+        """
+        self.max_chunk_size = max_chunk_size
+        self.min_chunk_size = min(min_chunk_size, max_chunk_size)
+        self.chunk_overlap = chunk_overlap
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens in a text"""
+        return len(self._tokenizer(text))
+
+    def target_chunk_size(self, total_tokens: int) -> int:
+        """
+        Adaptive chunk size for a section: split the section into the fewest
+        chunks allowed by max_chunk_size, then balance their sizes
+        """
+        if total_tokens <= self.max_chunk_size:
+            return self.max_chunk_size
+        num_chunks = math.ceil(total_tokens / self.max_chunk_size)
+        return max(self.min_chunk_size, math.ceil(total_tokens / num_chunks))
+
+    def get_nodes_from_documents(self, documents: List[Document]) -> List[TextNode]:
+        """
+        Chunk documents into nodes (same interface as LlamaIndex node parsers)
+
+        Args:
+            documents: List of Document objects (one per 10-K section)
+
+        Returns:
+            List of TextNode objects
+        """
+        nodes = []
+        for doc in documents:
+            nodes.extend(self.chunk_document(doc))
+        return nodes
+
+    def chunk_document(self, doc: Document) -> List[TextNode]:
+        """Chunk a single document along its blocks"""
+        blocks = split_blocks(doc.text)
+        if not blocks:
+            return []
+
+        sizes = [self.count_tokens(block.text) for block in blocks]
+        target = self.target_chunk_size(sum(sizes))
+
+        nodes = []
+        current: List[Block] = []
+        current_tokens = 0
+        current_type = 'text'
+        heading = None
+
+        def flush():
+            nonlocal current, current_tokens
+            if current:
+                nodes.append(self._make_node(doc, current, current_type, heading))
+            current = []
+            current_tokens = 0
+
+        for block, size in zip(blocks, sizes):
+            block_type = 'table' if block.kind == 'table' else 'text'
+            if block.kind == 'table' and self._is_table_fragment(block, size):
+                # Layout debris, not data: merge into the chunk being built
+                block_type = current_type if current else 'text'
+            if block_type != current_type:
+                # A short text run just before a table is its caption: keep them together
+                if block_type == 'table' and current_tokens >= self.min_chunk_size // 4:
+                    flush()
+                elif block_type == 'text':
+                    flush()
+                current_type = block_type
+
+            if block.kind == 'heading':
+                # A new heading opens a new chunk, so no chunk is labelled with
+                # the heading of the next one (consecutive headings stay together)
+                if any(b.kind != 'heading' for b in current):
+                    flush()
+                heading = block.text
+            elif block.kind == 'table' and size > self.max_chunk_size:
+                flush()
+                for table_block in self._split_table(block):
+                    nodes.append(self._make_node(doc, [table_block], 'table', heading))
+                continue
+            elif block.kind == 'paragraph' and size > target:
+                flush()
+                for piece in self._split_block(block, target):
+                    nodes.append(self._make_node(doc, [piece], 'text', heading))
+                continue
+            elif current_tokens + size > target:
+                flush()
+
+            # Consecutive tables (e.g. a table and its footnotes) share a chunk
+            current.append(block)
+            current_tokens += size
+        flush()
+
+        return nodes
+
+    def _is_table_fragment(self, block: Block, size: int) -> bool:
+        """A single-row table, or one too small to be a chunk of its own"""
+        rows = [row for row in block.text.split('\n') if row.strip()]
+        return len(rows) < 2 or size < self.min_chunk_size // 4
+
+    def _split_table(self, block: Block) -> List[Block]:
+        """Split an oversized table by rows, repeating the header row"""
+        rows = block.text.split('\n')
+        header, body = rows[0], rows[1:]
+        pieces = []
+        current_rows = [header]
+        current_tokens = self.count_tokens(header)
+        for row in body:
+            row_tokens = self.count_tokens(row)
+            if current_tokens + row_tokens > self.max_chunk_size and len(current_rows) > 1:
+                pieces.append(current_rows)
+                current_rows = [header]
+                current_tokens = self.count_tokens(header)
+            current_rows.append(row)
+            current_tokens += row_tokens
+        pieces.append(current_rows)
+        return [
+            Block(kind='table', text='\n'.join(piece), start=block.start, end=block.end)
+            for piece in pieces
+        ]
+
+    def _split_block(self, block: Block, target: int) -> List[Block]:
+        """Split a paragraph larger than the target size, with overlap"""
+        splitter = SentenceSplitter(
+            chunk_size=target,
+            chunk_overlap=min(self.chunk_overlap, target // 4),
+            tokenizer=self._tokenizer
+        )
+        pieces = []
+        search_from = 0
+        for piece in splitter.split_text(block.text):
+            offset = block.text.find(piece[:50], search_from)
+            if offset < 0:
+                offset = search_from
+            search_from = offset + 1
+            start = block.start + offset
+            pieces.append(Block(kind='paragraph', text=piece, start=start, end=start + len(piece)))
+        return pieces
+
+    def _make_node(
+        self,
+        doc: Document,
+        blocks: List[Block],
+        chunk_type: str,
+        heading: Optional[str]
+    ) -> TextNode:
+        """Create a TextNode from consecutive blocks of a document"""
+        text = '\n\n'.join(block.text for block in blocks)
+        metadata = {**doc.metadata, 'chunk_type': chunk_type}
+        if heading:
+            metadata['heading'] = heading[:200]
+        if chunk_type == 'table':
+            rows = [row for row in text.split('\n') if row.lstrip().startswith('|')]
+            metadata['table_rows'] = len(rows)
+            metadata['table_columns'] = max((row.count('|') - 1 for row in rows), default=0)
+
+        node = TextNode(
+            text=text,
+            metadata=metadata,
+            excluded_embed_metadata_keys=list(doc.excluded_embed_metadata_keys)
+            + CHUNK_METADATA_KEYS,
+            excluded_llm_metadata_keys=list(doc.excluded_llm_metadata_keys) + CHUNK_METADATA_KEYS,
+            start_char_idx=blocks[0].start,
+            end_char_idx=blocks[-1].end,
+        )
+        node.relationships[NodeRelationship.SOURCE] = doc.as_related_node_info()
+        return node
+
+
+def make_child_nodes(
+    parent: TextNode,
+    chunk_size: int = 128,
+    tokenizer: Optional[Callable[[str], List]] = None
+) -> List[TextNode]:
+    """
+    Split a chunk into small child chunks for parent/child (small-to-big) indexing
+
+    Children are sentence windows of at most chunk_size tokens, without
+    overlap; tables stay whole. Each child keeps the parent's metadata plus
+    a parent_id (hidden from embeddings and prompts), and character offsets
+    inside the parent's span.
+
+    Args:
+        parent: Parent chunk (regular chunker output)
+        chunk_size: Maximum size of a child in tokens
+        tokenizer: Tokenizer used to count tokens (defaults to LlamaIndex's)
+
+    Returns:
+        Child nodes, in text order
+    """
+    text = parent.get_content()
+    if parent.metadata.get('chunk_type') == 'table':
+        pieces = [text]
+    else:
+        splitter = SentenceSplitter(
+            chunk_size=chunk_size, chunk_overlap=0, tokenizer=tokenizer or get_tokenizer()
+        )
+        pieces = splitter.split_text(text) or [text]
+
+    parent_start = parent.start_char_idx or 0
+    children = []
+    search_from = 0
+    for piece in pieces:
+        offset = text.find(piece[:50], search_from)
+        if offset < 0:
+            offset = search_from
+        search_from = offset + 1
+        child = TextNode(
+            text=piece,
+            metadata={**parent.metadata, PARENT_ID_KEY: parent.node_id},
+            excluded_embed_metadata_keys=list(parent.excluded_embed_metadata_keys)
+            + [PARENT_ID_KEY],
+            excluded_llm_metadata_keys=list(parent.excluded_llm_metadata_keys) + [PARENT_ID_KEY],
+            start_char_idx=parent_start + offset,
+            end_char_idx=parent_start + offset + len(piece),
+        )
+        source = parent.relationships.get(NodeRelationship.SOURCE)
+        if source is not None:
+            child.relationships[NodeRelationship.SOURCE] = source
+        children.append(child)
+    return children
@@ -0,0 +1,194 @@
+"""
+Context packing: turn retrieved chunks into a compact, token-bounded prompt context
+"""
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from llama_index.core.utils import get_tokenizer
+
+
+@dataclass
+class _Span:
+    """Consecutive text of one document, built from one or more chunks"""
+    doc_id: Optional[str]
+    start: Optional[int]
+    end: Optional[int]
+    text: str
+    rank: int
+    score: Optional[float]
+    nodes: List[Tuple[int, NodeWithScore]] = field(default_factory=list)
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(re.sub(r'\s+', ' ', text).strip().lower().encode('utf-8')).hexdigest()
+
+
+def _join_overlapping(left: str, right: str, max_overlap: int) -> Optional[str]:
+    """
+    left + right without the text they share (a prefix of right ending
+    left), or None if no shared text is found
+    """
+    if right in left:
+        return left
+    # Offsets locate the overlap; text normalization may shift it a little
+    longest = min(len(left), len(right) - 1, max_overlap + 64)
+    for size in range(longest, 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return None
+
+
+class ContextBuilder:
+    """
+    Builds the context of a synthesis call from the selected chunks.
+
+    - exact duplicates (same text) are dropped
+    - chunks of the same document whose character spans overlap or touch
+      (chunker offsets) are merged into one passage, without the overlap
+    - passages are ordered by relevance (best chunk first)
+    - passages are packed up to a token budget, counted with the same fast
+      tokenizer as the chunker (tiktoken by default)
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        tokenizer: Optional[Callable[[str], List]] = None,
+        max_gap: int = 4
+    ):
+        """
+        Initialize the builder
+
+        Args:
+            token_budget: Maximum number of context tokens (chunk metadata included)
+            tokenizer: Tokenizer used to count tokens (defaults to LlamaIndex's)
+            max_gap: Maximum number of characters (whitespace) between two
+                chunks of a document for them to be merged
+        """
+        self.token_budget = token_budget
+        self.max_gap = max_gap
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens of a text"""
+        return len(self._tokenizer(text))
+
+    def _spans(self, nodes: List[NodeWithScore]) -> List[_Span]:
+        """Deduplicated spans, one per chunk, remembering each chunk's rank"""
+        spans = []
+        seen = set()
+        for rank, n in enumerate(nodes):
+            text = n.node.get_content()
+            key = _fingerprint(text)
+            if n.node.node_id in seen or key in seen:
+                continue
+            seen.update((n.node.node_id, key))
+            node = n.node
+            spans.append(_Span(
+                doc_id=getattr(node, 'ref_doc_id', None),
+                start=getattr(node, 'start_char_idx', None),
+                end=getattr(node, 'end_char_idx', None),
+                text=text,
+                rank=rank,
+                score=n.score,
+                nodes=[(rank, n)]
+            ))
+        return spans
+
+    def _merge(self, spans: List[_Span]) -> List[_Span]:
+        """Merge overlapping or adjacent spans of the same document"""
+        groups: Dict[Optional[str], List[_Span]] = {}
+        merged = []
+        for span in spans:
+            if span.doc_id is None or span.start is None or span.end is None:
+                merged.append(span)
+            else:
+                groups.setdefault(span.doc_id, []).append(span)
+
+        for group in groups.values():
+            group.sort(key=lambda s: (s.start, s.end))
+            current = group[0]
+            for span in group[1:]:
+                joined = None
+                same_span = (span.start, span.end) == (current.start, current.end)
+                # Pieces of a split table share the table's span: keep them apart
+                if not same_span and span.start <= current.end + self.max_gap:
+                    if span.start < current.end:
+                        joined = _join_overlapping(
+                            current.text, span.text, current.end - span.start
+                        )
+                    else:
+                        joined = f"{current.text}\n\n{span.text}"
+                if joined is None:
+                    merged.append(current)
+                    current = span
+                    continue
+                current = _Span(
+                    doc_id=current.doc_id,
+                    start=current.start,
+                    end=max(current.end, span.end),
+                    text=joined,
+                    rank=min(current.rank, span.rank),
+                    score=max(
+                        (s for s in (current.score, span.score) if s is not None), default=None
+                    ),
+                    nodes=current.nodes + span.nodes,
+                )
+            merged.append(current)
+        return merged
+
+    def _to_node(self, span: _Span) -> NodeWithScore:
+        """Passage node: the best chunk of the span, carrying the merged text"""
+        _, best = min(span.nodes, key=lambda item: item[0])
+        if len(span.nodes) == 1:
+            return best
+        node = best.node
+        merged = TextNode(
+            id_=node.node_id,
+            text=span.text,
+            metadata=dict(node.metadata),
+            excluded_embed_metadata_keys=list(node.excluded_embed_metadata_keys),
+            excluded_llm_metadata_keys=list(node.excluded_llm_metadata_keys),
+            relationships=dict(node.relationships),
+            start_char_idx=span.start,
+            end_char_idx=span.end
+        )
+        merged.metadata['merged_chunks'] = len(span.nodes)
+        merged.excluded_llm_metadata_keys.append('merged_chunks')
+        merged.excluded_embed_metadata_keys.append('merged_chunks')
+        return NodeWithScore(node=merged, score=span.score)
+
+    def build(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """
+        Pack the selected chunks into the context of one synthesis call
+
+        Args:
+            nodes: Selected chunks, best first
+
+        Returns:
+            Passages, best first, whose LLM text (metadata included) fits the
+            token budget; the best passage is truncated if it alone exceeds it
+        """
+        passages = sorted(self._merge(self._spans(nodes)), key=lambda s: s.rank)
+        packed = []
+        used = 0
+        for span in passages:
+            passage = self._to_node(span)
+            tokens = self.count_tokens(passage.node.get_content(metadata_mode=MetadataMode.LLM))
+            if used + tokens <= self.token_budget:
+                packed.append(passage)
+                used += tokens
+            elif not packed:
+                packed.append(self._truncate(passage, tokens))
+                break
+        return packed
+
+    def _truncate(self, passage: NodeWithScore, tokens: int) -> NodeWithScore:
+        """Cut a passage down to the token budget (proportionally, on characters)"""
+        text = passage.node.get_content()
+        keep = max(1, int(len(text) * self.token_budget / max(tokens, 1)))
+        node = passage.node.model_copy()
+        node.set_content(text[:keep])
+        return NodeWithScore(node=node, score=passage.score)
@@ -0,0 +1,203 @@
+"""
+Federated retrieval across the per-ticker collections (comparison questions)
+"""
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Iterable, List, Optional, Union
+from llama_index.core.response_synthesizers import ResponseMode
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores import MetadataFilters
+from src.rag.retrieval import AdvancedRAGRetriever, RAGResult, NO_MATCH_MESSAGE
+
+TICKER_PATTERN = re.compile(r"\b[A-Za-z]{1,5}(?:\.[A-Za-z])?\b")
+
+# Shard searches of every federated query share one pool
+_shard_executor = None
+_shard_executor_lock = threading.Lock()
+
+
+def get_shard_executor(max_workers: int = 8) -> ThreadPoolExecutor:
+    """Get the process-wide pool running per-ticker searches"""
+    global _shard_executor
+    with _shard_executor_lock:
+        if _shard_executor is None:
+            _shard_executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="rag-shard"
+            )
+        return _shard_executor
+
+
+def detect_tickers(query: str, known_tickers: Iterable[str]) -> List[str]:
+    """
+    Tickers of a question, among the known ones, in order of mention
+
+    Only words written in capitals count ("AAPL", not "apple"), so common
+    words that happen to be tickers (e.g. "ON", "IT" in French text) are
+    matched only when they are written like tickers.
+    """
+    known = {t.upper() for t in known_tickers}
+    found = []
+    for word in TICKER_PATTERN.findall(query):
+        if word.isupper() and word in known and word not in found:
+            found.append(word)
+    return found
+
+
+def merge_with_quotas(
+    results: Dict[str, List[NodeWithScore]],
+    total_top_k: int,
+    per_ticker_top_k: Optional[int] = None
+) -> List[NodeWithScore]:
+    """
+    Merge the ranked nodes of several tickers, keeping every ticker represented
+
+    Scores of different collections are not comparable (RRF, cosine and
+    reranker scores), so the lists are interleaved by rank: first chunk of
+    each ticker, then second chunk of each ticker... Each ticker contributes
+    at most its quota.
+
+    Args:
+        results: Ranked nodes per ticker (best first), in ticker order
+        total_top_k: Maximum number of nodes overall
+        per_ticker_top_k: Quota per ticker (default: an equal share of total_top_k)
+
+    Returns:
+        Merged nodes
+    """
+    shards = [nodes for nodes in results.values() if nodes]
+    if not shards:
+        return []
+    quota = per_ticker_top_k or max(1, math.ceil(total_top_k / len(shards)))
+    merged = []
+    for rank in range(quota):
+        for nodes in shards:
+            if rank < len(nodes):
+                merged.append(nodes[rank])
+    return merged[:total_top_k]
+
+
+class FederatedRetriever:
+    """
+    Retrieval over several per-ticker collections at once.
+
+    The question is embedded once, then each collection is searched in
+    parallel with its own retriever (hybrid search, cutoffs, reranking), so
+    latency is that of the slowest collection rather than the sum. The
+    per-ticker results are merged with quotas and answered in one synthesis.
+    Year filters (fiscal_year) apply to every collection.
+    """
+
+    def __init__(
+        self,
+        retrievers: Dict[str, AdvancedRAGRetriever],
+        total_top_k: int = 6,
+        per_ticker_top_k: Optional[int] = None,
+        shard_timeout: Optional[float] = 30.0,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        """
+        Initialize the federated retriever
+
+        Args:
+            retrievers: Retriever of each ticker's collection (same embedding model)
+            total_top_k: Maximum number of context chunks overall
+            per_ticker_top_k: Maximum chunks per ticker (default: equal share)
+            shard_timeout: Seconds to wait for a collection before answering without it
+            executor: Pool running the searches (default: the shared shard pool)
+        """
+        if not retrievers:
+            raise ValueError("FederatedRetriever needs at least one retriever")
+        self.retrievers = {ticker.upper(): retriever for ticker, retriever in retrievers.items()}
+        self.total_top_k = total_top_k
+        self.per_ticker_top_k = per_ticker_top_k
+        self.shard_timeout = shard_timeout
+        self.executor = executor or get_shard_executor()
+
+    @property
+    def tickers(self) -> List[str]:
+        return list(self.retrievers)
+
+    def retrieve(
+        self,
+        query: str,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None
+    ) -> Dict[str, List[NodeWithScore]]:
+        """
+        Search every collection in parallel
+
+        Args:
+            query: Query string
+            metadata_filters: Filters applied in every collection (e.g. {'fiscal_year': 2024})
+
+        Returns:
+            Ranked nodes per ticker; a collection that fails or times out
+            contributes no nodes
+        """
+        quota = self.per_ticker_top_k or max(1, math.ceil(self.total_top_k / len(self.retrievers)))
+        # Embed once: the collections share the embedding model
+        query_bundle = next(iter(self.retrievers.values()))._query_bundle(query)
+
+        futures = {}
+        for ticker, retriever in self.retrievers.items():
+            request = retriever.make_request(metadata_filters, top_k=quota, rerank_top_k=quota)
+            futures[ticker] = self.executor.submit(retriever.retrieve, query_bundle, request)
+
+        results = {}
+        for ticker, future in futures.items():
+            try:
+                results[ticker] = future.result(timeout=self.shard_timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                print(f"Federated retrieval: {ticker} timed out")
+                results[ticker] = []
+            except Exception as e:
+                print(f"Federated retrieval: {ticker} failed: {e}")
+                results[ticker] = []
+        return results
+
+    def query_with_sources(
+        self,
+        query: str,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        response_mode: ResponseMode = ResponseMode.COMPACT
+    ) -> RAGResult:
+        """
+        Answer a question over all the collections
+
+        Args:
+            query: Query string
+            metadata_filters: Filters applied in every collection
+            response_mode: Response synthesis mode
+
+        Returns:
+            RAGResult whose sources cover every ticker with matching chunks
+        """
+        try:
+            results = {
+                ticker: self.retrievers[ticker].expand_to_parents(nodes)
+                for ticker, nodes in self.retrieve(query, metadata_filters).items()
+            }
+            nodes = merge_with_quotas(results, self.total_top_k, self.per_ticker_top_k)
+            if not nodes:
+                return RAGResult(NO_MATCH_MESSAGE)
+            # Chunk metadata (ticker, section) is visible to the LLM, which can
+            # tell the companies apart
+            synthesizer = next(iter(self.retrievers.values()))
+            nodes = synthesizer.context_builder.build(nodes)
+            return RAGResult(
+                synthesizer.synthesize(query, nodes, response_mode=response_mode), nodes
+            )
+        except Exception as e:
+            print(f"Federated RAG query error: {e}")
+            return RAGResult(f"Erreur lors de la recherche dans les rapports 10-K: {str(e)}.")
+
+    def query(
+        self,
+        query: str,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        response_mode: ResponseMode = ResponseMode.COMPACT
+    ) -> str:
+        """Answer a question over all the collections and return the response text"""
+        return self.query_with_sources(query, metadata_filters, response_mode).answer
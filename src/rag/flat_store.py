@@ -0,0 +1,372 @@
+"""
+In-process vector store: memory-mapped NumPy vectors with exact search,
+and an optional HNSW graph (hnswlib) for large collections
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+# hnswlib is optional: without it every search is an exact matmul
+try:
+    import hnswlib
+    HAS_HNSWLIB = True
+except ImportError:
+    HAS_HNSWLIB = False
+
+# Memory of the HNSW links of one vector (M=16: 2*M int32 neighbours on layer 0)
+HNSW_LINK_BYTES = 2 * 16 * 4
+
+
+def _match_filter(operator: FilterOperator, expected: Any, value: Any) -> bool:
+    """Evaluate one metadata filter against a metadata value"""
+    if value is None:
+        return operator in (FilterOperator.NE, FilterOperator.NIN)
+    if operator == FilterOperator.EQ:
+        return value == expected
+    if operator == FilterOperator.NE:
+        return value != expected
+    if operator == FilterOperator.IN:
+        return value in expected
+    if operator == FilterOperator.NIN:
+        return value not in expected
+    if operator == FilterOperator.GT:
+        return value > expected
+    if operator == FilterOperator.GTE:
+        return value >= expected
+    if operator == FilterOperator.LT:
+        return value < expected
+    if operator == FilterOperator.LTE:
+        return value <= expected
+    if operator == FilterOperator.CONTAINS:
+        return expected in value
+    if operator == FilterOperator.TEXT_MATCH:
+        return str(expected) in str(value)
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def matches_filters(metadata: Dict[str, Any], filters: Optional[MetadataFilters]) -> bool:
+    """True if node metadata satisfies (possibly nested) MetadataFilters"""
+    if filters is None or not filters.filters:
+        return True
+    results = []
+    for metadata_filter in filters.filters:
+        if isinstance(metadata_filter, MetadataFilters):
+            results.append(matches_filters(metadata, metadata_filter))
+        else:
+            results.append(_match_filter(
+                metadata_filter.operator,
+                metadata_filter.value,
+                metadata.get(metadata_filter.key)
+            ))
+    if filters.condition == FilterCondition.OR:
+        return any(results)
+    return all(results)
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store kept in the process, for per-ticker collections of a few
+    thousand chunks where Chroma's SQLite + HNSW layer is overhead.
+
+    - Vectors are L2-normalized and stored as float32 or float16 in a
+      .npy file that is memory-mapped, so the OS page cache is shared
+      between processes and nothing is copied on load
+    - Small collections are searched exactly with a single matmul; above
+      hnsw_threshold vectors an HNSW graph (hnswlib) is built and persisted
+    - Node payloads and metadata live in a JSON sidecar; metadata filters
+      are applied before scoring
+    - add() only appends in memory: call persist() once the batches of an
+      ingestion are inserted (deletions are written immediately)
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    persist_path: str
+    dtype: str = "float32"
+    hnsw_threshold: int = 20000
+
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _records: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _vectors: Optional[np.ndarray] = PrivateAttr(default=None)
+    _pending: List[np.ndarray] = PrivateAttr(default_factory=list)
+    _dirty: bool = PrivateAttr(default=False)
+    _hnsw: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        persist_path: str,
+        dtype: str = "float32",
+        hnsw_threshold: int = 20000,
+        **kwargs: Any
+    ):
+        """
+        Open (or create) a store
+
+        Args:
+            persist_path: Directory holding vectors.npy, nodes.json and hnsw.bin
+            dtype: Storage precision of vectors ("float32" or "float16")
+            hnsw_threshold: Collection size above which HNSW search is used
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        super().__init__(
+            persist_path=persist_path, dtype=dtype, hnsw_threshold=hnsw_threshold, **kwargs
+        )
+        self._lock = threading.RLock()
+        os.makedirs(persist_path, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> None:
+        """No external client"""
+        return None
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.persist_path, "vectors.npy")
+
+    @property
+    def _nodes_path(self) -> str:
+        return os.path.join(self.persist_path, "nodes.json")
+
+    @property
+    def _hnsw_path(self) -> str:
+        return os.path.join(self.persist_path, "hnsw.bin")
+
+    def count(self) -> int:
+        """Number of stored vectors (no __len__: an empty store must stay truthy)"""
+        return len(self._ids)
+
+    def nbytes(self) -> int:
+        """Memory of the vectors, mapped or pending, plus the HNSW graph once built"""
+        with self._lock:
+            arrays = [self._vectors, *self._pending]
+            dim = next(
+                (a.shape[1] for a in arrays if a is not None and a.ndim == 2 and a.shape[1]), 0
+            )
+            size = len(self._ids) * dim * np.dtype(self.dtype).itemsize
+            if self._hnsw is not None:
+                size += len(self._ids) * (dim * 4 + HNSW_LINK_BYTES)
+            return size
+
+    def _load(self):
+        """Memory-map vectors and read the sidecar"""
+        if os.path.exists(self._nodes_path) and os.path.exists(self._vectors_path):
+            with open(self._nodes_path, 'r', encoding='utf-8') as f:
+                self._records = json.load(f)
+            self._ids = [record['id'] for record in self._records]
+            self._vectors = np.load(self._vectors_path, mmap_mode='r')
+        else:
+            self._records = []
+            self._ids = []
+            self._vectors = None
+        self._pending = []
+        self._dirty = False
+        self._hnsw = None
+
+    def _matrix(self) -> Optional[np.ndarray]:
+        """All vectors, with the batches added since the last persist() appended"""
+        if self._pending:
+            parts = [self._vectors] if self._vectors is not None and len(self._vectors) else []
+            self._vectors = np.vstack(
+                [np.asarray(part, dtype=np.float32) for part in parts + self._pending]
+            ).astype(self.dtype)
+            self._pending = []
+        return self._vectors
+
+    def _save(self, vectors: Optional[np.ndarray]):
+        """Atomically write vectors and sidecar, then re-map the vectors"""
+        if vectors is None or len(self._records) == 0:
+            vectors = np.zeros((0, 0), dtype=self.dtype)
+        tmp_vectors = f"{self._vectors_path}.tmp.npy"
+        np.save(tmp_vectors, np.ascontiguousarray(vectors, dtype=self.dtype))
+        tmp_nodes = f"{self._nodes_path}.tmp"
+        with open(tmp_nodes, 'w', encoding='utf-8') as f:
+            json.dump(self._records, f, ensure_ascii=False)
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_nodes, self._nodes_path)
+        if os.path.exists(self._hnsw_path):
+            os.remove(self._hnsw_path)
+        self._load()
+
+    def persist(self, persist_path: Optional[str] = None, fs: Any = None) -> None:
+        """
+        Write the nodes added since the last call (no-op if nothing changed)
+
+        Args:
+            persist_path: Ignored, the store always writes to its own directory
+            fs: Ignored (local filesystem only)
+        """
+        with self._lock:
+            if self._dirty:
+                self._save(self._matrix())
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes with their embeddings (kept in memory until persist())"""
+        if not nodes:
+            return []
+        new_vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+        new_vectors = new_vectors / np.maximum(norms, 1e-12)
+
+        with self._lock:
+            existing = set(self._ids)
+            keep = [i for i, node in enumerate(nodes) if node.node_id not in existing]
+            for i in keep:
+                node = nodes[i]
+                existing.add(node.node_id)
+                self._ids.append(node.node_id)
+                self._records.append({
+                    'id': node.node_id,
+                    'ref_doc_id': node.ref_doc_id,
+                    'metadata': node.metadata,
+                    'payload': node_to_metadata_dict(node, remove_text=False, flat_metadata=False)
+                })
+            if keep:
+                self._pending.append(new_vectors[keep])
+                self._dirty = True
+                self._hnsw = None
+        return [node.node_id for node in nodes]
+
+    def _delete_rows(self, rows: List[int]):
+        """Drop rows and compact the store"""
+        if not rows:
+            return
+        drop = set(rows)
+        keep = [i for i in range(len(self._records)) if i not in drop]
+        self._records = [self._records[i] for i in keep]
+        matrix = self._matrix()
+        vectors = np.asarray(matrix)[keep] if matrix is not None else None
+        self._save(vectors)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete all nodes of a source document"""
+        with self._lock:
+            self._delete_rows(
+                [
+                    i
+                    for i, record in enumerate(self._records)
+                    if record.get('ref_doc_id') == ref_doc_id
+                ]
+            )
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **delete_kwargs: Any
+    ) -> None:
+        """Delete nodes by id and/or metadata filters"""
+        ids = set(node_ids or [])
+        with self._lock:
+            self._delete_rows([
+                i for i, record in enumerate(self._records)
+                if (not ids or record['id'] in ids)
+                and (ids or filters) and matches_filters(record['metadata'], filters)
+            ])
+
+    def get_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None
+    ) -> List[BaseNode]:
+        """Get nodes by id and/or metadata filters"""
+        ids = set(node_ids or [])
+        with self._lock:
+            return [
+                metadata_dict_to_node(record['payload'])
+                for record in self._records
+                if (not ids or record['id'] in ids) and matches_filters(record['metadata'], filters)
+            ]
+
+    def clear(self) -> None:
+        """Remove everything"""
+        with self._lock:
+            self._records = []
+            self._pending = []
+            self._save(None)
+
+    def _candidate_rows(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        """Rows allowed by filters/doc_ids/node_ids (None means all rows)"""
+        if not query.filters and not query.doc_ids and not query.node_ids:
+            return None
+        doc_ids = set(query.doc_ids or [])
+        node_ids = set(query.node_ids or [])
+        return np.asarray([
+            i for i, record in enumerate(self._records)
+            if (not doc_ids or record.get('ref_doc_id') in doc_ids)
+            and (not node_ids or record['id'] in node_ids)
+            and matches_filters(record['metadata'], query.filters)
+        ], dtype=np.int64)
+
+    def _get_hnsw(self):
+        """Load or build the HNSW graph for the current vectors"""
+        if self._hnsw is not None:
+            return self._hnsw
+        dim = self._vectors.shape[1]
+        index = hnswlib.Index(space='ip', dim=dim)
+        # A saved graph only covers persisted vectors
+        if os.path.exists(self._hnsw_path) and not self._dirty:
+            index.load_index(self._hnsw_path, max_elements=len(self._ids))
+        else:
+            index.init_index(max_elements=len(self._ids), ef_construction=200, M=16)
+            index.add_items(np.asarray(self._vectors, dtype=np.float32), np.arange(len(self._ids)))
+            if not self._dirty:
+                index.save_index(self._hnsw_path)
+        self._hnsw = index
+        return index
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Top-k cosine similarity search"""
+        with self._lock:
+            self._matrix()
+            if self._vectors is None or len(self._ids) == 0 or query.query_embedding is None:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+            q = np.asarray(query.query_embedding, dtype=np.float32)
+            q = q / max(float(np.linalg.norm(q)), 1e-12)
+            top_k = max(1, query.similarity_top_k)
+            candidates = self._candidate_rows(query)
+
+            if candidates is None and HAS_HNSWLIB and len(self._ids) > self.hnsw_threshold:
+                index = self._get_hnsw()
+                index.set_ef(max(64, top_k * 4))
+                labels, distances = index.knn_query(q, k=min(top_k, len(self._ids)))
+                rows = labels[0].astype(np.int64)
+                scores = 1.0 - distances[0]
+            else:
+                vectors = self._vectors if candidates is None else self._vectors[candidates]
+                if len(vectors) == 0:
+                    return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+                all_scores = np.asarray(vectors, dtype=np.float32) @ q
+                k = min(top_k, len(all_scores))
+                best = np.argpartition(-all_scores, k - 1)[:k]
+                best = best[np.argsort(-all_scores[best])]
+                rows = best if candidates is None else candidates[best]
+                scores = all_scores[best]
+
+            nodes = [metadata_dict_to_node(self._records[row]['payload']) for row in rows]
+            return VectorStoreQueryResult(
+                nodes=nodes,
+                similarities=[float(score) for score in scores],
+                ids=[self._ids[row] for row in rows]
+            )
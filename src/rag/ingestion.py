@@ -2,13 +2,24 @@
 Document ingestion and indexing for RAG
 """
 import os
-from typing import List, Optional
-from llama_index.core import Document, VectorStoreIndex, StorageContext, Settings
+import json
+from typing import Callable, List, Optional, Tuple
+from llama_index.core import Document, VectorStoreIndex, Settings
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+from src.rag.chunking import PARENT_ID_KEY, StructuredChunker, make_child_nodes
+from src.rag.parents import ParentStore
+from src.rag.manifest import IngestionManifest, content_hash
+from src.rag.sparse import BM25Index
+from src.rag.store_registry import CHROMA, VECTOR_BACKENDS, get_vector_store_registry
+
+# Index modes: embed the chunks themselves, or small children of each chunk
+FLAT = "flat"
+PARENT_CHILD = "parent-child"
+INDEX_MODES = (FLAT, PARENT_CHILD)
+
+# Vector store directory used when none is given
+DEFAULT_PERSIST_DIR = "data/vector_db"
 
 
 class DocumentIngester:
@@ -20,19 +31,42 @@ class DocumentIngester:
         self,
         embedding_model: str = "BAAI/bge-small-en-v1.5",
         chunk_size: int = 1024,
-        chunk_overlap: int = 200,
-        persist_dir: str = "data/vector_db"
+        chunk_overlap: int = 64,
+        persist_dir: str = DEFAULT_PERSIST_DIR,
+        chunking: str = "structured",
+        min_chunk_size: int = 256,
+        vector_backend: Optional[str] = None,
+        index_mode: Optional[str] = None,
+        child_chunk_size: int = 128
     ):
         """
         Initialize the document ingester
         
         Args:
             embedding_model: HuggingFace model name for embeddings
-            chunk_size: Size of text chunks in tokens
-            chunk_overlap: Overlap between chunks in tokens
+            chunk_size: Size of text chunks in tokens (maximum size for structured chunking)
+            chunk_overlap: Overlap between chunks in tokens (structured chunking only
+                applies it when a single paragraph has to be split)
             persist_dir: Directory for vector store persistence
+            chunking: "structured" (headings/paragraphs/tables, adaptive sizes)
+                or "sentence" (fixed-size SentenceSplitter windows)
+            min_chunk_size: Lower bound for adaptive chunk sizes in tokens
+            vector_backend: "chroma", "numpy" or "numpy-f16" (in-process
+                memory-mapped store); defaults to the VECTOR_BACKEND env var
+            index_mode: "flat" (chunks are embedded) or "parent-child" (small
+                child chunks are embedded and searched, and replaced by their
+                parent chunk at synthesis); defaults to the INDEX_MODE env var
+            child_chunk_size: Size of child chunks in tokens (parent-child mode)
         """
         self.persist_dir = persist_dir
+        self.vector_backend = vector_backend or os.getenv("VECTOR_BACKEND", CHROMA)
+        if self.vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend: {self.vector_backend}")
+        self.index_mode = index_mode or os.getenv("INDEX_MODE", FLAT)
+        if self.index_mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index mode: {self.index_mode}")
+        self.child_chunk_size = child_chunk_size
+        self.last_ingest_stats = {}
         os.makedirs(persist_dir, exist_ok=True)
         
         # Initialize embedding model
@@ -50,16 +84,23 @@ class DocumentIngester:
                 self.embed_model = None
         
         # Initialize text splitter
-        self.text_splitter = SentenceSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
+        if chunking == "structured":
+            self.text_splitter = StructuredChunker(
+                max_chunk_size=chunk_size,
+                min_chunk_size=min_chunk_size,
+                chunk_overlap=chunk_overlap
+            )
+        elif chunking == "sentence":
+            self.text_splitter = SentenceSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap
+            )
+        else:
+            raise ValueError(f"Unknown chunking strategy: {chunking}")
         
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=persist_dir,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
+        # Shared ChromaDB client (one per directory for the whole process)
+        self.registry = get_vector_store_registry()
+        self.chroma_client = self.registry.get_client(persist_dir)
     
     def create_or_load_index(self, collection_name: str = "finsight_documents") -> VectorStoreIndex:
         """
@@ -71,86 +112,342 @@ class DocumentIngester:
         Returns:
             VectorStoreIndex instance
         """
-        try:
-            # Try to get existing collection
-            chroma_collection = self.chroma_client.get_collection(collection_name)
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
-            
-            # Load existing index
-            index = VectorStoreIndex.from_vector_store(
-                vector_store=vector_store,
-                storage_context=storage_context
-            )
+        existed = self.registry.has_collection(
+            self.persist_dir, collection_name, self.vector_backend
+        )
+        index = self.registry.get_index(
+            self.persist_dir,
+            collection_name,
+            embed_model=self.embed_model,
+            backend=self.vector_backend
+        )
+        if existed:
             print(f"Loaded existing index from {self.persist_dir}")
-            return index
+        else:
+            print(f"Created new index at {self.persist_dir}")
+        return index
+
+    def get_manifest(self, collection_name: str = "finsight_documents") -> IngestionManifest:
+        """
+        Load the ingestion manifest of a collection
+
+        Args:
+            collection_name: Name of the ChromaDB collection
             
-        except Exception:
-            # Create new collection
-            chroma_collection = self.chroma_client.create_collection(collection_name)
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        Returns:
+            IngestionManifest instance
+        """
+        return IngestionManifest.for_collection(self._manifest_dir, collection_name)
+
+    @property
+    def _manifest_dir(self) -> str:
+        if self.vector_backend == CHROMA:
+            return self.persist_dir
+        # Each backend indexes separately, so each has its own manifest
+        return os.path.join(self.persist_dir, self.vector_backend)
+
+    def get_collection_version(self, collection_name: str = "finsight_documents") -> int:
+        """
+        Version of a collection's content, bumped by every ingestion that
+        changes it (used to invalidate query caches)
+
+        Args:
+            collection_name: Name of the ChromaDB collection
             
-            # Create new index
-            index = VectorStoreIndex.from_vector_store(
-                vector_store=vector_store,
-                storage_context=storage_context
+        Returns:
+            Manifest version (0 if never ingested)
+        """
+        return IngestionManifest.read_version(
+            IngestionManifest.path_for(self._manifest_dir, collection_name)
+        )
+
+    def get_sparse_index(self, collection_name: str = "finsight_documents") -> BM25Index:
+        """
+        Get the BM25 index maintained alongside a collection
+
+        Args:
+            collection_name: Name of the ChromaDB collection
+
+        Returns:
+            BM25Index instance
+        """
+        return self.registry.get_sparse_index(
+            self.persist_dir, collection_name, self.vector_backend
+        )
+
+    def get_parent_store(
+        self, collection_name: str = "finsight_documents"
+    ) -> Optional[ParentStore]:
+        """
+        Get the parent chunks of a collection (parent-child index mode only)
+
+        Args:
+            collection_name: Name of the ChromaDB collection
+
+        Returns:
+            ParentStore instance, or None in flat mode
+        """
+        if self.index_mode != PARENT_CHILD:
+            return None
+        return self.registry.get_parent_store(
+            self.persist_dir, collection_name, self.vector_backend
+        )
+
+    def _split_section(self, doc: Document, parent_id_prefix: str) -> Tuple[list, list]:
+        """
+        Chunk a section into the nodes to index
+
+        Returns:
+            (nodes to embed, parent chunks); in flat mode the chunks are the
+            nodes and there are no parents
+        """
+        chunks = self.text_splitter.get_nodes_from_documents([doc])
+        if self.index_mode != PARENT_CHILD:
+            return chunks, []
+        children = []
+        for position, parent in enumerate(chunks):
+            parent.id_ = content_hash(
+                f"{parent_id_prefix}:{position}:{content_hash(parent.get_content())}"
             )
-            print(f"Created new index at {self.persist_dir}")
-            return index
+            children.extend(make_child_nodes(parent, self.child_chunk_size))
+        return children, chunks
+
+    def _backfill_sparse_index(
+        self, index: VectorStoreIndex, sparse_index: BM25Index, node_ids: List[str]
+    ):
+        """Build the BM25 index of a collection ingested before sparse indexes existed"""
+        if not node_ids:
+            return
+        try:
+            added = []
+            for start in range(0, len(node_ids), 500):
+                nodes = index.vector_store.get_nodes(node_ids=node_ids[start:start + 500])
+                added.extend((node.node_id, node.get_content()) for node in nodes)
+            sparse_index.update(added=added)
+            print(f"Built BM25 index for {len(added)} existing nodes")
+        except Exception as e:
+            print(f"Warning: Could not build BM25 index from the vector store: {e}")
+
+    def _record_sections(
+        self,
+        manifest: IngestionManifest,
+        parent_store: Optional[ParentStore],
+        updates: list,
+        orphans: List[Tuple[str, str]],
+        bump_version: bool = False
+    ):
+        """
+        Record indexed sections in the manifest and parent store, then save both
+
+        Args:
+            manifest: Manifest of the collection
+            parent_store: Parent store (None in flat mode)
+            updates: (filing_id, section, section_hash, chunks, parents) of re-indexed sections
+            orphans: (filing_id, section) of sections to forget
+            bump_version: True if vectors were added or removed
+        """
+        for filing_id, section, section_hash, chunks, parents in updates:
+            manifest.set_section(filing_id, section, section_hash, chunks)
+            if parent_store is not None:
+                parent_store.set_section({'filing_id': filing_id, 'section': section}, parents)
+        for filing_id, section in orphans:
+            manifest.remove_section(filing_id, section)
+            if parent_store is not None:
+                parent_store.remove_section({'filing_id': filing_id, 'section': section})
+        if parent_store is not None:
+            parent_store.save()
+        if bump_version:
+            manifest.bump_version()
+        manifest.save()
     
     def ingest_documents(
         self,
         documents: List[Document],
         collection_name: str = "finsight_documents",
-        reset: bool = False
+        reset: bool = False,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        batch_size: int = 64
     ) -> VectorStoreIndex:
         """
         Ingest documents into the vector store
         
+        Ingestion is incremental: a manifest records the sections and chunk
+        hashes already indexed, so unchanged sections are skipped before
+        chunking, re-parsed sections only replace their own vectors and a
+        no-op ingest does not touch the vector store at all. Sections of a
+        re-ingested filing that are no longer present are removed. A BM25 index of
+        the chunks is kept in sync for hybrid retrieval. In parent-child mode
+        the indexed chunks are the children and the parents are saved in the
+        collection's ParentStore.
+
         Args:
             documents: List of Document objects to ingest
             collection_name: Name of the ChromaDB collection
             reset: If True, delete existing collection and create new one
+            progress_callback: Optional callback called with (inserted, total) nodes
+            batch_size: Number of nodes embedded and inserted per batch
             
         Returns:
             VectorStoreIndex instance
+
+        Raises:
+            Exception: If writing to the vector store fails (the manifest is
+                left unchanged so the next ingest retries)
         """
-        if reset:
-            try:
-                self.chroma_client.delete_collection(collection_name)
-            except Exception:
-                pass
+        # Concurrent ingestions of the same collection would race on the manifest
+        with self.registry.collection_lock(self.persist_dir, collection_name):
+            manifest = self.get_manifest(collection_name)
+
+            # Collections indexed before manifests existed have random node ids
+            # that cannot be diffed: rebuild them once
+            if not reset and manifest.is_new:
+                try:
+                    reset = (
+                        self.registry.count(self.persist_dir, collection_name, self.vector_backend)
+                        > 0
+                    )
+                except Exception:
+                    reset = False
+
+            if reset:
+                self.registry.delete_collection(
+                    self.persist_dir, collection_name, self.vector_backend
+                )
+                manifest.reset()
+                # The vectors are gone: a failed insert below must not leave the
+                # old manifest on disk, or every later ingest would skip them
+                manifest.save()
+
+            # Create or load index
+            index = self.create_or_load_index(collection_name)
+            sparse_index = self.get_sparse_index(collection_name)
+            if not sparse_index.exists:
+                self._backfill_sparse_index(index, sparse_index, manifest.node_ids())
+            parent_store = self.get_parent_store(collection_name)
+            if parent_store is None:
+                # Back to flat mode: parents of a previous parent-child index are stale
+                self.registry.get_parent_store(
+                    self.persist_dir, collection_name, self.vector_backend
+                ).clear()
+
+            stats = {
+                'added': 0,
+                'deleted': 0,
+                'unchanged_sections': 0,
+                'updated_sections': 0,
+                'removed_sections': 0,
+            }
+            new_nodes = []
+            stale_ids = []
+            # Section entries and parents, recorded only once the vectors are written
+            updates = []
+            current_sections = {}
+
+            for doc in documents or []:
+                filing_id = str(
+                    doc.metadata.get('filing_id') or doc.metadata.get('ticker') or 'default'
+                )
+                section = str(doc.metadata.get('section') or doc.doc_id)
+                current_sections.setdefault(filing_id, set()).add(section)
+                section_hash = content_hash(
+                    doc.text + json.dumps(doc.metadata, sort_keys=True, default=str)
+                )
+                if self.index_mode != FLAT:
+                    # Switching modes re-indexes the section
+                    section_hash = content_hash(
+                        f"{section_hash}:{self.index_mode}:{self.child_chunk_size}"
+                    )
+
+                # No-op: section already indexed with the same content
+                if manifest.is_section_current(filing_id, section, section_hash):
+                    stats['unchanged_sections'] += 1
+                    continue
+
+                # Split the section into nodes with deterministic ids
+                chunks = {}
+                nodes_by_hash = {}
+                nodes, parents = self._split_section(
+                    doc, f"{collection_name}:{filing_id}:{section}:parent"
+                )
+                for node in nodes:
+                    # A child moves to a new parent when its parent is edited: re-insert it
+                    parent_id = node.metadata.get(PARENT_ID_KEY)
+                    chunk_hash = content_hash(
+                        f"{parent_id}:{node.get_content()}" if parent_id else node.get_content()
+                    )
+                    while chunk_hash in chunks:
+                        chunk_hash = content_hash(chunk_hash)
+                    node.id_ = content_hash(f"{collection_name}:{filing_id}:{section}:{chunk_hash}")
+                    chunks[chunk_hash] = node.id_
+                    nodes_by_hash[chunk_hash] = node
+
+                to_insert, stale = manifest.diff_section(filing_id, section, list(chunks))
+                new_nodes.extend(nodes_by_hash[h] for h in to_insert)
+                stale_ids.extend(stale)
+                updates.append((filing_id, section, section_hash, chunks, parents))
+                stats['updated_sections'] += 1
+
+            # Sections of these filings that are gone from the new parse
+            orphans = [
+                (filing_id, section)
+                for filing_id, sections in current_sections.items()
+                for section in manifest.sections(filing_id)
+                if section not in sections
+            ]
+            for filing_id, section in orphans:
+                stale_ids.extend(manifest.section_node_ids(filing_id, section))
+            stats['removed_sections'] = len(orphans)
+
+            if not new_nodes and not stale_ids:
+                if updates or orphans:
+                    self._record_sections(manifest, parent_store, updates, orphans)
+                print(
+                    f"Collection '{collection_name}' is up to date "
+                    f"({stats['unchanged_sections']} sections unchanged)"
+                )
+                self.last_ingest_stats = {**stats, 'version': manifest.version}
+                return index
         
-        # Create or load index
-        index = self.create_or_load_index(collection_name)
-
-        # Add documents to index
-        if documents:
-            # Split documents into nodes
-            nodes = []
-            for doc in documents:
-                doc_nodes = self.text_splitter.get_nodes_from_documents([doc])
-                nodes.extend(doc_nodes)
-
-            # Insert nodes into index
             try:
-                index.insert_nodes(nodes)
-                print(f"Ingested {len(nodes)} nodes from {len(documents)} documents into collection '{collection_name}'")
-
-                # Debug: print a small sample of nodes (content snippet + metadata)
-                sample_count = min(3, len(nodes))
-                for i in range(sample_count):
-                    try:
-                        content = nodes[i].get_content()
-                    except Exception:
-                        content = str(nodes[i])[:200]
-                    metadata = getattr(nodes[i], 'metadata', {}) or {}
-                    print(f"  Sample node {i+1}: meta={metadata} content_snippet={content[:200]!r}")
+                if stale_ids:
+                    self.registry.delete_nodes(
+                        self.persist_dir, collection_name, stale_ids, self.vector_backend
+                    )
+                    stats['deleted'] = len(stale_ids)
+                for start in range(0, len(new_nodes), batch_size):
+                    index.insert_nodes(new_nodes[start:start + batch_size])
+                    stats['added'] = min(start + batch_size, len(new_nodes))
+                    if progress_callback:
+                        progress_callback(stats['added'], len(new_nodes))
+                # Batches are appended in memory: write the vectors once
+                self.registry.persist(self.persist_dir, collection_name, self.vector_backend)
+                sparse_index.update(
+                    added=[(node.node_id, node.get_content()) for node in new_nodes],
+                    deleted=stale_ids
+                )
             except Exception as e:
+                # The manifest keeps the previous state: the next ingest retries these sections
                 print(f"Error inserting nodes into index: {e}")
+                raise
 
-        return index
+            self._record_sections(manifest, parent_store, updates, orphans, bump_version=True)
+            print(
+                f"Ingested {stats['added']} new nodes and removed {stats['deleted']} stale nodes "
+                f"in collection '{collection_name}' (version {manifest.version})"
+            )
+
+            # Debug: print a small sample of nodes (content snippet + metadata)
+            sample_count = min(3, len(new_nodes))
+            for i in range(sample_count):
+                try:
+                    content = new_nodes[i].get_content()
+                except Exception:
+                    content = str(new_nodes[i])[:200]
+                metadata = getattr(new_nodes[i], 'metadata', {}) or {}
+                print(f"  Sample node {i+1}: meta={metadata} content_snippet={content[:200]!r}")
+
+            self.last_ingest_stats = {**stats, 'version': manifest.version}
+            return index
     
     def create_documents_from_text(
         self,
@@ -204,7 +501,9 @@ class DocumentIngester:
             }
             doc = Document(
                 text=section_text,
-                metadata=metadata
+                metadata=metadata,
+                excluded_embed_metadata_keys=['filing_id'],
+                excluded_llm_metadata_keys=['filing_id']
             )
             documents.append(doc)
         
@@ -0,0 +1,470 @@
+"""
+Persistent LLM response cache (SQLite), wrapped around an LLM so every call site uses it
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+from pydantic import Field, PrivateAttr
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.llms import LLM
+
+# Cache modes
+READ_WRITE = "read-write"  # serve hits, store misses
+RECORD = "record"          # always call the LLM and store its response
+REPLAY = "replay"          # only serve cached responses (offline tests and benchmarks)
+OFF = "off"
+MODES = (READ_WRITE, RECORD, REPLAY, OFF)
+
+# LLM fields that do not change the response, or must not be hashed
+_IGNORED_FIELDS = {'callback_manager', 'rate_limiter', 'output_parser', 'api_key'}
+
+
+def _stable(value: Any) -> Any:
+    """JSON-compatible form of a value, None if it has no stable form (objects, functions)"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_stable(item) for item in value]
+    if isinstance(value, dict):
+        return {str(k): _stable(v) for k, v in value.items() if str(k) not in _IGNORED_FIELDS}
+    if hasattr(value, 'value') and isinstance(value.value, (str, int)):
+        return value.value  # Enum
+    return None
+
+
+def llm_params(llm: LLM) -> Dict[str, Any]:
+    """Parameters of an LLM that change its responses (model, temperature, ...)"""
+    params = {'class': llm.class_name()}
+    for name in type(llm).model_fields:
+        if name in _IGNORED_FIELDS:
+            continue
+        value = _stable(getattr(llm, name, None))
+        if value is not None:
+            params[name] = value
+    return params
+
+
+def cache_key(kind: str, params: Dict[str, Any], payload: Any, kwargs: Dict[str, Any]) -> str:
+    """
+    Deterministic key of an LLM call
+
+    Args:
+        kind: 'chat' or 'complete'
+        params: LLM parameters (see llm_params)
+        payload: Messages or prompt
+        kwargs: Call keyword arguments
+
+    Returns:
+        SHA-256 hex digest
+    """
+    if kind == 'chat':
+        payload = [
+            {'role': _stable(m.role), 'content': m.content, 'kwargs': _stable(m.additional_kwargs)}
+            for m in payload
+        ]
+    data = json.dumps(
+        {'kind': kind, 'params': params, 'payload': payload, 'kwargs': _stable(kwargs)},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class LLMResponseStore:
+    """
+    SQLite table of LLM responses by cache key, bounded by age, entry count
+    and size (least recently used entries are evicted first).
+
+    One connection is shared by the threads of a process; several processes
+    can use the same file (WAL journal).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = 7 * 24 * 3600,
+        max_entries: int = 20_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Open (or create) the store
+
+        Args:
+            path: SQLite file
+            ttl: Seconds after which a response expires (None: never)
+            max_entries: Maximum number of responses
+            max_bytes: Maximum total size of the responses, in bytes
+            clock: Time source (seconds)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+
+    def get(self, key: str, ignore_ttl: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Cached response of a key
+
+        Args:
+            key: Cache key
+            ignore_ttl: Serve expired responses too (replay mode)
+
+        Returns:
+            Response dict, or None
+        """
+        now = self._clock()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (not ignore_ttl and self.ttl is not None and row[1] < now - self.ttl):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Dict[str, Any], model: str = ""):
+        """Store a response, then evict down to the bounds"""
+        data = json.dumps(response, ensure_ascii=False)
+        now = self._clock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, len(data.encode('utf-8')), now, now),
+            )
+            self._evict_locked(now)
+
+    def _evict_locked(self, now: float):
+        removed = 0
+        if self.ttl is not None:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            # Walk from the least recently used entry until within bounds
+            stale = []
+            for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access"
+            ):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                count -= 1
+                total -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            removed += len(stale)
+        self.evictions += removed
+
+    def clear(self):
+        """Remove every response"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Store statistics (for monitoring)"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            return {
+                'path': self.path,
+                'entries': count,
+                'max_entries': self.max_entries,
+                'total_bytes': total,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+def _chat_to_dict(response: ChatResponse, deltas: Optional[list] = None) -> Dict[str, Any]:
+    """Stored form of a chat response (of a stream: its joined deltas, if any)"""
+    content = "".join(deltas) if deltas else response.message.content
+    return {'role': _stable(response.message.role), 'content': content or ""}
+
+
+def _chat_from_dict(data: Dict[str, Any]) -> ChatResponse:
+    return ChatResponse(
+        message=ChatMessage(role=data['role'], content=data['content']), delta=data['content']
+    )
+
+
+def _completion_from_dict(data: Dict[str, Any]) -> CompletionResponse:
+    return CompletionResponse(text=data['text'], delta=data['text'])
+
+
+class CachedLLM(LLM):
+    """
+    LLM whose responses are cached in an LLMResponseStore.
+
+    Calls are keyed by a hash of the wrapped LLM's class and parameters,
+    the messages (or prompt) and the call arguments. Streaming calls are
+    cached once complete; a cached response is streamed as one chunk.
+    Empty responses and errors are not cached. The wrapped LLM emits the
+    LLM events, so cache hits are not counted as LLM calls.
+
+    Modes: read-write (default), record (always call the LLM, refresh the
+    cache), replay (never call the LLM: a miss raises RuntimeError, expired
+    responses are served) and off.
+    """
+
+    llm: LLM = Field(description="Wrapped LLM")
+    mode: str = Field(default=READ_WRITE, description="Cache mode")
+    _store: LLMResponseStore = PrivateAttr()
+    _params: Dict[str, Any] = PrivateAttr()
+
+    def __init__(self, llm: LLM, store: LLMResponseStore, mode: str = READ_WRITE, **kwargs: Any):
+        """
+        Wrap an LLM
+
+        Args:
+            llm: LLM whose responses are cached
+            store: Response store
+            mode: Cache mode (read-write, record, replay or off)
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode} (expected one of {', '.join(MODES)})")
+        super().__init__(llm=llm, mode=mode, **kwargs)
+        self._store = store
+        self._params = llm_params(llm)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.llm.metadata
+
+    @property
+    def store(self) -> LLMResponseStore:
+        """Response store"""
+        return self._store
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached response of a call (None: call the LLM)"""
+        if self.mode in (OFF, RECORD):
+            return None
+        cached = self._store.get(key, ignore_ttl=self.mode == REPLAY)
+        if cached is None and self.mode == REPLAY:
+            raise RuntimeError(f"LLM cache miss in replay mode (key {key[:12]})")
+        return cached
+
+    def _save(self, key: str, response: Dict[str, Any]):
+        if self.mode != OFF and (response.get('content') or response.get('text')):
+            self._store.put(key, response, model=str(self._params.get('model', '')))
+
+    def _chat_key(self, messages: Sequence[ChatMessage], kwargs: Dict[str, Any]) -> str:
+        return cache_key('chat', self._params, list(messages), kwargs)
+
+    def _complete_key(self, prompt: str, formatted: bool, kwargs: Dict[str, Any]) -> str:
+        return cache_key(
+            'complete', self._params, {'prompt': prompt, 'formatted': formatted}, kwargs
+        )
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key = self._chat_key(messages, kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return _chat_from_dict(cached)
+        response = self.llm.chat(messages, **kwargs)
+        self._save(key, _chat_to_dict(response))
+        return response
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        key = self._complete_key(prompt, formatted, kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return _completion_from_dict(cached)
+        response = self.llm.complete(prompt, formatted=formatted, **kwargs)
+        self._save(key, {'text': response.text or ""})
+        return response
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        key = self._chat_key(messages, kwargs)
+        cached = self._lookup(key)
+
+        def gen() -> ChatResponseGen:
+            if cached is not None:
+                yield _chat_from_dict(cached)
+                return
+            last, deltas = None, []
+            for last in self.llm.stream_chat(messages, **kwargs):
+                deltas.append(last.delta or "")
+                yield last
+            if last is not None:
+                self._save(key, _chat_to_dict(last, deltas))
+
+        return gen()
+
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseGen:
+        key = self._complete_key(prompt, formatted, kwargs)
+        cached = self._lookup(key)
+
+        def gen() -> CompletionResponseGen:
+            if cached is not None:
+                yield _completion_from_dict(cached)
+                return
+            last, deltas = None, []
+            for last in self.llm.stream_complete(prompt, formatted=formatted, **kwargs):
+                deltas.append(last.delta or "")
+                yield last
+            if last is not None:
+                self._save(key, {'text': "".join(deltas) or last.text or ""})
+
+        return gen()
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key = self._chat_key(messages, kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return _chat_from_dict(cached)
+        response = await self.llm.achat(messages, **kwargs)
+        self._save(key, _chat_to_dict(response))
+        return response
+
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        key = self._complete_key(prompt, formatted, kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return _completion_from_dict(cached)
+        response = await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+        self._save(key, {'text': response.text or ""})
+        return response
+
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        key = self._chat_key(messages, kwargs)
+        cached = self._lookup(key)
+
+        async def gen() -> ChatResponseAsyncGen:
+            if cached is not None:
+                yield _chat_from_dict(cached)
+                return
+            last, deltas = None, []
+            async for last in await self.llm.astream_chat(messages, **kwargs):
+                deltas.append(last.delta or "")
+                yield last
+            if last is not None:
+                self._save(key, _chat_to_dict(last, deltas))
+
+        return gen()
+
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        key = self._complete_key(prompt, formatted, kwargs)
+        cached = self._lookup(key)
+
+        async def gen() -> CompletionResponseAsyncGen:
+            if cached is not None:
+                yield _completion_from_dict(cached)
+                return
+            last, deltas = None, []
+            async for last in await self.llm.astream_complete(
+                prompt, formatted=formatted, **kwargs
+            ):
+                deltas.append(last.delta or "")
+                yield last
+            if last is not None:
+                self._save(key, {'text': "".join(deltas) or last.text or ""})
+
+        return gen()
+
+
+_stores: Dict[str, LLMResponseStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_response_store(path: str, **kwargs: Any) -> LLMResponseStore:
+    """
+    Process-wide store of a SQLite file (created on first use)
+
+    Args:
+        path: SQLite file
+        **kwargs: LLMResponseStore bounds, used when the store is created
+
+    Returns:
+        LLMResponseStore instance
+    """
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = LLMResponseStore(path, **kwargs)
+        return store
+
+
+def cached_llm_from_env(llm: LLM) -> LLM:
+    """
+    Wrap an LLM with the response cache configured by the environment
+
+    LLM_CACHE_MODE (read-write, record, replay, off), LLM_CACHE_PATH,
+    LLM_CACHE_TTL (seconds, 0 = never expires), LLM_CACHE_MAX_ENTRIES and
+    LLM_CACHE_MAX_MB.
+
+    Args:
+        llm: LLM instance
+
+    Returns:
+        CachedLLM, or llm itself when the cache is off
+    """
+    mode = os.getenv("LLM_CACHE_MODE", READ_WRITE).strip().lower()
+    if mode == OFF:
+        return llm
+    ttl = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+    store = get_response_store(
+        os.getenv("LLM_CACHE_PATH", "data/cache/llm_responses.sqlite"),
+        ttl=ttl or None,
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000")),
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+    )
+    return CachedLLM(llm, store, mode=mode)
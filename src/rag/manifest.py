@@ -0,0 +1,196 @@
+"""
+Ingestion manifest: tracks which filings, sections and chunks are indexed per collection
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+# path -> (mtime_ns, version) of manifests read by read_version
+_version_cache: Dict[str, Tuple[int, int]] = {}
+_version_lock = threading.Lock()
+
+
+def content_hash(text: str) -> str:
+    """Stable short hash of a piece of text"""
+    return hashlib.sha256(text.encode('utf-8', errors='ignore')).hexdigest()[:16]
+
+
+class IngestionManifest:
+    """
+    Per-collection record of what is indexed.
+
+    Layout of the JSON file::
+
+        {
+            "collection": "finsight_aapl",
+            "version": 3,
+            "updated_at": "...",
+            "filings": {
+                "<filing_id>": {
+                    "sections": {
+                        "Item 1A": {
+                            "hash": "<section hash>",
+                            "chunks": {"<chunk hash>": "<node id>"}
+                        }
+                    }
+                }
+            }
+        }
+
+    The version is bumped every time vectors are added or removed, so caches
+    built on top of a collection can be invalidated when it changes.
+    """
+
+    def __init__(self, path: str, collection_name: str):
+        """
+        Load (or start) the manifest stored at path
+
+        Args:
+            path: Path of the JSON manifest file
+            collection_name: Name of the vector store collection it describes
+        """
+        self.path = path
+        self.collection_name = collection_name
+        self.is_new = not os.path.exists(path)
+        self.data = {'collection': collection_name, 'version': 0, 'updated_at': None, 'filings': {}}
+
+        if not self.is_new:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data.update(json.load(f))
+            except Exception as e:
+                print(f"Warning: Could not load ingestion manifest {path}: {e}")
+                self.is_new = True
+
+    @classmethod
+    def for_collection(cls, persist_dir: str, collection_name: str) -> "IngestionManifest":
+        """Manifest stored next to the vector store for a collection"""
+        return cls(cls.path_for(persist_dir, collection_name), collection_name)
+
+    @staticmethod
+    def path_for(persist_dir: str, collection_name: str) -> str:
+        """Path of the manifest of a collection"""
+        return os.path.join(persist_dir, "manifests", f"{collection_name}.json")
+
+    @classmethod
+    def read_version(cls, path: str) -> int:
+        """
+        Current version of the manifest at path (0 if missing)
+
+        Cheap enough to call on every query: the file is only re-read when
+        its modification time changes.
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+        with _version_lock:
+            cached = _version_cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        version = cls(path, "").version
+        with _version_lock:
+            _version_cache[path] = (mtime, version)
+        return version
+
+    @property
+    def version(self) -> int:
+        """Version of the collection content (bumped on every change)"""
+        return self.data.get('version', 0)
+
+    @property
+    def filings(self) -> Dict[str, dict]:
+        """Indexed filings"""
+        return self.data['filings']
+
+    def get_section(self, filing_id: str, section: str) -> Optional[dict]:
+        """Return the manifest entry of a section, if indexed"""
+        return self.filings.get(filing_id, {}).get('sections', {}).get(section)
+
+    def is_section_current(self, filing_id: str, section: str, section_hash: str) -> bool:
+        """True if the section is indexed with exactly this content"""
+        entry = self.get_section(filing_id, section)
+        return entry is not None and entry.get('hash') == section_hash
+
+    def diff_section(
+        self,
+        filing_id: str,
+        section: str,
+        chunk_hashes: List[str]
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Compare the chunks of a re-parsed section with the indexed ones
+
+        Args:
+            filing_id: Filing identifier
+            section: Section name
+            chunk_hashes: Hashes of the new chunks
+
+        Returns:
+            (hashes of chunks to insert, node ids of stale chunks to delete)
+        """
+        indexed = (self.get_section(filing_id, section) or {}).get('chunks', {})
+        new_hashes = set(chunk_hashes)
+        to_insert = [h for h in chunk_hashes if h not in indexed]
+        stale_ids = [node_id for h, node_id in indexed.items() if h not in new_hashes]
+        return to_insert, stale_ids
+
+    def set_section(
+        self,
+        filing_id: str,
+        section: str,
+        section_hash: str,
+        chunks: Dict[str, str]
+    ):
+        """Record the indexed chunks (chunk hash -> node id) of a section"""
+        filing = self.filings.setdefault(filing_id, {'sections': {}})
+        filing['sections'][section] = {'hash': section_hash, 'chunks': chunks}
+
+    def sections(self, filing_id: str) -> List[str]:
+        """Names of the indexed sections of a filing"""
+        return list(self.filings.get(filing_id, {}).get('sections', {}))
+
+    def section_node_ids(self, filing_id: str, section: str) -> List[str]:
+        """Node ids of the indexed chunks of a section"""
+        return list((self.get_section(filing_id, section) or {}).get('chunks', {}).values())
+
+    def remove_section(self, filing_id: str, section: str):
+        """Forget a section (its vectors were deleted)"""
+        filing = self.filings.get(filing_id)
+        if filing is None:
+            return
+        filing.get('sections', {}).pop(section, None)
+        if not filing.get('sections'):
+            del self.filings[filing_id]
+
+    def node_ids(self) -> List[str]:
+        """All node ids recorded in the manifest"""
+        return [
+            node_id
+            for filing in self.filings.values()
+            for entry in filing.get('sections', {}).values()
+            for node_id in entry.get('chunks', {}).values()
+        ]
+
+    def bump_version(self):
+        """Mark the collection content as changed"""
+        self.data['version'] = self.version + 1
+        self.data['updated_at'] = datetime.now().isoformat()
+
+    def reset(self):
+        """Forget everything (the collection was dropped)"""
+        self.data['filings'] = {}
+        self.bump_version()
+
+    def save(self):
+        """Atomically write the manifest to disk"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.is_new = False
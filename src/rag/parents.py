@@ -0,0 +1,172 @@
+"""
+Parent chunks of collections indexed in parent/child (small-to-big) mode
+"""
+import bisect
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from llama_index.core.schema import BaseNode, NodeRelationship, RelatedNodeInfo, TextNode
+from src.rag.chunking import PARENT_ID_KEY
+
+
+def section_key(metadata: dict) -> str:
+    """Key of the section a chunk belongs to (same filing/section as the manifest)"""
+    filing_id = str(metadata.get('filing_id') or metadata.get('ticker') or 'default')
+    return f"{filing_id}\x1f{metadata.get('section') or ''}"
+
+
+class ParentStore:
+    """
+    Parent chunks of one collection, stored in a JSON file and held in memory.
+
+    Only the small child chunks are embedded and searched; the parents
+    (the regular chunks) are kept here and replace their children at
+    synthesis time. Children carry their parent's id, and their character
+    offsets fall inside their parent's span, so a child is mapped to its
+    parent by id, or by offset within its section.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or start) the parent store saved at path
+
+        Args:
+            path: JSON file of the parents
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._loaded_mtime = None
+        self._sections: Dict[str, List[dict]] = {}
+        self._parents: Dict[str, TextNode] = {}
+        self._spans: Dict[str, Tuple[List[int], List[Tuple[int, str]]]] = {}
+
+    @property
+    def exists(self) -> bool:
+        """True if parents have been saved"""
+        return os.path.exists(self.path)
+
+    def count(self) -> int:
+        """Number of parent chunks"""
+        with self._lock:
+            self._maybe_reload()
+            return len(self._parents)
+
+    def _maybe_reload(self):
+        """(Re)load the parents if the file changed on disk"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self._sections = json.load(f)
+        self._build_maps()
+        self._loaded_mtime = mtime
+
+    def _build_maps(self):
+        """Parent id -> node, and per-section sorted spans for offset lookups"""
+        self._parents = {}
+        self._spans = {}
+        for key, records in self._sections.items():
+            spans = []
+            for record in records:
+                node = TextNode(
+                    id_=record['id'],
+                    text=record['text'],
+                    metadata=record['metadata'],
+                    excluded_embed_metadata_keys=record.get('excluded_embed_metadata_keys', []),
+                    excluded_llm_metadata_keys=record.get('excluded_llm_metadata_keys', []),
+                    start_char_idx=record.get('start'),
+                    end_char_idx=record.get('end')
+                )
+                if record.get('ref_doc_id'):
+                    node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(
+                        node_id=record['ref_doc_id']
+                    )
+                self._parents[node.node_id] = node
+                if node.start_char_idx is not None:
+                    spans.append((node.start_char_idx, node.node_id))
+            spans.sort()
+            self._spans[key] = ([start for start, _ in spans], spans)
+
+    def set_section(self, metadata: dict, parents: List[TextNode]):
+        """Replace the parents of a section (saved by save())"""
+        records = [
+            {
+                'id': node.node_id,
+                'text': node.get_content(),
+                'metadata': node.metadata,
+                'excluded_embed_metadata_keys': list(node.excluded_embed_metadata_keys),
+                'excluded_llm_metadata_keys': list(node.excluded_llm_metadata_keys),
+                'start': node.start_char_idx,
+                'end': node.end_char_idx,
+                'ref_doc_id': node.ref_doc_id
+            }
+            for node in parents
+        ]
+        with self._lock:
+            self._maybe_reload()
+            self._sections[section_key(metadata)] = records
+
+    def remove_section(self, metadata: dict):
+        """Drop the parents of a section (saved by save())"""
+        with self._lock:
+            self._maybe_reload()
+            self._sections.pop(section_key(metadata), None)
+
+    def save(self):
+        """Write the parents atomically and refresh the in-memory maps"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._sections, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+            self._build_maps()
+            self._loaded_mtime = os.stat(self.path).st_mtime_ns
+
+    def clear(self):
+        """Remove every parent"""
+        with self._lock:
+            self._sections = {}
+            self._parents = {}
+            self._spans = {}
+            self._loaded_mtime = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def get(self, parent_id: str) -> Optional[TextNode]:
+        """Parent chunk by id"""
+        with self._lock:
+            self._maybe_reload()
+            return self._parents.get(parent_id)
+
+    def parent_of(self, node: BaseNode) -> Optional[TextNode]:
+        """
+        Parent of a child chunk
+
+        Args:
+            node: Child node (from the vector store)
+
+        Returns:
+            Parent node, or None if the node has no known parent
+        """
+        with self._lock:
+            self._maybe_reload()
+            parent_id = node.metadata.get(PARENT_ID_KEY)
+            if parent_id:
+                return self._parents.get(parent_id)
+            start = getattr(node, 'start_char_idx', None)
+            spans = self._spans.get(section_key(node.metadata))
+            if start is None or not spans:
+                return None
+            starts, entries = spans
+            position = bisect.bisect_right(starts, start) - 1
+            if position < 0:
+                return None
+            parent = self._parents[entries[position][1]]
+            if parent.end_char_idx is not None and start >= parent.end_char_idx:
+                return None
+            return parent
@@ -0,0 +1,198 @@
+"""
+Rerankers: reorder retrieved candidates before synthesis
+"""
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+from llama_index.core.schema import NodeWithScore
+from src.rag.cache import normalize_query
+from src.rag.sparse import tokenize
+
+# sentence-transformers comes with the HuggingFace embeddings, but stays optional here
+try:
+    from sentence_transformers import CrossEncoder
+    HAS_CROSS_ENCODER = True
+except ImportError:
+    HAS_CROSS_ENCODER = False
+
+
+class BaseReranker:
+    """
+    Reranker interface: scores (query, chunk) pairs and keeps the best chunks
+    """
+
+    name = "base"
+
+    def score(self, query: str, nodes: List[NodeWithScore]) -> List[float]:
+        """Relevance score of each node for the query (higher is better)"""
+        raise NotImplementedError
+
+    def rerank(self, query: str, nodes: List[NodeWithScore], top_k: int) -> List[NodeWithScore]:
+        """
+        Reorder nodes by relevance
+
+        Args:
+            query: Query string
+            nodes: Candidates (best first according to retrieval)
+            top_k: Number of nodes to keep
+
+        Returns:
+            The top_k nodes, with the reranker score as node score
+        """
+        if not nodes:
+            return []
+        scores = self.score(query, nodes)
+        # Stable sort: ties keep the retrieval order
+        order = sorted(range(len(nodes)), key=lambda i: -scores[i])
+        return [NodeWithScore(node=nodes[i].node, score=float(scores[i])) for i in order[:top_k]]
+
+
+class LexicalReranker(BaseReranker):
+    """
+    Cheap reranker: rewards chunks covering many distinct query terms,
+    rare terms (within the candidate set) counting more. No model needed.
+    """
+
+    name = "lexical"
+
+    def score(self, query: str, nodes: List[NodeWithScore]) -> List[float]:
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return [0.0] * len(nodes)
+        node_terms = [Counter(tokenize(n.node.get_content())) for n in nodes]
+        n_nodes = len(nodes)
+        idf = {
+            term: math.log(1 + n_nodes / (1 + sum(1 for terms in node_terms if term in terms)))
+            for term in query_terms
+        }
+        total = sum(idf.values()) or 1.0
+        scores = []
+        for terms in node_terms:
+            covered = sum(idf[t] for t in query_terms if t in terms)
+            repeats = sum(min(terms[t], 3) for t in query_terms if t in terms)
+            scores.append(covered / total + 0.01 * repeats)
+        return scores
+
+
+class CrossEncoderReranker(BaseReranker):
+    """
+    CPU cross-encoder (MiniLM-class) scoring each (query, chunk) pair.
+
+    Pairs are scored in batches and scores are cached per (normalized
+    query, node id), so reformulated follow-ups and repeated questions
+    only score new chunks. If the model cannot be loaded (offline, missing
+    dependency), the lexical reranker is used instead.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batch_size: int = 16,
+        cache_size: int = 4096,
+        backend: str = "torch",
+        max_length: int = 512
+    ):
+        """
+        Initialize the reranker (the model is loaded on first use)
+
+        Args:
+            model_name: HuggingFace cross-encoder model
+            batch_size: Pairs scored per forward pass
+            cache_size: Maximum number of cached (query, node) scores
+            backend: "torch", or "onnx" / "openvino" for exported models
+            max_length: Maximum tokens per (query, chunk) pair
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.backend = backend
+        self.max_length = max_length
+        self._model = None
+        self._load_failed = False
+        self._fallback = LexicalReranker()
+        self._lock = threading.Lock()
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+    def _get_model(self):
+        """Load the cross-encoder once"""
+        with self._lock:
+            if self._model is None and not self._load_failed:
+                if not HAS_CROSS_ENCODER:
+                    print(
+                        "Warning: sentence-transformers is not installed, using lexical reranking"
+                    )
+                    self._load_failed = True
+                    return None
+                try:
+                    self._model = CrossEncoder(
+                        self.model_name,
+                        device="cpu",
+                        backend=self.backend,
+                        max_length=self.max_length
+                    )
+                except Exception as e:
+                    print(
+                        f"Warning: Could not load cross-encoder '{self.model_name}': {e}. "
+                        "Using lexical reranking"
+                    )
+                    self._load_failed = True
+            return self._model
+
+    def score(self, query: str, nodes: List[NodeWithScore]) -> List[float]:
+        model = self._get_model()
+        if model is None:
+            return self._fallback.score(query, nodes)
+
+        query_key = normalize_query(query)
+        scores: Dict[int, float] = {}
+        with self._lock:
+            for i, n in enumerate(nodes):
+                cached = self._scores.get((query_key, n.node.node_id))
+                if cached is not None:
+                    scores[i] = cached
+
+        missing = [i for i in range(len(nodes)) if i not in scores]
+        if missing:
+            pairs = [(query, nodes[i].node.get_content()) for i in missing]
+            predicted = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            with self._lock:
+                for i, value in zip(missing, predicted):
+                    scores[i] = float(value)
+                    self._scores[(query_key, nodes[i].node.node_id)] = float(value)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+
+        return [scores[i] for i in range(len(nodes))]
+
+
+# Rerankers are stateless apart from their model and cache: one per process
+_rerankers: Dict[str, BaseReranker] = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(name: Optional[str]) -> Optional[BaseReranker]:
+    """
+    Get the shared reranker for a name
+
+    Args:
+        name: "cross-encoder", "lexical", or None/"none" for no reranking
+
+    Returns:
+        Reranker instance, or None
+    """
+    if not name or name == "none":
+        return None
+    with _rerankers_lock:
+        reranker = _rerankers.get(name)
+        if reranker is None:
+            if name == CrossEncoderReranker.name:
+                reranker = CrossEncoderReranker()
+            elif name == LexicalReranker.name:
+                reranker = LexicalReranker()
+            else:
+                raise ValueError(f"Unknown reranker: {name}")
+            _rerankers[name] = reranker
+        return reranker
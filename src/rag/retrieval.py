@@ -1,19 +1,216 @@
 """
 RAG retrieval configuration with advanced features
 """
-from typing import Optional, List
+import asyncio
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Callable, Dict, Hashable, Optional, List, Set, Tuple, Union
 import re
-from llama_index.core import VectorStoreIndex, QueryBundle
+from llama_index.core import VectorStoreIndex, QueryBundle, PromptTemplate
 from llama_index.core.retrievers import VectorIndexRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.core.response_synthesizers import ResponseMode
+from llama_index.core.response_synthesizers import ResponseMode, get_response_synthesizer
 from llama_index.core.postprocessor import SimilarityPostprocessor
+from llama_index.core.schema import NodeWithScore
 from llama_index.core.llms import LLM
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters, FilterOperator
+from src.rag.cache import QueryEmbeddingCache, SemanticResponseCache, query_facets
+from src.rag.sparse import BM25Index
+from src.rag.rerank import BaseReranker
+from src.rag.context import ContextBuilder
+from src.rag.parents import ParentStore
+
+
+# Accepted filter names -> metadata keys set at ingestion
+METADATA_FILTER_ALIASES = {
+    'fiscal_year': 'year',
+    'doc_type': 'document_type',
+}
+
+# Metadata stored as strings at ingestion
+STRING_METADATA_KEYS = {'year'}
+
+# Keywords of questions answered from Item 1A (Risk Factors)
+RISK_KEYWORDS = [
+    'risque',
+    'danger',
+    'menace',
+    'problème',
+    'défi',
+    'difficulté',
+    'exposure',
+    'risk',
+    'hazard',
+]
+
+FRENCH_QA_PROMPT = PromptTemplate(
+    "Basé sur le contexte suivant du rapport 10-K, répondez à la question en français "
+    "de manière détaillée et professionnelle.\n\n"
+    "Contexte:\n{context_str}\n\n"
+    "Question: {query_str}\n\n"
+    "Réponse en français (détaillée et bien structurée):"
+)
+
+NO_DOCUMENTS_MESSAGE = (
+    "Aucun document n'est actuellement indexé dans le système RAG. "
+    "Veuillez charger un rapport 10-K."
+)
+NO_MATCH_MESSAGE = "Aucune information pertinente trouvée dans le rapport 10-K pour cette question."
+TIMEOUT_MESSAGE = "La recherche dans le rapport 10-K a pris trop de temps. Veuillez réessayer."
+
+
+@dataclass
+class RAGResult:
+    """Answer of a RAG query together with the nodes it was built from"""
+    answer: str
+    source_nodes: List[NodeWithScore] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return self.answer
+
+    def format_sources(self, limit: int = 5) -> str:
+        """Markdown list of the source sections"""
+        return format_sources(self.source_nodes, limit=limit)
+
+
+def format_sources(nodes: List[NodeWithScore], limit: int = 5) -> str:
+    """
+    Format source nodes for attribution
+
+    Args:
+        nodes: Retrieved nodes
+        limit: Maximum number of sources
+
+    Returns:
+        Markdown list ("- Section: ... (Ticker: ...) — \"snippet...\""), or '' if no nodes
+    """
+    sources = []
+    for n in nodes[:limit]:
+        meta = getattr(n, 'metadata', {}) or {}
+        section = meta.get('section') or meta.get('title') or meta.get('part') or 'Unknown section'
+        ticker = meta.get('ticker') or meta.get('symbol') or ''
+        snippet = n.get_content()[:200].replace('\n', ' ')
+        src = f"Section: {section}"
+        if ticker:
+            src += f" (Ticker: {ticker})"
+        src += f" — \"{snippet}...\""
+        sources.append(src)
+    return "\n".join([f"- {src}" for src in sources])
+
+
+def build_metadata_filters(
+    metadata_filters: Optional[Union[dict, MetadataFilters]]
+) -> Optional[MetadataFilters]:
+    """
+    Translate a filter dictionary into vector store MetadataFilters
+
+    Scalar values become equality filters and lists become IN filters,
+    all combined with AND, so the vector store applies them before the
+    similarity search instead of filtering the top-k afterwards.
+
+    Args:
+        metadata_filters: e.g. {'section': 'Item 1A', 'fiscal_year': 2024,
+            'ticker': 'AAPL', 'document_type': '10-K'}, or MetadataFilters
+
+    Returns:
+        MetadataFilters, or None if there is nothing to filter on
+    """
+    if not metadata_filters:
+        return None
+    if isinstance(metadata_filters, MetadataFilters):
+        return metadata_filters
+
+    filters = []
+    for key, value in metadata_filters.items():
+        if value is None:
+            continue
+        key = METADATA_FILTER_ALIASES.get(key, key)
+        if isinstance(value, (list, tuple, set)):
+            values = [str(v) if key in STRING_METADATA_KEYS else v for v in value]
+            filters.append(MetadataFilter(key=key, value=values, operator=FilterOperator.IN))
+        else:
+            if key in STRING_METADATA_KEYS:
+                value = str(value)
+            filters.append(MetadataFilter(key=key, value=value, operator=FilterOperator.EQ))
+    return MetadataFilters(filters=filters) if filters else None
+
+
+def _tied_ranks(results: List[NodeWithScore]) -> List[float]:
+    """1-based ranks of a ranked list, tied scores sharing their average rank"""
+    ranks = []
+    start = 0
+    while start < len(results):
+        end = start + 1
+        score = results[start].score
+        while score is not None and end < len(results) and results[end].score == score:
+            end += 1
+        ranks.extend([(start + 1 + end) / 2] * (end - start))
+        start = end
+    return ranks
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[NodeWithScore]],
+    k: int = 60
+) -> List[NodeWithScore]:
+    """
+    Merge ranked lists with Reciprocal Rank Fusion
+
+    Each node scores sum(1 / (k + rank)) over the lists it appears in, so
+    nodes ranked well by both dense and sparse retrieval come first. Nodes
+    with the same score in a list share the average rank of their group, so
+    an arbitrary order among ties (e.g. identical dense similarities) does
+    not outweigh a real ranking from another list.
+
+    Args:
+        result_lists: Ranked node lists (best first)
+        k: RRF damping constant
+
+    Returns:
+        Fused list, best first, with the RRF score as node score
+    """
+    fused: Dict[str, float] = {}
+    nodes: Dict[str, NodeWithScore] = {}
+    for results in result_lists:
+        for rank, node in zip(_tied_ranks(results), results):
+            node_id = node.node.node_id
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+            nodes.setdefault(node_id, node)
+    ranked = sorted(fused, key=fused.get, reverse=True)
+    return [NodeWithScore(node=nodes[node_id].node, score=fused[node_id]) for node_id in ranked]
+
+
+@dataclass(frozen=True)
+class RetrievalRequest:
+    """
+    Retrieval parameters of one query
+
+    Immutable and passed down every stage, so one shared retriever can serve
+    concurrent requests with different settings: nothing per-call is ever
+    stored on the retriever. The stage timeouts (seconds, None for no limit)
+    apply to the async API.
+    """
+    top_k: int = 5
+    candidate_top_k: int = 20
+    similarity_cutoff: float = 0.7
+    fallback_similarity_cutoff: float = 0.5
+    # BM25 hits below the similarity cutoff need the fused score of this rank
+    lexical_rank_cutoff: int = 5
+    rerank_top_k: int = 3
+    metadata_filters: Optional[MetadataFilters] = None
+    embedding_timeout: Optional[float] = 10.0
+    search_timeout: Optional[float] = 15.0
+    synthesis_timeout: Optional[float] = 60.0
 
 
 class AdvancedRAGRetriever:
     """
     Advanced RAG retriever with reranking and metadata filtering
+
+    Constructor settings are defaults: each query runs with its own
+    RetrievalRequest, and the instance is never mutated by a query, so it
+    can be shared between threads.
     """
     
     def __init__(
@@ -21,7 +218,19 @@ class AdvancedRAGRetriever:
         index: VectorStoreIndex,
         llm: Optional[LLM] = None,
         similarity_top_k: int = 5,
-        rerank_top_k: int = 3
+        rerank_top_k: int = 3,
+        candidate_top_k: Optional[int] = None,
+        fallback_similarity_cutoff: float = 0.5,
+        embed_model: Optional[BaseEmbedding] = None,
+        collection_version: Optional[Callable[[], Hashable]] = None,
+        semantic_cache_threshold: float = 0.95,
+        cache_size: int = 256,
+        sparse_index: Optional[BM25Index] = None,
+        rrf_k: int = 60,
+        reranker: Optional[BaseReranker] = None,
+        similarity_cutoff: float = 0.7,
+        context_builder: Optional[ContextBuilder] = None,
+        parent_store: Optional[ParentStore] = None
     ):
         """
         Initialize the advanced retriever
@@ -31,11 +240,61 @@ class AdvancedRAGRetriever:
             llm: LLM instance for synthesis
             similarity_top_k: Number of top similar chunks to retrieve
             rerank_top_k: Number of chunks to keep after reranking
+            candidate_top_k: Number of candidates fetched by the single vector
+                search of query() (default: 4 x similarity_top_k, at least 20)
+            fallback_similarity_cutoff: Cutoff applied locally when no candidate
+                passes the main similarity cutoff
+            embed_model: Model embedding queries (defaults to the index's)
+            collection_version: Returns the current version of the collection
+                (manifest version); enables the semantic answer cache, which
+                is flushed whenever the version changes
+            semantic_cache_threshold: Minimum cosine similarity between two
+                questions for the cached answer to be reused
+            cache_size: Maximum number of cached answers
+            sparse_index: BM25 index of the collection; enables hybrid
+                retrieval (dense + sparse candidates fused with RRF)
+            rrf_k: Reciprocal Rank Fusion constant
+            reranker: Optional reranker (see src.rag.rerank); when set, every
+                candidate passing the cutoffs is reranked and rerank_top_k
+                chunks are kept instead of similarity_top_k
+            similarity_cutoff: Minimum similarity of dense-only candidates
+            context_builder: Packs the selected chunks into the synthesis
+                context (dedup, merge of adjacent chunks, token budget);
+                defaults to a 3000-token ContextBuilder
+            parent_store: Parent chunks of a collection indexed in
+                parent-child mode: the small chunks searched are replaced by
+                their parents in the synthesis context
         """
         self.index = index
         self.llm = llm
         self.similarity_top_k = similarity_top_k
         self.rerank_top_k = rerank_top_k
+        self.candidate_top_k = candidate_top_k or max(similarity_top_k * 4, 20)
+        self.fallback_similarity_cutoff = fallback_similarity_cutoff
+        self.collection_version = collection_version
+        self.sparse_index = sparse_index
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self.context_builder = context_builder or ContextBuilder()
+        self.parent_store = parent_store
+        self.default_request = RetrievalRequest(
+            top_k=similarity_top_k,
+            candidate_top_k=self.candidate_top_k,
+            similarity_cutoff=similarity_cutoff,
+            fallback_similarity_cutoff=fallback_similarity_cutoff,
+            rerank_top_k=rerank_top_k
+        )
+
+        # Caches: embed each distinct question once, reuse answers to near-identical ones
+        embed_model = embed_model or getattr(index, '_embed_model', None)
+        self.embedding_cache = (
+            QueryEmbeddingCache(embed_model, max_size=cache_size * 4)
+            if isinstance(embed_model, BaseEmbedding) else None
+        )
+        self.response_cache = SemanticResponseCache(
+            threshold=semantic_cache_threshold,
+            max_entries=cache_size
+        )
         
         # Create retriever
         self.retriever = VectorIndexRetriever(
@@ -43,9 +302,30 @@ class AdvancedRAGRetriever:
             similarity_top_k=similarity_top_k
         )
         
-        # Create postprocessor for similarity filtering
+        # Create postprocessor for similarity filtering (query engine only)
         self.postprocessor = SimilarityPostprocessor(
-            similarity_cutoff=0.7  # Minimum similarity threshold
+            similarity_cutoff=similarity_cutoff  # Minimum similarity threshold
+        )
+
+    def make_request(
+        self,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        **overrides
+    ) -> RetrievalRequest:
+        """
+        Build the request of one query from the retriever defaults
+
+        Args:
+            metadata_filters: Optional metadata filters
+            **overrides: RetrievalRequest fields to change (top_k, similarity_cutoff...)
+
+        Returns:
+            RetrievalRequest instance
+        """
+        return replace(
+            self.default_request,
+            metadata_filters=build_metadata_filters(metadata_filters),
+            **overrides
         )
     
     def create_query_engine(
@@ -73,34 +353,46 @@ class AdvancedRAGRetriever:
         
         return query_engine
     
+    def _query_bundle(self, query: Union[str, QueryBundle]) -> QueryBundle:
+        """Query bundle carrying the (cached) query embedding"""
+        if isinstance(query, QueryBundle):
+            return query
+        if self.embedding_cache is None:
+            return QueryBundle(query_str=query)
+        return QueryBundle(query_str=query, embedding=self.embedding_cache.get(query))
+
     def retrieve_with_metadata_filter(
         self,
-        query: str,
-        metadata_filters: Optional[dict] = None
+        query: Union[str, QueryBundle],
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        similarity_top_k: Optional[int] = None
     ) -> List:
         """
         Retrieve nodes with metadata filtering
         
+        Filters are pushed down to the vector store (Chroma `where` clause),
+        so the top-k is taken among matching chunks only.
+
         Args:
             query: Query string
-            metadata_filters: Dictionary of metadata filters (e.g., {'section': 'Item 1A'})
+            metadata_filters: Dictionary of metadata filters (e.g., {'section': 'Item 1A'});
+                supported keys include section, ticker, fiscal_year/year and document_type
+            similarity_top_k: Number of nodes to retrieve (default: self.similarity_top_k)
             
         Returns:
             List of retrieved nodes
         """
-        query_bundle = QueryBundle(query_str=query)
-        
-        if metadata_filters:
-            # Filter nodes by metadata
-            nodes = self.retriever.retrieve(query_bundle)
-            filtered_nodes = [
-                node for node in nodes
-                if all(
-                    node.metadata.get(key) == value
-                    for key, value in metadata_filters.items()
-                )
-            ]
-            return filtered_nodes[:self.similarity_top_k]
+        query_bundle = self._query_bundle(query)
+        filters = build_metadata_filters(metadata_filters)
+        top_k = similarity_top_k or self.similarity_top_k
+
+        if filters or top_k != self.similarity_top_k:
+            retriever = VectorIndexRetriever(
+                index=self.index,
+                similarity_top_k=top_k,
+                filters=filters
+            )
+            return retriever.retrieve(query_bundle)
         
         return self.retriever.retrieve(query_bundle)
     
@@ -124,227 +416,512 @@ class AdvancedRAGRetriever:
         else:
             return f"**Informations extraites du rapport 10-K :**\n\n{context_clean[:2000]}..."
     
-    def query(
+    def retrieve_candidates(
+        self,
+        query: Union[str, QueryBundle],
+        request: RetrievalRequest
+    ) -> Tuple[List[NodeWithScore], Dict[str, float], Set[str]]:
+        """
+        Retrieve the candidate set of a query: dense search, plus BM25 search
+        fused with RRF when a sparse index is configured
+
+        Args:
+            query: Query string or bundle
+            request: Retrieval parameters (filters apply to both searches)
+
+        Returns:
+            (candidates best first, dense similarity per node id, ids of nodes
+            matched lexically)
+        """
+        query_bundle = self._query_bundle(query)
+        dense = self.retrieve_with_metadata_filter(
+            query_bundle,
+            request.metadata_filters,
+            similarity_top_k=request.candidate_top_k
+        )
+        hits = []
+        if self.sparse_index is not None:
+            hits = self.sparse_index.search(query_bundle.query_str, top_k=request.candidate_top_k)
+        return self._fuse_candidates(dense, hits, request)
+
+    def _fuse_candidates(
+        self,
+        dense: List[NodeWithScore],
+        hits: List[Tuple[str, float]],
+        request: RetrievalRequest
+    ) -> Tuple[List[NodeWithScore], Dict[str, float], Set[str]]:
+        """Fuse the dense results with the BM25 hits (see retrieve_candidates)"""
+        dense_scores = {n.node.node_id: n.score for n in dense if n.score is not None}
+        if not hits:
+            return dense, dense_scores, set()
+
+        # Load the lexical hits the dense search did not return (filters still apply)
+        known = {n.node.node_id: n.node for n in dense}
+        missing = [node_id for node_id, _ in hits if node_id not in known]
+        if missing:
+            try:
+                for node in self.index.vector_store.get_nodes(
+                    node_ids=missing,
+                    filters=request.metadata_filters
+                ):
+                    known[node.node_id] = node
+            except Exception as e:
+                print(f"Could not load BM25 hits from the vector store: {e}")
+        sparse = [
+            NodeWithScore(node=known[node_id], score=score)
+            for node_id, score in hits if node_id in known
+        ]
+        fused = reciprocal_rank_fusion([dense, sparse], k=self.rrf_k)
+        return fused, dense_scores, {n.node.node_id for n in sparse}
+
+    def select_nodes(
+        self,
+        query: str,
+        candidates: List[NodeWithScore],
+        request: RetrievalRequest,
+        prefer_risk_section: bool = False,
+        dense_scores: Optional[Dict[str, float]] = None,
+        lexical_ids: Optional[Set[str]] = None
+    ) -> List[NodeWithScore]:
+        """
+        Pick the context nodes among the retrieved candidates, locally
+
+        Applies the similarity cutoff, relaxes it to the fallback cutoff when
+        nothing passes, and keeps the best candidates regardless of score as
+        a last resort. Risk questions prefer Item 1A chunks. In hybrid mode,
+        chunks matched by BM25 are kept whatever their dense similarity if
+        their fused RRF score reaches that of rank request.lexical_rank_cutoff
+        in one list (a top BM25 hit, or a fair rank in both lists).
+
+        Args:
+            query: Query string
+            candidates: Candidates, best first (RRF scores in hybrid mode)
+            request: Retrieval parameters (cutoffs, number of nodes)
+            prefer_risk_section: Prefer Item 1A (Risk Factors) chunks
+            dense_scores: Dense similarity per node id (defaults to node scores)
+            lexical_ids: Ids of nodes matched by the sparse search
+
+        Returns:
+            At most request.top_k nodes (request.candidate_top_k when a
+            reranker will pick the final ones)
+        """
+        limit = request.candidate_top_k if self.reranker else request.top_k
+        if prefer_risk_section:
+            risk_nodes = [n for n in candidates if 'Item 1A' in (n.metadata.get('section') or '')]
+            if risk_nodes:
+                candidates = risk_nodes
+        lexical_ids = lexical_ids or set()
+        min_fused_score = 1.0 / (self.rrf_k + request.lexical_rank_cutoff)
+        lexical = {
+            n.node.node_id for n in candidates
+            if n.node.node_id in lexical_ids and n.score is not None and n.score >= min_fused_score
+        }
+
+        for cutoff in (request.similarity_cutoff, request.fallback_similarity_cutoff):
+            nodes = []
+            for n in candidates:
+                score = dense_scores.get(n.node.node_id) if dense_scores is not None else n.score
+                if n.node.node_id in lexical or (score is not None and score >= cutoff):
+                    nodes.append(n)
+            if nodes:
+                return nodes[:limit]
+        return candidates[:limit]
+
+    def retrieve(
+        self,
+        query: Union[str, QueryBundle],
+        request: Optional[RetrievalRequest] = None
+    ) -> List[NodeWithScore]:
+        """
+        Context nodes of a question, without synthesis: candidates, cutoffs
+        and reranking
+
+        Args:
+            query: Query string or bundle
+            request: Retrieval parameters (default: make_request())
+
+        Returns:
+            Nodes, best first (empty if the search returned nothing)
+        """
+        request = request or self.default_request
+        query_bundle = self._query_bundle(query)
+        candidates, dense_scores, lexical_ids = self.retrieve_candidates(query_bundle, request)
+        if not candidates:
+            return []
+        return self._rank_candidates(
+            query_bundle.query_str, candidates, dense_scores, lexical_ids, request
+        )
+
+    def _rank_candidates(
+        self,
+        query_str: str,
+        candidates: List[NodeWithScore],
+        dense_scores: Dict[str, float],
+        lexical_ids: Set[str],
+        request: RetrievalRequest
+    ) -> List[NodeWithScore]:
+        """Cutoffs, risk-section preference and reranking of the candidates"""
+        # Detect if question is about risks and prioritize Item 1A
+        is_risk_question = not request.metadata_filters and any(
+            kw in query_str.lower() for kw in RISK_KEYWORDS
+        )
+
+        nodes = self.select_nodes(
+            query_str,
+            candidates,
+            request,
+            prefer_risk_section=is_risk_question,
+            dense_scores=dense_scores,
+            lexical_ids=lexical_ids
+        )
+        if self.reranker is not None:
+            nodes = self.reranker.rerank(query_str, nodes, top_k=request.rerank_top_k)
+        return nodes
+
+    def expand_to_parents(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """
+        Replace child chunks by their parent chunk (parent-child index mode)
+
+        Children of the same parent collapse into one parent, ranked at its
+        best child; nodes without a known parent are kept as they are.
+        """
+        if self.parent_store is None:
+            return nodes
+        expanded = []
+        seen = set()
+        for n in nodes:
+            parent = self.parent_store.parent_of(n.node)
+            node = parent or n.node
+            if node.node_id in seen:
+                continue
+            seen.add(node.node_id)
+            expanded.append(NodeWithScore(node=node, score=n.score) if parent else n)
+        return expanded
+
+    def build_context(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """Synthesis context of the selected nodes: parents expanded, then packed"""
+        return self.context_builder.build(self.expand_to_parents(nodes))
+
+    def synthesize(
         self,
         query: str,
-        metadata_filters: Optional[dict] = None,
+        nodes: List[NodeWithScore],
         response_mode: ResponseMode = ResponseMode.COMPACT
     ) -> str:
         """
-        Query the RAG system and return response
+        Write the answer from the selected nodes (one synthesis pass)
+
+        Without LLM, or if the LLM fails or returns nothing, the answer is
+        built from the context itself.
+        """
+        context = "\n\n".join([node.get_content() for node in nodes])
+        if not context.strip():
+            return NO_MATCH_MESSAGE
+
+        if self.llm is not None:
+            try:
+                synthesizer = get_response_synthesizer(
+                    llm=self.llm,
+                    response_mode=response_mode,
+                    text_qa_template=FRENCH_QA_PROMPT
+                )
+                response_text = str(synthesizer.synthesize(query, nodes=nodes))
+                if (
+                    response_text
+                    and len(response_text.strip()) >= 10
+                    and response_text.strip() != "Empty Response"
+                ):
+                    return response_text.strip()
+            except Exception as llm_error:
+                print(f"LLM synthesis error: {llm_error}")
+            return self._context_answer(nodes)
+
+        return self._create_french_synthesis(query, context)
+
+    @staticmethod
+    def _context_answer(nodes: List[NodeWithScore]) -> str:
+        """Answer made of the raw context, when the LLM fails"""
+        context = "\n\n".join([node.get_content() for node in nodes])
+        return f"**Informations trouvées dans le rapport 10-K :**\n\n{context[:2000]}"
+
+    def query_with_sources(
+        self,
+        query: str,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        response_mode: ResponseMode = ResponseMode.COMPACT,
+        request: Optional[RetrievalRequest] = None
+    ) -> RAGResult:
+        """
+        Answer a question in a single pass: one query embedding and one vector
+        search over a larger candidate set (fused with BM25 hits when a sparse
+        index is configured), cutoffs and reranking applied locally, one
+        synthesis call on the packed context (see ContextBuilder)
+
+        The query embedding comes from an LRU cache, and when the collection
+        version is known, a previous answer to a semantically identical
+        question on the same version is returned without any search or LLM call.
         
         Args:
             query: Query string
-            metadata_filters: Optional metadata filters
+            metadata_filters: Optional metadata filters (override the request's)
             response_mode: Response synthesis mode
+            request: Retrieval parameters of this call (default: make_request())
             
         Returns:
-            Response string
+            RAGResult with the answer and the source nodes used
         """
+        if request is None:
+            request = self.make_request(metadata_filters)
+        elif metadata_filters:
+            request = replace(request, metadata_filters=build_metadata_filters(metadata_filters))
+
         try:
-            # First, check if index has documents
-            try:
-                # Try to retrieve nodes to check if index is populated
-                test_nodes = self.retriever.retrieve(QueryBundle(query_str=query))
-                if not test_nodes or len(test_nodes) == 0:
-                    return "Aucun document n'est actuellement indexé dans le système RAG. Veuillez charger un rapport 10-K."
-            except Exception as check_error:
-                print(f"Index check error: {check_error}")
+            query_bundle = self._query_bundle(query)
             
-            # Detect if question is about risks and prioritize Item 1A
-            query_lower = query.lower()
-            risk_keywords = ['risque', 'danger', 'menace', 'problème', 'défi', 'difficulté', 'exposure', 'risk', 'hazard']
-            is_risk_question = any(kw in query_lower for kw in risk_keywords)
+            # Semantic answer cache, scoped to the current collection version
+            version = self.collection_version() if self.collection_version else None
+            use_cache = version is not None and query_bundle.embedding is not None
+            cache_key = (
+                repr(request),
+                str(response_mode),
+                self.llm is not None,
+                query_facets(query_bundle.query_str),
+            )
+            if use_cache:
+                cached = self.response_cache.lookup(version, cache_key, query_bundle.embedding)
+                if cached is not None:
+                    return cached
             
-            # Try with lower similarity threshold if first attempt fails
-            original_cutoff = self.postprocessor.similarity_cutoff
-            
-            # First attempt with normal threshold
-            # If no LLM is configured, avoid creating a query engine that may try to load a default LLM
-            query_engine = None
-            if self.llm is not None:
-                query_engine = self.create_query_engine(response_mode=response_mode)
-            else:
-                # No LLM: retrieve and synthesize with fallback prompt in French
-                nodes = self.retriever.retrieve(QueryBundle(query_str=query))
-                
-                # Prioritize Item 1A for risk questions
-                if is_risk_question:
-                    item_1a_nodes = [n for n in nodes if 'Item 1A' in (n.metadata.get('section') or '')]
-                    if item_1a_nodes:
-                        nodes = item_1a_nodes[:self.similarity_top_k]
-                
-                if nodes:
-                    context = "\n\n".join([node.get_content() for node in nodes[:self.similarity_top_k]])
-                    if context.strip():
-                        # Create French synthesis prompt without LLM
-                        synthesis = self._create_french_synthesis(query, context)
-                        return synthesis
-            
-            if metadata_filters:
-                # Use custom retrieval with filters
-                nodes = self.retrieve_with_metadata_filter(query, metadata_filters)
-                # If nodes found, synthesize with LLM if available, otherwise return raw context
-                if nodes:
-                    if self.llm:
-                        context = "\n\n".join([node.get_content() for node in nodes])
-                        if context.strip():
-                            prompt = f"""Based on the following context from financial documents, answer the question in French.
-
-Context:
-{context}
-
-Question: {query}
-
-Answer in French:"""
-                            response = self.llm.complete(prompt)
-                            response_text = str(response)
-                            if response_text and len(response_text.strip()) > 10:
-                                return response_text
-                    else:
-                        context = "\n\n".join([node.get_content() for node in nodes[:self.similarity_top_k]])
-                        if context.strip():
-                            return self._create_french_synthesis(query, context)
-                else:
-                    # If no nodes, try without filters by lowering threshold
-                    self.postprocessor.similarity_cutoff = 0.5
-                    nodes = self.retrieve_with_metadata_filter(query, metadata_filters)
-                    self.postprocessor.similarity_cutoff = original_cutoff
-                    if nodes:
-                        if self.llm:
-                            context = "\n\n".join([node.get_content() for node in nodes])
-                            if context.strip():
-                                prompt = f"""Based on the following context from financial documents, answer the question in French.
-
-Context:
-{context}
-
-Question: {query}
-
-Answer in French:"""
-                                response = self.llm.complete(prompt)
-                                response_text = str(response)
-                                if response_text and len(response_text.strip()) > 10:
-                                    return response_text
-                        else:
-                            context = "\n\n".join([node.get_content() for node in nodes[:self.similarity_top_k]])
-                            if context.strip():
-                                return self._create_french_synthesis(query, context)
-                return "Aucune information pertinente trouvée dans le rapport 10-K pour cette question."
-            
-            # Standard query without filters
-            response = query_engine.query(query)
-            
-            # Extract response text properly - handle different response types
-            response_text = ""
-            
-            # Try different ways to extract text from response
-            if isinstance(response, str):
-                response_text = response
-            elif hasattr(response, 'response'):
-                response_text = str(response.response)
-            elif hasattr(response, 'text'):
-                response_text = str(response.text)
-            elif hasattr(response, 'get_response'):
-                response_text = str(response.get_response())
-            elif hasattr(response, 'source_nodes'):
-                # It's a Response object, try multiple extraction methods
-                # First try to get response text directly
-                if hasattr(response, 'response'):
-                    response_text = str(response.response)
-                elif hasattr(response, 'text'):
-                    response_text = str(response.text)
-                else:
-                    # Try to get from source nodes and synthesize
-                    if response.source_nodes and len(response.source_nodes) > 0:
-                        context = "\n\n".join([node.get_content() for node in response.source_nodes[:5]])
-                        if self.llm and context.strip():
-                            prompt = f"""Basé sur le contexte suivant du rapport 10-K, répondez à la question en français de manière détaillée et professionnelle.
-
-Contexte:
-{context}
-
-Question: {query}
-
-Réponse en français (détaillée et bien structurée):"""
-                            try:
-                                response_obj = self.llm.complete(prompt)
-                                response_text = str(response_obj)
-                            except Exception as llm_error:
-                                print(f"LLM synthesis error: {llm_error}")
-                                # Fallback: return context directly
-                                response_text = f"**Informations trouvées dans le rapport 10-K :**\n\n{context[:2000]}"
-                    else:
-                        # No source nodes, try string conversion
-                        response_text = str(response)
-            else:
-                # Last resort: convert to string
-                response_text = str(response)
-            
-            # Check if response is empty or too short
-            if not response_text or len(response_text.strip()) < 10:
-                # Retry with lower similarity threshold
-                self.postprocessor.similarity_cutoff = 0.5
-                query_engine = self.create_query_engine(response_mode=response_mode)
-                response = query_engine.query(query)
-                
-                # Extract again
-                if hasattr(response, 'response'):
-                    response_text = str(response.response)
-                elif hasattr(response, 'source_nodes'):
-                    if response.source_nodes:
-                        context = "\n\n".join([node.get_content() for node in response.source_nodes[:3]])
-                        if self.llm and context.strip():
-                            prompt = f"""Based on the following context from financial documents, answer the question in French.
-
-Context:
-{context}
-
-Question: {query}
-
-Answer in French:"""
-                            response_obj = self.llm.complete(prompt)
-                            response_text = str(response_obj)
-                else:
-                    response_text = str(response)
-                
-                self.postprocessor.similarity_cutoff = original_cutoff
-            
-            # Final check
-            if not response_text or len(response_text.strip()) < 10:
-                # Last resort: try direct retrieval without postprocessing
-                try:
-                    nodes = self.retriever.retrieve(QueryBundle(query_str=query))
-                    if nodes:
-                        context = "\n\n".join([node.get_content() for node in nodes[:5]])
-                        # If LLM available, synthesize; otherwise return the raw context
-                        if context.strip():
-                            if self.llm:
-                                prompt = f"""Based on the following context from financial documents, answer the question in French.
-
-Context:
-{context}
-
-Question: {query}
-
-Answer in French:"""
-                                response_obj = self.llm.complete(prompt)
-                                response_text = str(response_obj)
-                            else:
-                                response_text = f"Informations extraites du rapport 10-K :\n\n{context[:4000]}"
-                except Exception as e:
-                    print(f"Direct retrieval fallback failed: {e}")
-            
-            if not response_text or len(response_text.strip()) < 10:
-                return "Désolé, je n'ai pas trouvé d'informations pertinentes dans le rapport 10-K pour répondre à cette question. Veuillez reformuler votre question ou vérifier que le rapport a été correctement chargé."
-            
-            return response_text.strip()
+            nodes = self.retrieve(query_bundle, request)
+            if not nodes:
+                return RAGResult(
+                    NO_MATCH_MESSAGE if request.metadata_filters else NO_DOCUMENTS_MESSAGE
+                )
+            nodes = self.build_context(nodes)
+            result = RAGResult(self.synthesize(query, nodes, response_mode=response_mode), nodes)
+            if use_cache:
+                self.response_cache.store(version, cache_key, query_bundle.embedding, result)
+            return result
             
         except Exception as e:
             print(f"RAG query error: {e}")
-            return f"Erreur lors de la recherche dans le rapport 10-K: {str(e)}. Veuillez vérifier que le rapport a été correctement chargé."
+            return RAGResult(
+                f"Erreur lors de la recherche dans le rapport 10-K: {str(e)}. "
+                "Veuillez vérifier que le rapport a été correctement chargé."
+            )
+
+    def query(
+        self,
+        query: str,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        response_mode: ResponseMode = ResponseMode.COMPACT,
+        request: Optional[RetrievalRequest] = None
+    ) -> str:
+        """
+        Query the RAG system and return response
+
+        Args:
+            query: Query string
+            metadata_filters: Optional metadata filters
+            response_mode: Response synthesis mode
+            request: Retrieval parameters of this call
+
+        Returns:
+            Response string
+        """
+        return self.query_with_sources(
+            query, metadata_filters, response_mode, request=request
+        ).answer
 
+    # Async API: same pipeline, blocking stages (embedding, vector and BM25
+    # searches, reranking) run in the default executor and the LLM is called
+    # through its async client, so no thread waits on Gemini. Each stage has
+    # a timeout; cancelling the caller cancels the pending stage (a search
+    # already running in a worker thread completes in the background).
 
+    async def _in_executor(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(func, *args, **kwargs))
 
+    async def _aquery_bundle(
+        self, query: Union[str, QueryBundle], request: RetrievalRequest
+    ) -> QueryBundle:
+        """Query bundle with its embedding computed off the event loop"""
+        if isinstance(query, QueryBundle) or self.embedding_cache is None:
+            return self._query_bundle(query)
+        embedding = await asyncio.wait_for(
+            self._in_executor(self.embedding_cache.get, query),
+            request.embedding_timeout
+        )
+        return QueryBundle(query_str=query, embedding=embedding)
 
+    async def aretrieve_candidates(
+        self,
+        query: Union[str, QueryBundle],
+        request: RetrievalRequest
+    ) -> Tuple[List[NodeWithScore], Dict[str, float], Set[str]]:
+        """Async retrieve_candidates: the dense and BM25 searches run concurrently"""
+        query_bundle = await self._aquery_bundle(query, request)
+        searches = [self._in_executor(
+            self.retrieve_with_metadata_filter,
+            query_bundle,
+            request.metadata_filters,
+            similarity_top_k=request.candidate_top_k
+        )]
+        if self.sparse_index is not None:
+            searches.append(self._in_executor(
+                self.sparse_index.search,
+                query_bundle.query_str,
+                top_k=request.candidate_top_k
+            ))
+        results = await asyncio.gather(*searches)
+        hits = results[1] if len(results) > 1 else []
+        return await self._in_executor(self._fuse_candidates, results[0], hits, request)
 
+    async def aretrieve(
+        self,
+        query: Union[str, QueryBundle],
+        request: Optional[RetrievalRequest] = None
+    ) -> List[NodeWithScore]:
+        """
+        Async retrieve(): context nodes of a question
+
+        Raises:
+            asyncio.TimeoutError: if the embedding or the search stage times out
+        """
+        request = request or self.default_request
+        query_bundle = await self._aquery_bundle(query, request)
+        candidates, dense_scores, lexical_ids = await asyncio.wait_for(
+            self.aretrieve_candidates(query_bundle, request),
+            request.search_timeout
+        )
+        if not candidates:
+            return []
+        return await asyncio.wait_for(
+            self._in_executor(
+                self._rank_candidates,
+                query_bundle.query_str,
+                candidates,
+                dense_scores,
+                lexical_ids,
+                request,
+            ),
+            request.search_timeout,
+        )
+
+    async def asynthesize(
+        self,
+        query: str,
+        nodes: List[NodeWithScore],
+        response_mode: ResponseMode = ResponseMode.COMPACT
+    ) -> str:
+        """Async synthesize(): the LLM is called with its async client (acomplete)"""
+        context = "\n\n".join([node.get_content() for node in nodes])
+        if not context.strip():
+            return NO_MATCH_MESSAGE
+
+        if self.llm is not None:
+            try:
+                synthesizer = get_response_synthesizer(
+                    llm=self.llm,
+                    response_mode=response_mode,
+                    text_qa_template=FRENCH_QA_PROMPT
+                )
+                response_text = str(await synthesizer.asynthesize(query, nodes=nodes))
+                if (
+                    response_text
+                    and len(response_text.strip()) >= 10
+                    and response_text.strip() != "Empty Response"
+                ):
+                    return response_text.strip()
+            except Exception as llm_error:
+                print(f"LLM synthesis error: {llm_error}")
+            return self._context_answer(nodes)
+
+        return self._create_french_synthesis(query, context)
+
+    async def aquery_with_sources(
+        self,
+        query: str,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        response_mode: ResponseMode = ResponseMode.COMPACT,
+        request: Optional[RetrievalRequest] = None
+    ) -> RAGResult:
+        """
+        Async query_with_sources()
+
+        A retrieval timeout returns a timeout message; a synthesis timeout
+        falls back to the raw context, like an LLM error. Cancellation
+        (asyncio.CancelledError) is propagated to the caller.
+
+        Args:
+            query: Query string
+            metadata_filters: Optional metadata filters (override the request's)
+            response_mode: Response synthesis mode
+            request: Retrieval parameters and stage timeouts of this call
+
+        Returns:
+            RAGResult with the answer and the source nodes used
+        """
+        if request is None:
+            request = self.make_request(metadata_filters)
+        elif metadata_filters:
+            request = replace(request, metadata_filters=build_metadata_filters(metadata_filters))
+
+        try:
+            query_bundle = await self._aquery_bundle(query, request)
+
+            version = self.collection_version() if self.collection_version else None
+            use_cache = version is not None and query_bundle.embedding is not None
+            cache_key = (
+                repr(request),
+                str(response_mode),
+                self.llm is not None,
+                query_facets(query_bundle.query_str),
+            )
+            if use_cache:
+                cached = self.response_cache.lookup(version, cache_key, query_bundle.embedding)
+                if cached is not None:
+                    return cached
+
+            nodes = await self.aretrieve(query_bundle, request)
+            if not nodes:
+                return RAGResult(
+                    NO_MATCH_MESSAGE if request.metadata_filters else NO_DOCUMENTS_MESSAGE
+                )
+            nodes = self.build_context(nodes)
+            try:
+                answer = await asyncio.wait_for(
+                    self.asynthesize(query, nodes, response_mode=response_mode),
+                    request.synthesis_timeout
+                )
+            except asyncio.TimeoutError:
+                print(f"RAG synthesis timed out after {request.synthesis_timeout}s")
+                return RAGResult(self._context_answer(nodes), nodes)
+            result = RAGResult(answer, nodes)
+            if use_cache:
+                self.response_cache.store(version, cache_key, query_bundle.embedding, result)
+            return result
+
+        except asyncio.TimeoutError:
+            print("RAG retrieval timed out")
+            return RAGResult(TIMEOUT_MESSAGE)
+        except Exception as e:
+            print(f"RAG query error: {e}")
+            return RAGResult(
+                f"Erreur lors de la recherche dans le rapport 10-K: {str(e)}. "
+                "Veuillez vérifier que le rapport a été correctement chargé."
+            )
+
+    async def aquery(
+        self,
+        query: str,
+        metadata_filters: Optional[Union[dict, MetadataFilters]] = None,
+        response_mode: ResponseMode = ResponseMode.COMPACT,
+        request: Optional[RetrievalRequest] = None
+    ) -> str:
+        """Async query(): answer text only"""
+        result = await self.aquery_with_sources(
+            query, metadata_filters, response_mode, request=request
+        )
+        return result.answer
@@ -0,0 +1,264 @@
+"""
+Sparse lexical (BM25) index of a collection, stored on disk next to the vector store
+"""
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[.\-][^\W_]+)*", re.UNICODE)
+
+# Frequent English/French words carrying no retrieval signal
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the their this to
+was were will with
+s we our us which not may such other any all these those than into also can could would should
+le la les un une des du de d l et ou en au aux est sont que qui quoi quel quels quelle quelles
+pour par sur dans avec ce cette ces se sa son ses leur leurs il elle ils elles nous vous
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens (keeps "10-k", "u.s." and numbers), without stopwords"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    BM25 index of the chunks of one collection.
+
+    Files in the index directory:
+
+    - terms.json: term -> [offset, document frequency] into the postings
+    - postings_docs.npy / postings_tf.npy: document rows and term
+      frequencies, grouped by term (memory-mapped at query time)
+    - doc_lengths.npy, doc_ids.json: token count and node id per row
+    - forward.json: node id -> term frequencies, used to apply additions
+      and deletions without re-reading the vector store
+
+    Searching reads only the postings of the query terms. The index is
+    reloaded automatically when another instance rewrites it.
+    """
+
+    def __init__(self, index_dir: str, k1: float = 1.2, b: float = 0.75):
+        """
+        Open (or start) the index stored in index_dir
+
+        Args:
+            index_dir: Directory of the index files
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._loaded_mtime = None
+        self._terms: Dict[str, List[int]] = {}
+        self._doc_ids: List[str] = []
+        self._postings_docs = np.zeros(0, dtype=np.int32)
+        self._postings_tf = np.zeros(0, dtype=np.uint16)
+        self._doc_lengths = np.zeros(0, dtype=np.int32)
+        self._avgdl = 0.0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    @property
+    def exists(self) -> bool:
+        """True if the index has been built"""
+        return os.path.exists(self._path("meta.json"))
+
+    def count(self) -> int:
+        """Number of indexed chunks"""
+        with self._lock:
+            self._maybe_reload()
+            return len(self._doc_ids)
+
+    def nbytes(self) -> int:
+        """Memory of the loaded index: postings arrays, term table and chunk ids"""
+        with self._lock:
+            self._maybe_reload()
+            arrays = (
+                self._postings_docs.nbytes + self._postings_tf.nbytes + self._doc_lengths.nbytes
+            )
+            # Each term maps to an [offset, document frequency] list of two ints
+            term_table = sys.getsizeof(self._terms) + sum(
+                sys.getsizeof(term) + sys.getsizeof(entry) + 2 * sys.getsizeof(0)
+                for term, entry in self._terms.items()
+            )
+            doc_ids = sys.getsizeof(self._doc_ids) + sum(
+                sys.getsizeof(node_id) for node_id in self._doc_ids
+            )
+            return arrays + term_table + doc_ids
+
+    def _maybe_reload(self):
+        """(Re)load the index files if they changed on disk"""
+        try:
+            mtime = os.stat(self._path("meta.json")).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with open(self._path("meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(self._path("terms.json"), 'r', encoding='utf-8') as f:
+            self._terms = json.load(f)
+        with open(self._path("doc_ids.json"), 'r', encoding='utf-8') as f:
+            self._doc_ids = json.load(f)
+        self._postings_docs = np.load(self._path("postings_docs.npy"), mmap_mode='r')
+        self._postings_tf = np.load(self._path("postings_tf.npy"), mmap_mode='r')
+        self._doc_lengths = np.load(self._path("doc_lengths.npy"), mmap_mode='r')
+        self._avgdl = meta.get('avgdl', 0.0)
+        self._loaded_mtime = mtime
+
+    def _load_forward(self) -> Dict[str, Dict[str, int]]:
+        try:
+            with open(self._path("forward.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def update(
+        self,
+        added: Iterable[Tuple[str, str]] = (),
+        deleted: Iterable[str] = ()
+    ):
+        """
+        Add and remove chunks, then rewrite the inverted index
+
+        Args:
+            added: (node id, text) pairs
+            deleted: Node ids to remove
+        """
+        with self._lock:
+            forward = self._load_forward()
+            for node_id in deleted:
+                forward.pop(node_id, None)
+            for node_id, text in added:
+                forward[node_id] = dict(Counter(tokenize(text)))
+            self._write(forward)
+
+    def clear(self):
+        """Remove every chunk"""
+        with self._lock:
+            self._write({})
+
+    def _write(self, forward: Dict[str, Dict[str, int]]):
+        """Build the inverted index from the forward index and save it atomically"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        doc_ids = sorted(forward)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = np.zeros(len(doc_ids), dtype=np.int32)
+        for row, node_id in enumerate(doc_ids):
+            term_freqs = forward[node_id]
+            doc_lengths[row] = sum(term_freqs.values())
+            for term, tf in term_freqs.items():
+                postings.setdefault(term, []).append((row, tf))
+
+        terms = {}
+        docs_parts, tf_parts = [], []
+        offset = 0
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = [offset, len(entries)]
+            docs_parts.append(
+                np.fromiter((row for row, _ in entries), dtype=np.int32, count=len(entries))
+            )
+            tf_parts.append(
+                np.fromiter(
+                    (min(tf, 65535) for _, tf in entries), dtype=np.uint16, count=len(entries)
+                )
+            )
+            offset += len(entries)
+
+        files = {
+            "postings_docs.npy": (
+                np.concatenate(docs_parts) if docs_parts else np.zeros(0, dtype=np.int32)
+            ),
+            "postings_tf.npy": (
+                np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.uint16)
+            ),
+            "doc_lengths.npy": doc_lengths,
+        }
+        for name, array in files.items():
+            np.save(self._path(f"{name}.tmp.npy"), array)
+            os.replace(self._path(f"{name}.tmp.npy"), self._path(name))
+        jsons = {
+            "terms.json": terms,
+            "doc_ids.json": doc_ids,
+            "forward.json": forward,
+            # meta.json last: its mtime tells readers to reload
+            "meta.json": {
+                'documents': len(doc_ids),
+                'avgdl': float(doc_lengths.mean()) if len(doc_ids) else 0.0,
+                'k1': self.k1,
+                'b': self.b
+            },
+        }
+        for name, data in jsons.items():
+            with open(self._path(f"{name}.tmp"), 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(self._path(f"{name}.tmp"), self._path(name))
+        self._loaded_mtime = None
+        self._maybe_reload()
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 20,
+        allowed_ids: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank chunks by BM25 score
+
+        Args:
+            query: Query text
+            top_k: Number of results
+            allowed_ids: Optional restriction to these node ids
+
+        Returns:
+            (node id, score) pairs, best first; chunks sharing no term with
+            the query are never returned
+        """
+        with self._lock:
+            self._maybe_reload()
+            n_docs = len(self._doc_ids)
+            if n_docs == 0:
+                return []
+
+            scores = np.zeros(n_docs, dtype=np.float32)
+            doc_lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(self._avgdl, 1e-9))
+            for term in set(tokenize(query)):
+                entry = self._terms.get(term)
+                if entry is None:
+                    continue
+                offset, df = entry
+                rows = np.asarray(self._postings_docs[offset:offset + df])
+                tf = np.asarray(self._postings_tf[offset:offset + df], dtype=np.float32)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm[rows])
+
+            if allowed_ids is not None:
+                mask = np.fromiter(
+                    (node_id in allowed_ids for node_id in self._doc_ids), dtype=bool, count=n_docs
+                )
+                scores[~mask] = 0.0
+
+            matching = np.flatnonzero(scores > 0)
+            if len(matching) == 0:
+                return []
+            k = min(top_k, len(matching))
+            best = matching[np.argpartition(-scores[matching], k - 1)[:k]]
+            best = best[np.argsort(-scores[best])]
+            return [(self._doc_ids[row], float(scores[row])) for row in best]
@@ -0,0 +1,393 @@
+"""
+Process-wide registry of vector store clients, collections and indexes
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from llama_index.core import VectorStoreIndex, StorageContext
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.vector_stores.chroma import ChromaVectorStore
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from src.rag.flat_store import HNSW_LINK_BYTES, NumpyVectorStore
+from src.rag.sparse import BM25Index
+from src.rag.parents import ParentStore
+
+# Supported vector store backends
+CHROMA = "chroma"
+NUMPY = "numpy"
+NUMPY_FLOAT16 = "numpy-f16"
+VECTOR_BACKENDS = (CHROMA, NUMPY, NUMPY_FLOAT16)
+
+
+class CollectionHandle:
+    """
+    Chroma collection resolved through the registry on every use.
+
+    A Collection object is bound to one collection id: once the collection
+    is dropped (reset re-ingestion) it fails. Vector stores are given this
+    handle instead, so they always reach the current collection.
+    """
+
+    def __init__(self, registry: "VectorStoreRegistry", persist_dir: str, collection_name: str):
+        self._registry = registry
+        self._persist_dir = persist_dir
+        self._collection_name = collection_name
+
+    def __getattr__(self, name: str):
+        return getattr(
+            self._registry.get_collection(self._persist_dir, self._collection_name), name
+        )
+
+
+class VectorStoreRegistry:
+    """
+    Opens one ChromaDB PersistentClient per directory and caches collection
+    handles and VectorStoreIndex objects per collection.
+
+    Several PersistentClients on the same path in one process contend on
+    the same SQLite file, so every DocumentIngester and retriever goes
+    through this registry. All methods are safe to call from concurrent
+    Flask threads.
+
+    Besides Chroma, collections can live in the in-process NumpyVectorStore
+    (backend "numpy", or "numpy-f16" for float16 vectors), stored under
+    {persist_dir}/{backend}/{collection}.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients: Dict[str, chromadb.ClientAPI] = {}
+        self._collections: Dict[Tuple[str, str], object] = {}
+        self._numpy_stores: Dict[Tuple[str, str, str], NumpyVectorStore] = {}
+        self._indexes: Dict[Tuple[str, str, str], VectorStoreIndex] = {}
+        self._sparse_indexes: Dict[str, BM25Index] = {}
+        self._parent_stores: Dict[str, ParentStore] = {}
+        self._collection_locks: Dict[Tuple[str, str], threading.RLock] = {}
+
+    @staticmethod
+    def _key(persist_dir: str, collection_name: str) -> Tuple[str, str]:
+        return os.path.abspath(persist_dir), collection_name
+
+    @staticmethod
+    def _check_backend(backend: str):
+        if backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend: {backend}")
+
+    @staticmethod
+    def numpy_store_path(persist_dir: str, collection_name: str, backend: str = NUMPY) -> str:
+        """Directory of a NumpyVectorStore collection"""
+        return os.path.join(os.path.abspath(persist_dir), backend, collection_name)
+
+    def get_client(self, persist_dir: str):
+        """
+        Get the shared ChromaDB client for a directory
+
+        Args:
+            persist_dir: Directory of the persistent vector store
+
+        Returns:
+            ChromaDB client
+        """
+        path = os.path.abspath(persist_dir)
+        with self._lock:
+            client = self._clients.get(path)
+            if client is None:
+                os.makedirs(path, exist_ok=True)
+                client = chromadb.PersistentClient(
+                    path=path,
+                    settings=ChromaSettings(anonymized_telemetry=False)
+                )
+                self._clients[path] = client
+            return client
+
+    def get_collection(self, persist_dir: str, collection_name: str):
+        """
+        Get (or create) a collection handle
+
+        Args:
+            persist_dir: Directory of the persistent vector store
+            collection_name: Name of the ChromaDB collection
+
+        Returns:
+            ChromaDB collection
+        """
+        key = self._key(persist_dir, collection_name)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is None:
+                collection = self.get_client(persist_dir).get_or_create_collection(collection_name)
+                self._collections[key] = collection
+            return collection
+
+    def get_numpy_store(
+        self, persist_dir: str, collection_name: str, backend: str = NUMPY
+    ) -> NumpyVectorStore:
+        """
+        Get (or create) an in-process NumpyVectorStore collection
+
+        Args:
+            persist_dir: Directory of the persistent vector store
+            collection_name: Name of the collection
+            backend: "numpy" (float32) or "numpy-f16" (float16)
+
+        Returns:
+            NumpyVectorStore instance
+        """
+        key = (*self._key(persist_dir, collection_name), backend)
+        with self._lock:
+            store = self._numpy_stores.get(key)
+            if store is None:
+                store = NumpyVectorStore(
+                    self.numpy_store_path(persist_dir, collection_name, backend),
+                    dtype="float16" if backend == NUMPY_FLOAT16 else "float32"
+                )
+                self._numpy_stores[key] = store
+            return store
+
+    def get_vector_store(self, persist_dir: str, collection_name: str, backend: str = CHROMA):
+        """Get the LlamaIndex vector store of a collection for a backend"""
+        self._check_backend(backend)
+        if backend == CHROMA:
+            # Create the collection now, look it up again on every use
+            self.get_collection(persist_dir, collection_name)
+            return ChromaVectorStore(
+                chroma_collection=CollectionHandle(self, persist_dir, collection_name)
+            )
+        return self.get_numpy_store(persist_dir, collection_name, backend)
+
+    def get_index(
+        self,
+        persist_dir: str,
+        collection_name: str,
+        embed_model: Optional[BaseEmbedding] = None,
+        backend: str = CHROMA
+    ) -> VectorStoreIndex:
+        """
+        Get the VectorStoreIndex of a collection, building it once
+
+        Args:
+            persist_dir: Directory of the persistent vector store
+            collection_name: Name of the collection
+            embed_model: Embedding model (defaults to Settings.embed_model)
+            backend: Vector store backend ("chroma", "numpy" or "numpy-f16")
+
+        Returns:
+            VectorStoreIndex instance
+        """
+        key = (*self._key(persist_dir, collection_name), backend)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                vector_store = self.get_vector_store(persist_dir, collection_name, backend)
+                storage_context = StorageContext.from_defaults(vector_store=vector_store)
+                kwargs = {'embed_model': embed_model} if embed_model is not None else {}
+                index = VectorStoreIndex.from_vector_store(
+                    vector_store=vector_store,
+                    storage_context=storage_context,
+                    **kwargs
+                )
+                self._indexes[key] = index
+            return index
+
+    @staticmethod
+    def sparse_index_path(persist_dir: str, collection_name: str, backend: str = CHROMA) -> str:
+        """Directory of the BM25 index of a collection"""
+        base = os.path.abspath(persist_dir)
+        if backend != CHROMA:
+            base = os.path.join(base, backend)
+        return os.path.join(base, "sparse", collection_name)
+
+    def get_sparse_index(
+        self, persist_dir: str, collection_name: str, backend: str = CHROMA
+    ) -> BM25Index:
+        """
+        Get the BM25 index built alongside a collection
+
+        Args:
+            persist_dir: Directory of the persistent vector store
+            collection_name: Name of the collection
+            backend: Vector store backend the index belongs to
+
+        Returns:
+            BM25Index instance (empty if never built)
+        """
+        path = self.sparse_index_path(persist_dir, collection_name, backend)
+        with self._lock:
+            index = self._sparse_indexes.get(path)
+            if index is None:
+                index = BM25Index(path)
+                self._sparse_indexes[path] = index
+            return index
+
+    @staticmethod
+    def parent_store_path(persist_dir: str, collection_name: str, backend: str = CHROMA) -> str:
+        """File of the parent chunks of a collection (parent/child indexing)"""
+        base = os.path.abspath(persist_dir)
+        if backend != CHROMA:
+            base = os.path.join(base, backend)
+        return os.path.join(base, "parents", f"{collection_name}.json")
+
+    def get_parent_store(
+        self, persist_dir: str, collection_name: str, backend: str = CHROMA
+    ) -> ParentStore:
+        """
+        Get the parent chunks of a collection indexed in parent/child mode
+
+        Args:
+            persist_dir: Directory of the persistent vector store
+            collection_name: Name of the collection
+            backend: Vector store backend the parents belong to
+
+        Returns:
+            ParentStore instance (empty if the collection has no parents)
+        """
+        path = self.parent_store_path(persist_dir, collection_name, backend)
+        with self._lock:
+            store = self._parent_stores.get(path)
+            if store is None:
+                store = ParentStore(path)
+                self._parent_stores[path] = store
+            return store
+
+    def collection_lock(self, persist_dir: str, collection_name: str) -> threading.RLock:
+        """Lock serializing writes (ingestion, manifest updates) to a collection"""
+        key = self._key(persist_dir, collection_name)
+        with self._lock:
+            return self._collection_locks.setdefault(key, threading.RLock())
+
+    def has_collection(self, persist_dir: str, collection_name: str, backend: str = CHROMA) -> bool:
+        """True if the collection exists on disk"""
+        self._check_backend(backend)
+        key = self._key(persist_dir, collection_name)
+        if backend != CHROMA:
+            return os.path.exists(
+                os.path.join(
+                    self.numpy_store_path(persist_dir, collection_name, backend), "nodes.json"
+                )
+            )
+        with self._lock:
+            if key in self._collections:
+                return True
+            try:
+                self.get_client(persist_dir).get_collection(collection_name)
+                return True
+            except Exception:
+                return False
+
+    def count(self, persist_dir: str, collection_name: str, backend: str = CHROMA) -> int:
+        """Number of vectors in a collection"""
+        if backend == CHROMA:
+            return self.get_collection(persist_dir, collection_name).count()
+        return self.get_numpy_store(persist_dir, collection_name, backend).count()
+
+    def delete_nodes(
+        self, persist_dir: str, collection_name: str, node_ids: List[str], backend: str = CHROMA
+    ):
+        """Delete vectors by node id"""
+        if backend == CHROMA:
+            self.get_collection(persist_dir, collection_name).delete(ids=node_ids)
+        else:
+            self.get_numpy_store(persist_dir, collection_name, backend).delete_nodes(node_ids)
+
+    def persist(self, persist_dir: str, collection_name: str, backend: str = CHROMA):
+        """Write the vectors inserted since the last persist (Chroma writes on insert)"""
+        if backend != CHROMA:
+            self.get_numpy_store(persist_dir, collection_name, backend).persist()
+
+    def delete_collection(self, persist_dir: str, collection_name: str, backend: str = CHROMA):
+        """
+        Drop a collection; the handles given out before stay valid
+
+        Chroma vector stores look their collection up on each use, and the
+        NumPy store, BM25 index and parent store are emptied in place, so
+        retrievers and query engines built earlier see the new content
+        instead of a deleted collection.
+        """
+        self._check_backend(backend)
+        key = self._key(persist_dir, collection_name)
+        with self._lock:
+            self.get_sparse_index(persist_dir, collection_name, backend).clear()
+            self.get_parent_store(persist_dir, collection_name, backend).clear()
+            if backend != CHROMA:
+                self.get_numpy_store(persist_dir, collection_name, backend).clear()
+                return
+            self._collections.pop(key, None)
+            try:
+                self.get_client(persist_dir).delete_collection(collection_name)
+            except Exception:
+                pass
+
+    def release(self, persist_dir: str, collection_name: str) -> bool:
+        """
+        Forget the cached index, vectors, BM25 index and parents of a collection
+
+        The objects are freed once no retriever uses them any more; the next
+        get_index() reloads them from disk. Chroma keeps loaded collections
+        in its own segment cache, only the handle is dropped here. A
+        collection being written (ingestion in progress) is left alone.
+
+        Args:
+            persist_dir: Directory of the persistent vector store
+            collection_name: Name of the collection
+
+        Returns:
+            True if the collection was released
+        """
+        key = self._key(persist_dir, collection_name)
+        lock = self.collection_lock(persist_dir, collection_name)
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                self._collections.pop(key, None)
+                for cache in (self._indexes, self._numpy_stores):
+                    for cached_key in [k for k in cache if k[:2] == key]:
+                        del cache[cached_key]
+                for backend in VECTOR_BACKENDS:
+                    self._sparse_indexes.pop(
+                        self.sparse_index_path(persist_dir, collection_name, backend), None
+                    )
+                    self._parent_stores.pop(
+                        self.parent_store_path(persist_dir, collection_name, backend), None
+                    )
+            return True
+        finally:
+            lock.release()
+
+
+def vector_store_nbytes(vector_store) -> int:
+    """
+    Memory held by the vectors of a collection, from its size and dimension
+
+    Chroma keeps a float32 HNSW index of each loaded collection in native
+    memory, which Python object sizes do not show.
+
+    Args:
+        vector_store: NumpyVectorStore or ChromaVectorStore
+
+    Returns:
+        Estimated size in bytes (0 if unknown)
+    """
+    if isinstance(vector_store, NumpyVectorStore):
+        return vector_store.nbytes()
+    if not isinstance(vector_store, ChromaVectorStore):
+        return 0
+    try:
+        collection = vector_store.client
+        count = collection.count()
+        if not count:
+            return 0
+        dim = len(collection.get(limit=1, include=['embeddings'])['embeddings'][0])
+    except Exception:
+        return 0
+    return count * (dim * 4 + HNSW_LINK_BYTES)
+
+
+# Shared registry for the whole process
+_registry = VectorStoreRegistry()
+
+
+def get_vector_store_registry() -> VectorStoreRegistry:
+    """Get the process-wide vector store registry"""
+    return _registry
@@ -0,0 +1,249 @@
+"""
+Background ingestion job queue (download, parse, chunk, embed, insert)
+"""
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# progress(stage, fraction, message) callback given to the runner
+ProgressCallback = Callable[[str, float, str], None]
+
+
+def normalize_ticker(ticker: str) -> str:
+    """Ticker as used in job keys ("aapl " and "AAPL" share their jobs)"""
+    return ticker.strip().upper()
+
+
+class IngestionJob:
+    """
+    State of one ingestion job for a ticker
+    """
+
+    def __init__(self, ticker: str, job_id: Optional[str] = None, created_at: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.ticker = ticker
+        self.status = QUEUED
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.message = 'En attente de traitement...'
+        self.error = None
+        self.created_at = created_at or datetime.now().isoformat()
+        self.updated_at = self.created_at
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'ticker': self.ticker,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'message': self.message,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IngestionJob":
+        job = cls(data['ticker'], job_id=data['id'])
+        for key in ('status', 'stage', 'progress', 'message', 'error', 'created_at', 'updated_at'):
+            if key in data:
+                setattr(job, key, data[key])
+        return job
+
+
+class IngestionJobQueue:
+    """
+    Runs ingestion jobs on a bounded thread pool so HTTP workers never block
+    on it. Concurrent requests for the same ticker share a single job, job
+    state is persisted as JSON so it survives restarts, and listeners can
+    wait for progress updates (used for Server-Sent Events). Finished jobs
+    are forgotten, in memory and on disk, finished_ttl seconds after they
+    ended.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[str, ProgressCallback], object],
+        max_workers: int = 2,
+        state_dir: str = "data/jobs",
+        finished_ttl: Optional[float] = 86400.0,
+        clock: Callable[[], datetime] = datetime.now
+    ):
+        """
+        Initialize the job queue
+
+        Args:
+            runner: Function doing the work for a ticker, called with a progress callback
+            max_workers: Number of worker threads
+            state_dir: Directory where job states are persisted
+            finished_ttl: Seconds a done or failed job is kept (None: forever)
+            clock: Current time source
+        """
+        self.runner = runner
+        self.state_dir = state_dir
+        self.finished_ttl = finished_ttl
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._latest_by_ticker: Dict[str, str] = {}
+
+        os.makedirs(state_dir, exist_ok=True)
+        self._load_persisted_jobs()
+
+    def _load_persisted_jobs(self):
+        """Reload job states; jobs interrupted by a restart are marked failed"""
+        for filename in sorted(os.listdir(self.state_dir)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.state_dir, filename), 'r', encoding='utf-8') as f:
+                    job = IngestionJob.from_dict(json.load(f))
+            except Exception as e:
+                print(f"Warning: Could not load ingestion job {filename}: {e}")
+                continue
+            job.ticker = normalize_ticker(job.ticker)
+            if job.is_active:
+                job.status = FAILED
+                job.error = 'interrupted'
+                job.message = "Traitement interrompu par un redémarrage du serveur."
+                self._persist(job)
+            self._jobs[job.id] = job
+            latest_id = self._latest_by_ticker.get(job.ticker)
+            if latest_id is None or self._jobs[latest_id].created_at <= job.created_at:
+                self._latest_by_ticker[job.ticker] = job.id
+        self._prune_locked()
+
+    def _prune_locked(self):
+        """Forget the finished jobs older than finished_ttl and delete their files"""
+        if self.finished_ttl is None:
+            return
+        deadline = self._clock() - timedelta(seconds=self.finished_ttl)
+        expired = [
+            job for job in self._jobs.values()
+            if not job.is_active and datetime.fromisoformat(job.updated_at) < deadline
+        ]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._latest_by_ticker.get(job.ticker) == job.id:
+                del self._latest_by_ticker[job.ticker]
+            try:
+                os.remove(os.path.join(self.state_dir, f"{job.id}.json"))
+            except OSError:
+                pass
+
+    def _persist(self, job: IngestionJob):
+        """Write a job state to disk"""
+        path = os.path.join(self.state_dir, f"{job.id}.json")
+        try:
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            print(f"Warning: Could not persist ingestion job {job.id}: {e}")
+
+    def submit(self, ticker: str) -> IngestionJob:
+        """
+        Enqueue an ingestion job for a ticker (or return the one already running)
+
+        Args:
+            ticker: Stock ticker symbol
+
+        Returns:
+            IngestionJob instance
+        """
+        ticker = normalize_ticker(ticker)
+        with self._lock:
+            self._prune_locked()
+            current = self._get_latest_locked(ticker)
+            if current is not None and current.is_active:
+                return current
+            job = IngestionJob(ticker, created_at=self._clock().isoformat())
+            self._jobs[job.id] = job
+            self._latest_by_ticker[ticker] = job.id
+            self._persist(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Get a job by id"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_latest(self, ticker: str) -> Optional[IngestionJob]:
+        """Get the most recent job for a ticker"""
+        with self._lock:
+            return self._get_latest_locked(ticker)
+
+    def _get_latest_locked(self, ticker: str) -> Optional[IngestionJob]:
+        job_id = self._latest_by_ticker.get(normalize_ticker(ticker))
+        return self._jobs.get(job_id) if job_id else None
+
+    def discard(self, ticker: str):
+        """Forget the latest job of a ticker (so the next request starts a new one)"""
+        with self._lock:
+            job = self._get_latest_locked(ticker)
+            if job is not None and not job.is_active:
+                del self._latest_by_ticker[job.ticker]
+
+    def list_jobs(self) -> List[IngestionJob]:
+        """All known jobs, most recent first"""
+        with self._lock:
+            self._prune_locked()
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def wait_for_update(self, job: IngestionJob, since: str, timeout: float = 15.0) -> Dict:
+        """
+        Block until the job changes after `since` (updated_at) or the timeout expires
+
+        Returns:
+            Current job state as a dictionary
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job.updated_at != since or not job.is_active, timeout=timeout
+            )
+            return job.to_dict()
+
+    def _update(self, job: IngestionJob, **changes):
+        """Apply changes to a job, persist them and wake up listeners"""
+        with self._changed:
+            for key, value in changes.items():
+                setattr(job, key, value)
+            job.updated_at = self._clock().isoformat()
+            self._persist(job)
+            self._changed.notify_all()
+
+    def _run(self, job: IngestionJob):
+        """Worker: run the ingestion and record progress"""
+        self._update(job, status=RUNNING, stage='starting', message='Démarrage...')
+
+        def progress(stage: str, fraction: float, message: str):
+            self._update(job, stage=stage, progress=max(0.0, min(1.0, fraction)), message=message)
+
+        try:
+            self.runner(job.ticker, progress)
+            self._update(
+                job, status=DONE, stage='ready', progress=1.0, message='Rapport 10-K prêt.'
+            )
+        except Exception as e:
+            print(f"Ingestion job {job.id} for {job.ticker} failed: {e}")
+            self._update(job, status=FAILED, error=str(e), message=f"Échec de la préparation: {e}")
@@ -0,0 +1,324 @@
+"""
+Bounded cache of per-ticker resources (retriever, agent) with LRU and idle eviction
+"""
+import gc
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+# Objects that are never counted in an entry's cost (shared code, not data)
+_SKIPPED_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.MethodDescriptorType, types.CodeType, types.FrameType
+)
+
+
+def estimate_size(obj: Any, exclude: Iterable[Any] = (), max_objects: int = 200_000) -> int:
+    """
+    Approximate memory footprint of an object graph, in bytes
+
+    Walks the objects reachable from obj (gc referents) and sums their
+    shallow sizes. Shared objects (LLM, embedding model...) should be listed
+    in exclude so they are not charged to every entry. Memory-mapped arrays
+    only count their header.
+
+    Args:
+        obj: Root object
+        exclude: Objects not counted, nor walked into
+        max_objects: Maximum number of objects visited (bounds the cost of the walk)
+
+    Returns:
+        Estimated size in bytes
+    """
+    seen = {id(o) for o in exclude if o is not None}
+    stack = [obj]
+    total = 0
+    visited = 0
+    while stack and visited < max_objects:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIPPED_TYPES):
+            continue
+        seen.add(id(current))
+        visited += 1
+        total += sys.getsizeof(current, 0)
+        stack.extend(gc.get_referents(current))
+    return total
+
+
+@dataclass
+class CacheEntry:
+    """Cached value with its cost and access bookkeeping"""
+    value: Any
+    cost: int
+    created_at: float
+    last_access: float
+    costed_at: float
+    hits: int = 0
+
+
+class ResourceCache:
+    """
+    LRU cache of heavy per-key resources, bounded by entry count and by
+    estimated memory.
+
+    - the least recently used entries are evicted when either bound is exceeded
+    - entries idle for longer than idle_ttl are dropped
+    - each entry's cost comes from estimate_cost, refreshed at most every
+      cost_refresh_interval seconds while the entry is used (agents grow
+      with their chat memory)
+    - creation is serialized per key: concurrent first requests for the same
+      key build the resource once
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        max_bytes: int = 1024 * 1024 * 1024,
+        idle_ttl: Optional[float] = 3600.0,
+        estimate_cost: Callable[[Any], int] = estimate_size,
+        cost_refresh_interval: float = 60.0,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of entries
+            max_bytes: Maximum total estimated cost, in bytes
+            idle_ttl: Seconds after which an unused entry expires (None: never)
+            estimate_cost: Function returning the cost (bytes) of a value
+            cost_refresh_interval: Minimum seconds between two estimates of an entry
+            on_evict: Called with (key, value) when an entry is evicted or expires
+            clock: Time source (seconds)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.estimate_cost = estimate_cost
+        self.cost_refresh_interval = cost_refresh_interval
+        self.on_evict = on_evict
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        # key -> [lock, number of threads holding or waiting for it]
+        self._creation_locks: Dict[Hashable, list] = {}
+        self._total_cost = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        self.evict_expired()
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        self.evict_expired()
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self) -> List[Hashable]:
+        """Keys of the live entries, least recently used first"""
+        self.evict_expired()
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, key: Hashable, default: Any = None, touch: bool = True) -> Any:
+        """
+        Value of a key
+
+        Args:
+            key: Cache key
+            default: Returned when the key is missing or expired
+            touch: Count the access (LRU order, idle time, hit statistics)
+
+        Returns:
+            Cached value or default
+        """
+        refresh = False
+        with self._lock:
+            expired = self._expire_locked()
+            entry = self._entries.get(key)
+            if entry is None:
+                if touch:
+                    self.misses += 1
+                value = default
+            else:
+                value = entry.value
+                if touch:
+                    self.hits += 1
+                    entry.hits += 1
+                    entry.last_access = self._clock()
+                    self._entries.move_to_end(key)
+                    # Claim the refresh so concurrent readers do not repeat it
+                    refresh = entry.last_access - entry.costed_at >= self.cost_refresh_interval
+                    if refresh:
+                        entry.costed_at = entry.last_access
+        self._notify(expired)
+        if refresh:
+            self.refresh_cost(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> Any:
+        """Add or replace an entry, then evict down to the bounds"""
+        cost = self.estimate_cost(value)
+        evicted = []
+        with self._lock:
+            now = self._clock()
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_cost -= previous.cost
+            self._entries[key] = CacheEntry(
+                value=value, cost=0, created_at=now, last_access=now, costed_at=now
+            )
+            self._set_cost_locked(self._entries[key], cost)
+            evicted.extend(self._shrink_locked(keep=key))
+        self._notify(evicted)
+        return value
+
+    def refresh_cost(self, key: Hashable):
+        """Re-estimate the cost of an entry after its value changed"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return
+        cost = self.estimate_cost(entry.value)
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            entry.costed_at = self._clock()
+            self._set_cost_locked(entry, cost)
+            evicted = self._shrink_locked(keep=key)
+        self._notify(evicted)
+
+    @contextmanager
+    def creation_lock(self, key: Hashable):
+        """Serialize the creation (or update) of the resource of a key"""
+        with self._lock:
+            holder = self._creation_locks.setdefault(key, [threading.Lock(), 0])
+            holder[1] += 1
+        try:
+            with holder[0]:
+                yield
+        finally:
+            # The last user drops the lock: keys seen once do not keep one forever
+            with self._lock:
+                holder[1] -= 1
+                if not holder[1]:
+                    del self._creation_locks[key]
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Value of a key, created by factory on a miss (once, even under concurrency)
+
+        Args:
+            key: Cache key
+            factory: Builds the value
+
+        Returns:
+            Cached or newly created value
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        with self.creation_lock(key):
+            value = self.get(key, missing, touch=False)
+            if value is missing:
+                value = self.put(key, factory())
+            return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry (without calling on_evict)"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self._total_cost -= entry.cost
+            return entry.value
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._total_cost = 0
+
+    def evict_expired(self) -> int:
+        """Drop the entries idle for longer than idle_ttl; returns their number"""
+        with self._lock:
+            expired = self._expire_locked()
+        self._notify(expired)
+        return len(expired)
+
+    def _set_cost_locked(self, entry: CacheEntry, cost: int):
+        self._total_cost += cost - entry.cost
+        entry.cost = cost
+
+    def _expire_locked(self) -> list:
+        if self.idle_ttl is None:
+            return []
+        deadline = self._clock() - self.idle_ttl
+        expired = [
+            (key, entry) for key, entry in self._entries.items() if entry.last_access < deadline
+        ]
+        for key, entry in expired:
+            del self._entries[key]
+            self._total_cost -= entry.cost
+        self.expirations += len(expired)
+        return expired
+
+    def _shrink_locked(self, keep: Hashable) -> list:
+        """Evict least recently used entries (never `keep`) until within bounds"""
+        evicted = []
+        while len(self._entries) > self.max_entries or self._total_cost > self.max_bytes:
+            key = next((k for k in self._entries if k != keep), None)
+            if key is None:
+                break
+            entry = self._entries.pop(key)
+            self._total_cost -= entry.cost
+            evicted.append((key, entry))
+        self.evictions += len(evicted)
+        return evicted
+
+    def _notify(self, removed: list):
+        if not self.on_evict:
+            return
+        for key, entry in removed:
+            try:
+                self.on_evict(key, entry.value)
+            except Exception as e:
+                print(f"Warning: eviction callback failed for {key}: {e}")
+
+    def stats(self) -> Dict:
+        """Cache statistics and per-entry costs (for monitoring)"""
+        self.evict_expired()
+        with self._lock:
+            now = self._clock()
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'total_bytes': self._total_cost,
+                'max_bytes': self.max_bytes,
+                'idle_ttl': self.idle_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'items': [
+                    {
+                        'key': str(key),
+                        'bytes': entry.cost,
+                        'hits': entry.hits,
+                        'age_seconds': round(now - entry.created_at, 1),
+                        'idle_seconds': round(now - entry.last_access, 1)
+                    }
+                    for key, entry in reversed(self._entries.items())
+                ]
+            }
@@ -15,6 +15,7 @@ from src.data.sec_edgar import SecEdgarClient
 from src.rag.ingestion import DocumentIngester
 from src.rag.retrieval import AdvancedRAGRetriever
 from src.agents.finance_agent import FinanceAgent
+from src.rag.llm_cache import cached_llm_from_env
 from llama_index.llms.gemini import Gemini
 from llama_index.core.llms import LLM
 
@@ -32,7 +33,8 @@ def initialize_llm(model_name: str = "gemini-2.0-flash-exp"):
             model_name = f'models/{model_name}'
         
         llm = Gemini(api_key=api_key, model=model_name)
-        return llm
+        # Identical prompts are answered from the persistent response cache
+        return cached_llm_from_env(llm)
     except Exception as e:
         print(f"Error initializing LLM: {e}")
         return None
@@ -138,35 +140,26 @@ def set_ticker():
     
     session['ticker'] = ticker
     
-    # Optionally initialize RAG system
+    # Optionally initialize RAG system (in a background job, the request does not wait)
     if initialize_rag and ticker:
         try:
-            from src.web.routes.chat import initialize_rag_system, initialize_llm
-            from src.agents.finance_agent import FinanceAgent
+            from src.web.routes.chat import get_ingestion_queue, get_resource_cache
             
-            # Initialize RAG
-            retriever, _ = initialize_rag_system(ticker)
-            
-            # Initialize LLM
-            llm = initialize_llm()
-            if llm:
-                # Create agent
-                agent = FinanceAgent(
-                    rag_retriever=retriever,
-                    alpha_vantage_client=AlphaVantageClient(),
-                    llm=llm,
-                    verbose=False
-                )
-                
-                # Cache agent
-                from src.web.routes.chat import _agents_cache
-                _agents_cache[ticker] = agent
-                
+            if ticker in get_resource_cache():
                 return jsonify({
-                    'success': True, 
+                    'success': True,
                     'ticker': ticker,
                     'rag_initialized': True
                 })
+
+            job = get_ingestion_queue().submit(ticker)
+            return jsonify({
+                'success': True,
+                'ticker': ticker,
+                'rag_initialized': False,
+                'rag_initializing': True,
+                'job': job.to_dict()
+            })
         except Exception as e:
             # Continue even if RAG initialization fails
             return jsonify({
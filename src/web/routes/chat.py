@@ -1,27 +1,135 @@
 """
 Chat/Assistant routes for Flask application
 """
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
 import os
 import sys
+import json
+import threading
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
 
 from src.agents.finance_agent import FinanceAgent
-from src.rag.ingestion import DocumentIngester
+from src.agents.memory import ConversationMemory, get_summary_executor, llm_summarizer
+from src.agents.router import compared_tickers
+from src.agents.streaming import StreamEvent, DONE as ANSWER_DONE, ERROR as ANSWER_ERROR
+from src.rag.ingestion import DEFAULT_PERSIST_DIR, DocumentIngester
 from src.rag.retrieval import AdvancedRAGRetriever
+from src.rag.context import ContextBuilder
+from src.rag.federated import FederatedRetriever, detect_tickers
+from src.rag.rerank import get_reranker
+from src.rag.store_registry import get_vector_store_registry, vector_store_nbytes
 from llama_index.core import QueryBundle
 from src.data.alpha_vantage import AlphaVantageClient
 from src.data.sec_edgar import SecEdgarClient
+from src.web.ingestion_jobs import IngestionJobQueue, DONE, FAILED, normalize_ticker
+from src.web.resource_cache import ResourceCache, estimate_size
+from src.rag.llm_cache import cached_llm_from_env
 from llama_index.llms.gemini import Gemini
 from llama_index.core.llms import LLM
 
 bp = Blueprint('chat', __name__, url_prefix='/api/chat')
 
-# Store agents in memory (in production, use Redis or database)
-_agents_cache = {}
-_rag_retrievers_cache = {}
+
+@dataclass
+class TickerResources:
+    """RAG retriever of a ticker and, once created, its agent"""
+    retriever: AdvancedRAGRetriever
+    agent: Optional[FinanceAgent] = None
+
+
+def estimate_resources_size(resources: TickerResources) -> int:
+    """
+    Memory of a ticker's retriever and agent, without the objects all tickers share
+
+    Vectors and the BM25 postings live in native or memory-mapped arrays:
+    they are sized from their row counts, the rest by walking the objects.
+    """
+    retriever = resources.retriever
+    vector_store = getattr(retriever.index, 'vector_store', None)
+    shared = [
+        retriever.llm,
+        retriever.reranker,
+        getattr(retriever.index, '_embed_model', None),
+        getattr(retriever.context_builder, '_tokenizer', None)
+    ]
+    if resources.agent is not None:
+        shared += [
+            resources.agent.llm,
+            resources.agent.alpha_vantage_client,
+            resources.agent.router,
+        ]
+    # The stores are sized below (the Chroma client behind them is shared too)
+    stores = [vector_store, retriever.sparse_index]
+    size = estimate_size(resources, exclude=shared + stores) + vector_store_nbytes(vector_store)
+    if retriever.sparse_index is not None:
+        size += retriever.sparse_index.nbytes()
+    return size
+
+
+def collection_name_for(ticker: str) -> str:
+    """Vector store collection holding the 10-K of a ticker"""
+    return f"finsight_{ticker.lower()}"
+
+
+def release_resources(ticker: str, resources: TickerResources):
+    """Free the vectors, BM25 postings and parents of an evicted ticker"""
+    released = get_vector_store_registry().release(
+        DEFAULT_PERSIST_DIR, collection_name_for(ticker)
+    )
+    print(f"[cache] Released retriever and agent of {ticker}"
+          + ("" if released else " (collection kept: ingestion in progress)"))
+
+
+# Retrievers and agents per ticker, bounded (LRU, memory budget, idle TTL)
+_resource_cache = None
+_resource_cache_lock = threading.Lock()
+
+
+def get_resource_cache() -> ResourceCache:
+    """Get the process-wide cache of per-ticker retrievers and agents"""
+    global _resource_cache
+    with _resource_cache_lock:
+        if _resource_cache is None:
+            idle_ttl = float(os.getenv("AGENT_CACHE_IDLE_TTL", "3600"))
+            _resource_cache = ResourceCache(
+                max_entries=int(os.getenv("AGENT_CACHE_MAX_ENTRIES", "32")),
+                max_bytes=int(float(os.getenv("AGENT_CACHE_MAX_MB", "1024")) * 1024 * 1024),
+                idle_ttl=idle_ttl if idle_ttl > 0 else None,
+                estimate_cost=estimate_resources_size,
+                on_evict=release_resources,
+            )
+        return _resource_cache
+
+
+def get_retriever(ticker: str) -> Optional[AdvancedRAGRetriever]:
+    """Retriever of a ticker, if its RAG system is initialized"""
+    resources = get_resource_cache().get(ticker)
+    return resources.retriever if resources else None
+
+
+# Background ingestion queue (created lazily, shared by all requests)
+_ingestion_queue = None
+_ingestion_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue() -> IngestionJobQueue:
+    """Get the process-wide ingestion job queue"""
+    global _ingestion_queue
+    with _ingestion_queue_lock:
+        if _ingestion_queue is None:
+            job_ttl = float(os.getenv("INGESTION_JOB_TTL", "86400"))
+            _ingestion_queue = IngestionJobQueue(
+                runner=lambda ticker, progress: initialize_rag_system(ticker, progress=progress),
+                max_workers=int(os.getenv("INGESTION_WORKERS", "2")),
+                finished_ttl=job_ttl if job_ttl > 0 else None
+            )
+        return _ingestion_queue
+
 
 def initialize_llm(model_name: str = "gemini-2.0-flash-exp"):
     """Initialize LLM"""
@@ -35,29 +143,132 @@ def initialize_llm(model_name: str = "gemini-2.0-flash-exp"):
             model_name = f'models/{model_name}'
         
         llm = Gemini(api_key=api_key, model=model_name)
-        return llm
+        # Identical prompts are answered from the persistent response cache
+        return cached_llm_from_env(llm)
     except Exception as e:
         print(f"Error initializing LLM: {e}")
         return None
 
+
+# Conversation memory per browser session and ticker (agents are shared and stateless)
+_conversation_store = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ResourceCache:
+    """Get the process-wide store of conversation memories"""
+    global _conversation_store
+    with _conversation_store_lock:
+        if _conversation_store is None:
+            _conversation_store = ResourceCache(
+                max_entries=int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")),
+                max_bytes=int(float(os.getenv("CONVERSATION_MAX_MB", "64")) * 1024 * 1024),
+                idle_ttl=float(os.getenv("CONVERSATION_IDLE_TTL", "7200")),
+                # Memories are small: their cost is re-estimated on every access
+                estimate_cost=lambda memory: memory.size_bytes(),
+                cost_refresh_interval=0
+            )
+        return _conversation_store
+
+
+def get_conversation_memory(ticker: str, llm: Optional[LLM] = None) -> ConversationMemory:
+    """
+    Conversation memory of the current browser session for a ticker
+
+    Args:
+        ticker: Stock ticker symbol
+        llm: LLM used to summarize older turns (extractive summary if None)
+
+    Returns:
+        ConversationMemory instance
+    """
+    conversation_id = session.get('conversation_id')
+    if not conversation_id:
+        conversation_id = session['conversation_id'] = uuid.uuid4().hex
+    return get_conversation_store().get_or_create(
+        (conversation_id, ticker),
+        lambda: ConversationMemory(
+            token_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500")),
+            summarizer=llm_summarizer(llm) if llm else None,
+            # LLM summaries are written in the background, not in the request
+            executor=get_summary_executor() if llm else None
+        )
+    )
+
+
 def get_agent(ticker: str):
-    """Get or create agent for ticker"""
-    if ticker in _agents_cache:
-        return _agents_cache[ticker]
-    return None
+    """Get the cached agent for ticker (None if not created yet)"""
+    resources = get_resource_cache().get(ticker)
+    return resources.agent if resources else None
 
-def initialize_rag_system(ticker: str):
-    """Initialize RAG system for a ticker"""
-    try:
-        # Check if already initialized
-        if ticker in _rag_retrievers_cache:
-            return _rag_retrievers_cache[ticker], True
+
+def ensure_agent(ticker: str, retriever: AdvancedRAGRetriever, llm: LLM) -> FinanceAgent:
+    """
+    Get the agent of a ticker, creating it once (concurrent first requests share it)
+
+    Args:
+        ticker: Stock ticker symbol
+        retriever: Retriever of the ticker (from initialize_rag_system)
+        llm: LLM instance
         
+    Returns:
+        FinanceAgent instance
+    """
+    cache = get_resource_cache()
+    with cache.creation_lock(ticker):
+        resources = cache.get(ticker, touch=False)
+        if resources is None:
+            resources = cache.put(ticker, TickerResources(retriever))
+        if resources.agent is None:
+            resources.agent = FinanceAgent(
+                rag_retriever=resources.retriever,
+                alpha_vantage_client=AlphaVantageClient(),
+                llm=llm,
+                verbose=False,
+                ticker=ticker,
+                max_llm_calls=int(os.getenv("AGENT_MAX_LLM_CALLS", "12"))
+            )
+            cache.refresh_cost(ticker)
+        return resources.agent
+
+
+def initialize_rag_system(ticker: str, progress=None):
+    """
+    Initialize RAG system for a ticker
+
+    Args:
+        ticker: Stock ticker symbol
+        progress: Optional callback progress(stage, fraction, message) used by background jobs
+    """
+    def report(stage, fraction, message):
+        if progress:
+            progress(stage, fraction, message)
+
+    # Check if already initialized
+    cache = get_resource_cache()
+    resources = cache.get(ticker)
+    if resources is not None:
+        return resources.retriever, True
+
+    # Concurrent callers for the same ticker build the retriever once
+    with cache.creation_lock(ticker):
+        resources = cache.get(ticker, touch=False)
+        if resources is not None:
+            return resources.retriever, True
+        retriever, report_data = _build_rag_system(ticker, report)
+        cache.put(ticker, TickerResources(retriever))
+        return retriever, report_data
+
+
+def _build_rag_system(ticker: str, report):
+    """Download, index and wrap the 10-K of a ticker in a retriever (see initialize_rag_system)"""
+    try:
         # Initialize LLM (optional). It's fine if no GEMINI_API_KEY is configured;
         # in that case we will still ingest SEC files and allow raw-context answers.
         llm = initialize_llm()
         
         # Get 10-K report
+        report('download', 0.05, f"Téléchargement et analyse du rapport 10-K de {ticker}...")
         sec_client = SecEdgarClient()
         report_data = sec_client.get_10k_text(ticker)
         
@@ -71,53 +282,81 @@ def initialize_rag_system(ticker: str):
             # Indicate automatic download failed; do not prompt for manual upload
             raise ValueError("Le téléchargement automatique du rapport 10-K a échoué. Vérifiez le symbole boursier ou réessayez plus tard.")
         
-        # Create documents
+        # Create documents (the filing id lets incremental ingestion tell filings apart)
+        report('chunking', 0.3, "Découpage du rapport en sections...")
+        file_path = report_data.get('metadata', {}).get('file_path') or ''
+        filing_id = os.path.basename(os.path.dirname(file_path)) or ticker
         ingester = DocumentIngester()
         documents = ingester.create_documents_from_sections(
             sections=report_data['sections'],
-            base_metadata={'ticker': ticker, 'year': '2024'}
+            base_metadata={'ticker': ticker, 'year': '2024', 'filing_id': filing_id}
         )
         
         if not documents or len(documents) == 0:
             raise ValueError("No documents created from report data")
         
-        # Ingest documents
-        collection_name = f"finsight_{ticker.lower()}"
+        # Ingest documents (incremental: a no-op when the filing is already indexed)
+        collection_name = collection_name_for(ticker)
+        report('embedding', 0.35, "Indexation du rapport...")
         index = ingester.ingest_documents(
             documents=documents,
             collection_name=collection_name,
-            reset=False
+            reset=False,
+            progress_callback=lambda done, total: report(
+                'embedding',
+                0.35 + 0.6 * done / max(total, 1),
+                f"Indexation: {done}/{total} extraits",
+            ),
+        )
+        changed = ingester.last_ingest_stats.get('added') or ingester.last_ingest_stats.get(
+            'deleted'
         )
         
         # Diagnostic retrieval: verify index returns nodes even before creating main retriever
-        try:
-            test_retriever = AdvancedRAGRetriever(index=index, llm=None, similarity_top_k=5, rerank_top_k=3)
-            test_qb = QueryBundle(query_str="Quelle est la stratégie de croissance de cette entreprise ?")
+        # (only after the collection changed, warm restarts skip it)
+        if changed:
             try:
-                test_nodes = test_retriever.retriever.retrieve(test_qb)
-                print(f"[RAG init] Diagnostic: retrieved {len(test_nodes)} nodes for ticker {ticker}")
-                if test_nodes:
-                    try:
-                        snippet = test_nodes[0].get_content()[:200]
-                    except Exception:
-                        snippet = str(test_nodes[0])[:200]
-                    print(f"[RAG init] Sample node meta={getattr(test_nodes[0], 'metadata', {})} snippet={snippet!r}")
+                test_retriever = AdvancedRAGRetriever(
+                    index=index, llm=None, similarity_top_k=5, rerank_top_k=3
+                )
+                test_qb = QueryBundle(
+                    query_str="Quelle est la stratégie de croissance de cette entreprise ?"
+                )
+                try:
+                    test_nodes = test_retriever.retriever.retrieve(test_qb)
+                    print(f"[RAG init] Diagnostic: retrieved {len(test_nodes)} nodes "
+                          f"for ticker {ticker}")
+                    if test_nodes:
+                        try:
+                            snippet = test_nodes[0].get_content()[:200]
+                        except Exception:
+                            snippet = str(test_nodes[0])[:200]
+                        print(
+                            f"[RAG init] Sample node "
+                            f"meta={getattr(test_nodes[0], 'metadata', {})} snippet={snippet!r}"
+                        )
+                except Exception as e:
+                    print(f"[RAG init] Diagnostic retrieval failed: {e}")
             except Exception as e:
-                print(f"[RAG init] Diagnostic retrieval failed: {e}")
-        except Exception as e:
-            print(f"[RAG init] Could not create diagnostic retriever: {e}")
+                print(f"[RAG init] Could not create diagnostic retriever: {e}")
 
         # Create retriever used by the agent
+        # Hybrid (dense + BM25) candidates, reranked down to the 3 best chunks,
+        # packed into a token-bounded context
         retriever = AdvancedRAGRetriever(
             index=index,
             llm=llm,
-            similarity_top_k=5,
-            rerank_top_k=3
+            similarity_top_k=4,
+            rerank_top_k=3,
+            collection_version=lambda: ingester.get_collection_version(collection_name),
+            sparse_index=ingester.get_sparse_index(collection_name),
+            reranker=get_reranker(os.getenv("RERANKER", "cross-encoder")),
+            context_builder=ContextBuilder(
+                token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+            ),
+            parent_store=ingester.get_parent_store(collection_name),
         )
         
-        # Cache retriever
-        _rag_retrievers_cache[ticker] = retriever
-        
         return retriever, report_data
         
     except ValueError as e:
@@ -125,13 +364,93 @@ def initialize_rag_system(ticker: str):
     except Exception as e:
         raise RuntimeError(f"Error initializing RAG system: {e}")
 
+
+def question_tickers(message: str, ticker: str, requested: Optional[list] = None) -> list:
+    """
+    Tickers a question is about, upper-cased, in order of mention
+
+    Loaded tickers count when written in capitals; comparisons also name
+    companies not loaded yet ("compare AAPL and MSFT"), which answer_comparison
+    queues for ingestion.
+
+    Args:
+        message: User question
+        ticker: Ticker of the session
+        requested: Tickers given explicitly by the client (used as is)
+
+    Returns:
+        Tickers (more than one: a comparison)
+    """
+    if requested:
+        tickers = list(requested)
+    else:
+        known = set(get_resource_cache().keys()) | {ticker}
+        tickers = detect_tickers(message, known) + compared_tickers(message)
+    return list(dict.fromkeys(normalize_ticker(t) for t in tickers))
+
+
+def answer_comparison(message: str, tickers: list):
+    """Answer a question over several tickers with a federated retriever"""
+    retrievers = {t: get_retriever(t) for t in tickers}
+    ready = {t: retriever for t, retriever in retrievers.items() if retriever is not None}
+    pending = [t for t in tickers if t not in ready]
+    queue = get_ingestion_queue()
+    for t in pending:
+        job = queue.get_latest(t)
+        if job is None or not job.is_active:
+            queue.submit(t)
+
+    if not ready:
+        return jsonify({
+            'status': 'preparing',
+            'tickers': tickers,
+            'response': f"⏳ Préparation des rapports 10-K de {', '.join(pending)} en cours..."
+        }), 202
+
+    result = FederatedRetriever(ready).query_with_sources(message)
+    response_text = result.answer
+    sources_text = result.format_sources(limit=8)
+    if sources_text:
+        response_text = f"{response_text}\n\n**Sources :**\n{sources_text}"
+    if pending:
+        # Say the comparison is partial rather than answering as if complete
+        response_text += (
+            f"\n\n⏳ Comparaison partielle : les rapports de {', '.join(pending)} sont en "
+            "préparation et ne sont pas inclus dans cette réponse. Reposez la question "
+            "dans quelques minutes."
+        )
+    return jsonify({
+        'response': response_text,
+        'tickers': list(ready),
+        'pending': pending
+    })
+
+
+def retrieval_answer(retriever: AdvancedRAGRetriever, message: str) -> str:
+    """Answer from raw retrieval, followed by its sources"""
+    # Answer and sources come from the same pass (handles llm=None)
+    result = retriever.query_with_sources(message)
+    sources_text = result.format_sources()
+    response_text = result.answer
+    if sources_text:
+        response_text = f"{response_text}\n\n**Sources :**\n{sources_text}"
+    return response_text
+
+
+def needs_retrieval_fallback(response_str: str) -> bool:
+    """True if the agent signals it found no information (raw retrieval is tried instead)"""
+    lower_resp = response_str.lower()
+    return 'aucune information trouv' in lower_resp or lower_resp.strip().startswith('❌')
+
+
 @bp.route('/message', methods=['POST'])
 def send_message():
     """Send message to financial assistant"""
     try:
         data = request.get_json()
         message = data.get('message', '')
-        ticker = data.get('ticker', session.get('ticker', ''))
+        # Jobs and cached resources are keyed by the upper-case ticker
+        ticker = normalize_ticker(data.get('ticker', session.get('ticker', '')) or '')
         
         if not ticker:
             return jsonify({
@@ -139,6 +458,44 @@ def send_message():
                 'response': 'Veuillez d\'abord sélectionner un symbole boursier dans la sidebar et lancer l\'analyse.'
             }), 400
         
+        # The 10-K is downloaded and indexed by a background job: never block
+        # this request on it, tell the browser to wait and poll the job instead
+        if ticker not in get_resource_cache():
+            queue = get_ingestion_queue()
+            job = queue.get_latest(ticker)
+            if job is not None and job.status == FAILED and job.error != 'interrupted':
+                queue.discard(ticker)  # the next message retries
+                return jsonify({
+                    'error': 'RAG initialization failed',
+                    'response': (
+                        '❌ Le téléchargement automatique du rapport 10-K a échoué. '
+                        'Vérifiez le symbole boursier, votre connexion réseau, puis réessayez. '
+                        f'Détails: {job.error}'
+                    )
+                }), 400
+            if job is None or not job.is_active:
+                job = queue.submit(ticker)
+            return (
+                jsonify(
+                    {
+                        'status': 'preparing',
+                        'job': job.to_dict(),
+                        'ticker': ticker,
+                        'response': (
+                            f'⏳ Préparation du rapport 10-K de {ticker} en cours '
+                            f'({int(job.progress * 100)}%)...'
+                        ),
+                    }
+                ),
+                202,
+            )
+
+        # Comparison questions ("compare AAPL and MSFT") search every mentioned
+        # ticker's collection in parallel; tickers not indexed yet are queued
+        tickers = question_tickers(message, ticker, data.get('tickers'))
+        if len(tickers) > 1:
+            return answer_comparison(message, tickers)
+
         # Get or initialize agent
         agent = get_agent(ticker)
         if not agent:
@@ -152,20 +509,9 @@ def send_message():
 
                 # If no LLM configured, skip creating the full FinanceAgent and
                 # answer directly from the indexed SEC files (raw-context + sources).
-                alpha_client = AlphaVantageClient()
-
-                if not llm:
-                    # Create a lightweight placeholder in cache so we don't re-ingest repeatedly
-                    _agents_cache[ticker] = None
-                else:
+                if llm:
                     # Create the full agent when LLM is available
-                    agent = FinanceAgent(
-                        rag_retriever=retriever,
-                        alpha_vantage_client=alpha_client,
-                        llm=llm,
-                        verbose=False
-                    )
-                    _agents_cache[ticker] = agent
+                    agent = ensure_agent(ticker, retriever, llm)
             except ValueError as e:
                 error_msg = str(e)
                 # Inform user that automatic download failed and ask to verify ticker/network
@@ -198,44 +544,26 @@ def send_message():
         # Get response from agent (use chat method) OR fallback to direct retrieval
         try:
             # If agent exists and is a FinanceAgent instance, use it
-            agent = _agents_cache.get(ticker)
             if agent is None:
                 # No LLM/agent available: perform direct retrieval and return context + sources
-                retriever = _rag_retrievers_cache.get(ticker)
+                retriever = get_retriever(ticker)
                 if not retriever:
                     return jsonify({
                         'error': 'retriever_missing',
                         'response': 'Système RAG non initialisé pour ce ticker.'
                     }), 500
 
-                # Run retrieval (AdvancedRAGRetriever.query handles llm=None)
+                # Run retrieval (answer and sources come from the same pass; handles llm=None)
                 try:
-                    raw_response = retriever.query(message)
+                    result = retriever.query_with_sources(message)
                 except Exception as e:
                     return jsonify({
                         'error': 'retrieval_failed',
                         'response': f'Erreur lors de la récupération: {str(e)}'
                     }), 500
 
-                # Collect source nodes for attribution
-                try:
-                    nodes = retriever.retriever.retrieve(QueryBundle(query_str=message))
-                    sources = []
-                    for n in nodes[:5]:
-                        meta = getattr(n, 'metadata', {}) or {}
-                        section = meta.get('section') or meta.get('title') or 'Unknown section'
-                        ticker_meta = meta.get('ticker') or ''
-                        snippet = n.get_content()[:200].replace('\n', ' ')
-                        src = f"Section: {section}"
-                        if ticker_meta:
-                            src += f" (Ticker: {ticker_meta})"
-                        src += f" — \"{snippet}...\""
-                        sources.append(src)
-                    sources_text = "\n".join([f"- {s}" for s in sources]) if sources else ''
-                except Exception:
-                    sources_text = ''
-
-                response_text = str(raw_response)
+                sources_text = result.format_sources()
+                response_text = result.answer
                 if sources_text:
                     response_text = f"{response_text}\n\n**Sources :**\n{sources_text}"
 
@@ -244,50 +572,30 @@ def send_message():
                     'ticker': ticker
                 })
 
-            # Otherwise use the agent.chat path
-            response = agent.chat(message)
+            # Otherwise use the agent.chat path, with this session's history
+            memory = get_conversation_memory(ticker, agent.llm)
+            response = agent.chat(message, memory=memory)
             response_str = str(response)
 
             # If agent signals no information found, fallback to raw retrieval + sources
-            lower_resp = response_str.lower() if isinstance(response_str, str) else ''
-            if 'aucune information trouv' in lower_resp or lower_resp.strip().startswith('❌'):
-                retriever = _rag_retrievers_cache.get(ticker)
+            if needs_retrieval_fallback(response_str):
+                retriever = get_retriever(ticker)
                 if retriever:
                     try:
-                        raw_response = retriever.query(message)
+                        response_text = retrieval_answer(retriever, message)
                     except Exception as e:
                         return jsonify({
                             'error': 'retrieval_failed',
                             'response': f'Erreur lors de la récupération: {str(e)}'
                         }), 500
 
-                    # Collect source nodes
-                    try:
-                        nodes = retriever.retriever.retrieve(QueryBundle(query_str=message))
-                        sources = []
-                        for n in nodes[:5]:
-                            meta = getattr(n, 'metadata', {}) or {}
-                            section = meta.get('section') or meta.get('title') or 'Unknown section'
-                            ticker_meta = meta.get('ticker') or ''
-                            snippet = n.get_content()[:200].replace('\n', ' ')
-                            src = f"Section: {section}"
-                            if ticker_meta:
-                                src += f" (Ticker: {ticker_meta})"
-                            src += f" — \"{snippet}...\""
-                            sources.append(src)
-                        sources_text = "\n".join([f"- {s}" for s in sources]) if sources else ''
-                    except Exception:
-                        sources_text = ''
-
-                    response_text = str(raw_response)
-                    if sources_text:
-                        response_text = f"{response_text}\n\n**Sources :**\n{sources_text}"
-
+                    memory.add_turn(message, response_text)
                     return jsonify({
                         'response': response_text,
                         'ticker': ticker
                     })
 
+            memory.add_turn(message, response_str)
             return jsonify({
                 'response': response_str,
                 'ticker': ticker
@@ -304,6 +612,113 @@ def send_message():
             'response': f'Erreur inattendue: {str(e)}'
         }), 500
 
+
+@bp.route('/message/stream', methods=['POST'])
+def stream_message():
+    """
+    Send message to financial assistant and stream the answer (Server-Sent Events)
+
+    Each event is a JSON object: {'type': 'status'|'token'|'reset', 'text'}
+    while the agent works (tool progress, answer tokens), then 'done' with
+    the complete answer, or 'error'. Messages the agent of the ticker cannot
+    answer yet (10-K being prepared, comparisons, no LLM) get the JSON
+    answer of /message instead.
+    """
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '')
+    ticker = normalize_ticker(data.get('ticker', session.get('ticker', '')) or '')
+    agent = get_agent(ticker) if ticker else None
+    if agent is None:
+        return send_message()
+    if len(question_tickers(message, ticker, data.get('tickers'))) > 1:
+        return send_message()
+
+    memory = get_conversation_memory(ticker, agent.llm)
+
+    def events():
+        for event in agent.stream_chat(message, memory=memory):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            if event.type == ANSWER_DONE:
+                answer = event.text
+                retriever = get_retriever(ticker)
+                if needs_retrieval_fallback(answer) and retriever:
+                    try:
+                        answer = retrieval_answer(retriever, message)
+                    except Exception as e:
+                        event = StreamEvent(
+                            ANSWER_ERROR, f'Erreur lors de la récupération: {str(e)}'
+                        )
+                if event.type == ANSWER_DONE:
+                    memory.add_turn(message, answer)
+                    event = StreamEvent(ANSWER_DONE, answer)
+            yield f"data: {json.dumps(event.to_dict(), ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@bp.route('/ingest/<ticker>', methods=['POST'])
+def enqueue_ingestion(ticker):
+    """Enqueue a background ingestion job for ticker (deduplicated per ticker)"""
+    ticker = ticker.upper()
+    if ticker in get_resource_cache():
+        return jsonify({'ticker': ticker, 'ready': True})
+    job = get_ingestion_queue().submit(ticker)
+    return jsonify({'ticker': ticker, 'ready': False, 'job': job.to_dict()}), 202
+
+
+@bp.route('/ingest/<ticker>', methods=['GET'])
+def ingestion_status(ticker):
+    """Poll the progress of the latest ingestion job for ticker"""
+    ticker = ticker.upper()
+    job = get_ingestion_queue().get_latest(ticker)
+    ready = ticker in get_resource_cache()
+    if job is None and not ready:
+        return (
+            jsonify(
+                {'ticker': ticker, 'ready': False, 'error': 'No ingestion job for this ticker'}
+            ),
+            404,
+        )
+    return jsonify({
+        'ticker': ticker,
+        'ready': ready,
+        'job': job.to_dict() if job else None
+    })
+
+
+@bp.route('/ingest/<ticker>/stream')
+def ingestion_stream(ticker):
+    """Stream the progress of the latest ingestion job for ticker (Server-Sent Events)"""
+    ticker = ticker.upper()
+    queue = get_ingestion_queue()
+    job = queue.get_latest(ticker)
+    if job is None:
+        return jsonify({'ticker': ticker, 'error': 'No ingestion job for this ticker'}), 404
+
+    def events():
+        state = job.to_dict()
+        yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+        while state['status'] not in (DONE, FAILED):
+            previous = state['updated_at']
+            state = queue.wait_for_update(job, since=previous)
+            if state['updated_at'] == previous:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @bp.route('/initialize/<ticker>', methods=['POST'])
 def initialize_rag(ticker):
     """Initialize RAG system for ticker"""
@@ -319,19 +734,8 @@ def initialize_rag(ticker):
                 'message': 'Please configure GEMINI_API_KEY'
             }), 400
         
-        # Initialize clients
-        alpha_client = AlphaVantageClient()
-        
-        # Create agent
-        agent = FinanceAgent(
-            rag_retriever=retriever,
-            alpha_vantage_client=alpha_client,
-            llm=llm,
-            verbose=False
-        )
-        
-        # Cache agent
-        _agents_cache[ticker] = agent
+        # Create (and cache) the agent
+        ensure_agent(ticker, retriever, llm)
         
         return jsonify({
             'success': True,
@@ -349,3 +753,8 @@ def initialize_rag(ticker):
             'message': f'Error: {str(e)}'
         }), 500
 
+
+@bp.route('/cache/stats')
+def cache_stats():
+    """Statistics of the per-ticker retriever/agent cache (entries, memory, evictions)"""
+    return jsonify(get_resource_cache().stats())
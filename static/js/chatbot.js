@@ -70,16 +70,14 @@ async function sendChatbotMessage() {
     sendBtn.classList.add('loading');
     
     try {
-        const response = await fetch('/api/chat/message', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                message: message,
-                ticker: ticker
-            })
-        });
+        let data = await streamChatbotMessage(message, ticker, loadingId);
         
-        const data = await response.json();
+        // The 10-K is being prepared in the background: show progress, then ask
+        // again (the server answers, or reports why the preparation failed)
+        if (data.status === 'preparing') {
+            await waitForIngestion(ticker, loadingId, data.job);
+            data = await streamChatbotMessage(message, ticker, loadingId);
+        }
         
         // Remove loading message
         removeChatbotLoadingMessage(loadingId);
@@ -100,6 +98,107 @@ async function sendChatbotMessage() {
     }
 }
 
+async function streamChatbotMessage(message, ticker, loadingId) {
+    // Ask the streaming endpoint: tool progress and answer tokens are shown in
+    // the loading bubble as they arrive. Messages the agent cannot stream
+    // (10-K being prepared, comparisons...) get a plain JSON answer.
+    const response = await fetch('/api/chat/message/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            message: message,
+            ticker: ticker
+        })
+    });
+    const contentType = response.headers.get('Content-Type') || '';
+    if (!contentType.includes('text/event-stream') || !response.body) {
+        return response.json();
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    
+    const showStreamState = (status) => {
+        const loading = document.getElementById(loadingId);
+        if (!loading) return;
+        const content = loading.querySelector('.chatbot-message-content');
+        if (answer) {
+            content.innerHTML = formatChatbotMessage(answer);
+        } else if (status) {
+            content.innerHTML = `⏳ ${formatChatbotMessage(status)}`;
+        }
+        const messagesContainer = document.getElementById('chatbot-messages');
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    };
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Server-Sent Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const dataLines = block.split('\n')
+                .filter(line => line.startsWith('data: '))
+                .map(line => line.slice(6));
+            if (!dataLines.length) continue;  // keep-alive comment
+            
+            const event = JSON.parse(dataLines.join('\n'));
+            if (event.type === 'status') {
+                showStreamState(event.text);
+            } else if (event.type === 'token') {
+                answer += event.text;
+                showStreamState();
+            } else if (event.type === 'reset') {
+                answer = '';
+            } else if (event.type === 'done') {
+                reader.cancel();
+                return { response: event.text, ticker: ticker };
+            } else if (event.type === 'error') {
+                reader.cancel();
+                return { error: 'stream_failed', response: event.text };
+            }
+        }
+    }
+    return {
+        error: 'stream_interrupted',
+        response: answer || 'La connexion a été interrompue avant la fin de la réponse. Veuillez réessayer.'
+    };
+}
+
+function waitForIngestion(ticker, loadingId, job) {
+    // Follow the background ingestion job (Server-Sent Events) and show its progress
+    return new Promise((resolve) => {
+        const showProgress = (state) => {
+            const loading = document.getElementById(loadingId);
+            if (!loading || !state) return;
+            const percent = Math.round((state.progress || 0) * 100);
+            loading.querySelector('.chatbot-message-content').innerHTML =
+                `⏳ ${formatChatbotMessage(state.message || 'Préparation du rapport 10-K...')} (${percent}%)`;
+        };
+        showProgress(job);
+        
+        const source = new EventSource(`/api/chat/ingest/${encodeURIComponent(ticker)}/stream`);
+        source.onmessage = (event) => {
+            const state = JSON.parse(event.data);
+            showProgress(state);
+            if (state.status === 'done' || state.status === 'failed') {
+                source.close();
+                resolve(state.status === 'done');
+            }
+        };
+        source.onerror = () => {
+            source.close();
+            resolve(false);
+        };
+    });
+}
+
 function addChatbotMessage(content, type = 'assistant') {
     const messagesContainer = document.getElementById('chatbot-messages');
     
@@ -0,0 +1,553 @@
+"""
+Tests for the finance agent
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from unittest.mock import Mock, patch
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata, MockLLM
+from llama_index.core.llms.callbacks import llm_completion_callback
+from src.agents.finance_agent import FinanceAgent, BUDGET_EXHAUSTED_MESSAGE
+from src.agents.backends import MethodAgentBackend, WorkflowAgentBackend
+from src.agents.budget import LLMCallBudget
+from src.agents.streaming import AnswerStream, ReActAnswerFilter, emit_status, emit_token
+from src.agents.event_loop import run_coroutine
+from src.agents.router import IntentRouter, MARKET, TREND, REPORT, OPEN, compared_tickers
+from src.agents.event_loop import BackgroundEventLoop
+from src.agents.memory import ConversationMemory, extractive_summary
+from src.agents.tools import ToolContext, ToolRegistry, get_tool_registry
+from src.rag.retrieval import RAGResult
+
+
+class TestToolRegistry:
+    """Test tools built once and bound per agent"""
+
+    def test_bound_tools_share_definitions(self):
+        """Test binding reuses the schemas and calls the bound objects"""
+        registry = ToolRegistry()
+        first, second = Mock(), Mock()
+        first.query.return_value = "first"
+        second.query.return_value = "second"
+
+        with patch('src.agents.tools.FunctionTool.from_defaults') as from_defaults:
+            tools_a = registry.bind(ToolContext(rag_retriever=first, alpha_vantage_client=Mock()))
+            tools_b = registry.bind(ToolContext(rag_retriever=second, alpha_vantage_client=Mock()))
+        from_defaults.assert_not_called()
+
+        assert [t.metadata.name for t in tools_a] == [
+            'analyze_10k_report',
+            'get_stock_metrics',
+            'get_stock_time_series',
+        ]
+        assert tools_a[0].metadata is tools_b[0].metadata
+        assert 'context' not in tools_a[0].metadata.fn_schema.model_json_schema()['properties']
+        assert tools_a[0].call(question="q").raw_output == "first"
+        assert tools_b[0].call(question="q").raw_output == "second"
+
+    def test_agents_share_process_registry(self):
+        """Test agents bind their tools from the process-wide registry"""
+        agents = [
+            FinanceAgent(
+                rag_retriever=Mock(), alpha_vantage_client=Mock(), llm=MockLLM(), verbose=False
+            )
+            for _ in range(2)
+        ]
+        first, second = (agent.tools['get_stock_metrics'] for agent in agents)
+        assert first is not second
+        assert first.metadata is second.metadata is get_tool_registry().bind(
+            ToolContext(rag_retriever=None, alpha_vantage_client=None), ['get_stock_metrics']
+        )[0].metadata
+
+
+class TestIntentRouter:
+    """Test the fast-path intent router"""
+
+    @pytest.fixture
+    def router(self):
+        return IntentRouter()
+
+    @pytest.mark.parametrize("message, intent", [
+        ("quel est le prix de AAPL ?", MARKET),
+        ("P/E ratio?", MARKET),
+        ("Quelle est la tendance du cours ?", TREND),
+        ("Quels sont les facteurs de risque ?", REPORT),
+        ("combien coute l'action", MARKET),
+        ("Pourquoi le prix baisse-t-il ?", OPEN),
+        ("Quelle est la stratégie et la tendance du cours ?", OPEN),
+        ("bonjour", OPEN),
+        ("Quel est le volume des ventes d'iPhone ?", OPEN),
+        ("Quel est le volume d'échanges de l'action ?", MARKET),
+        ("Dans quel secteur l'entreprise est-elle en concurrence ?", OPEN),
+        ("Quel est le cours de l'action ?", MARKET),
+        ("Quel est le rendement du dividende ?", MARKET),
+    ])
+    def test_route(self, router, message, intent):
+        """Test simple lookups take a fast path and open questions do not"""
+        assert router.route(message).intent == intent
+
+    def test_route_details(self, router):
+        """Test the metric field and the 10-K section are extracted"""
+        assert router.route("P/E ratio?").fields == ['PE Ratio']
+        assert router.route("Quels sont les facteurs de risque ?").section == 'Item 1A'
+        assert router.route("Quel est le volume d'échanges de l'action ?").fields == ['Volume']
+
+    @pytest.mark.parametrize("message", [
+        "Quelles acquisitions au cours de 2023 ?",
+        "Qu'a fait l'entreprise au cours de l'année ?",
+        "Qu’a fait l’entreprise au cours d’une année ?",
+        "Quel est le rendement des capitaux propres ?",
+    ])
+    def test_report_phrasings_skip_market_data(self, router, message):
+        """Test "au cours de" (during) and return on equity are not stock metrics"""
+        route = router.route(message)
+        assert route.intent != MARKET
+        assert route.fields == []
+
+    def test_compared_companies(self):
+        """Test comparisons name their companies, other questions name none"""
+        assert compared_tickers("Compare AAPL and MSFT") == ['AAPL', 'MSFT']
+        assert compared_tickers("Comparez Apple et Microsoft") == ['AAPL', 'MSFT']
+        assert compared_tickers("Comparez le CA et le ROE de AAPL") == ['AAPL']
+        assert compared_tickers("Quel est le CA de AAPL ?") == []
+
+    def test_route_named_companies(self, router):
+        """Test tickers and company names of the message are reported"""
+        assert router.route("Quel est le prix de MSFT ?").tickers == ['MSFT']
+        assert router.route("Quel est le PER de Microsoft ?").tickers == ['MSFT']
+        assert router.route("P/E ratio et EPS ?").tickers == []
+
+
+class TestBackgroundEventLoop:
+    """Test the persistent event loop used by sync code"""
+
+    def test_coroutines_share_one_loop_thread(self):
+        """Test successive calls run on the same loop and thread"""
+        runner = BackgroundEventLoop(name="test-loop")
+
+        async def where():
+            return asyncio.get_running_loop(), threading.current_thread().name
+
+        try:
+            first, second = runner.run(where()), runner.run(where())
+            assert first == second
+            assert first[1] == "test-loop"
+        finally:
+            runner.stop()
+
+    def test_timeout_cancels_coroutine(self):
+        """Test a coroutine exceeding its timeout raises and is cancelled"""
+        runner = BackgroundEventLoop()
+        cancelled = threading.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        try:
+            with pytest.raises(TimeoutError):
+                runner.run(slow(), timeout=0.2)
+            assert cancelled.wait(2)
+            assert runner.run(asyncio.sleep(0, result="still running")) == "still running"
+        finally:
+            runner.stop()
+
+
+class TestConversationMemory:
+    """Test token-bounded conversation memory"""
+
+    def test_old_turns_are_summarized_within_budget(self):
+        """Test the window stays within its budget and older turns go to the summary"""
+        memory = ConversationMemory(token_budget=60, summary_token_budget=40, tokenizer=str.split)
+        for i in range(10):
+            memory.add_turn(f"question {i} sur AAPL", " ".join(["mot"] * 20) + f" réponse {i}")
+
+        assert memory.turns[-1][0] == "question 9 sur AAPL"
+        assert len(memory.turns) < 10
+        assert "question 8 sur AAPL" in memory.summary or "question 7 sur AAPL" in memory.summary
+        assert len(memory.summary.split()) <= 40
+        assert memory.token_count <= 100
+
+    def test_summary_is_updated_in_background(self):
+        """Test LLM summaries run off the request path and concurrent turns are all kept"""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_summarizer(summary, turns):
+            started.set()
+            release.wait(5)
+            return extractive_summary(summary, turns)
+
+        executor = ThreadPoolExecutor(max_workers=4)
+        memory = ConversationMemory(
+            token_budget=30, summary_token_budget=500, tokenizer=str.split,
+            summarizer=slow_summarizer, executor=executor
+        )
+        answer = " ".join(["mot"] * 20)
+        memory.add_turn("question 0", answer)
+        memory.add_turn("question 1", answer)
+        assert started.wait(5)
+        # The summary is being written: the folded turn is still in the history
+        assert "question 0" in memory.render()
+
+        threads = [
+            threading.Thread(target=memory.add_turn, args=(f"question {i}", answer))
+            for i in range(2, 6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        memory.add_turn("question 6", answer)
+        release.set()
+        executor.shutdown(wait=True)
+
+        assert all(f"question {i}" in memory.summary for i in range(6))
+        assert memory.turns == [("question 6", answer)]
+
+    def test_history_is_injected_per_call(self):
+        """Test each session's history is passed to the shared agent, not stored in it"""
+        workflow, engine = WorkflowAgentBackend(Mock()), MethodAgentBackend(Mock(), 'chat')
+        alice, bob = ConversationMemory(), ConversationMemory()
+        alice.add_turn("Quel est le PER ?", "Le PER est de 30.")
+
+        args, kwargs = workflow.arguments("Et la dette ?", alice)
+        assert args == ("Et la dette ?",)
+        assert [m.content for m in kwargs['chat_history']] == [
+            "Quel est le PER ?",
+            "Le PER est de 30.",
+        ]
+        assert workflow.arguments("Et la dette ?", bob) == (
+            ("Et la dette ?",),
+            {'chat_history': []},
+        )
+
+        (text,), _ = engine.arguments("Et la dette ?", alice)
+        assert "Le PER est de 30." in text and text.endswith("Et la dette ?")
+
+
+class StubReActLLM(CustomLLM):
+    """LLM always giving the same final ReAct answer"""
+    text: str = "Thought: Je peux répondre sans outil.\nAnswer: Bonjour le monde"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata()
+
+    @llm_completion_callback()
+    def complete(self, prompt, formatted=False, **kwargs):
+        return CompletionResponse(text=self.text)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        text = ""
+        for word in self.text.split(" "):
+            delta = f" {word}" if text else word
+            text += delta
+            yield CompletionResponse(text=text, delta=delta)
+
+
+class TestAgentBackend:
+    """Test the agent backend picked at construction and the LLM call budget"""
+
+    @pytest.fixture
+    def agent(self):
+        llm = MockLLM(max_tokens=5)
+        return FinanceAgent(
+            rag_retriever=Mock(),
+            alpha_vantage_client=Mock(),
+            llm=llm,
+            verbose=False,
+            max_llm_calls=6,
+        )
+
+    def test_backend_resolved_once(self, agent):
+        """Test the workflow agent is wrapped once and called with a bounded number of steps"""
+        assert isinstance(agent.backend, WorkflowAgentBackend)
+        agent.answer_fast = Mock(return_value=None)
+        agent.backend = Mock(name="backend")
+        agent.backend.call.return_value = "Analyse complète"
+
+        with patch('src.agents.finance_agent.resolve_backend') as resolve:
+            assert agent.chat("Analysez l'entreprise") == "Analyse complète"
+            assert agent.chat("Et ses concurrents ?") == "Analyse complète"
+        resolve.assert_not_called()
+        assert agent.backend.call.call_args.kwargs['max_iterations'] == 3
+
+    def test_workflow_answer_is_plain_text(self):
+        """Test the workflow agent's answer is returned without the message role"""
+        agent = FinanceAgent(
+            rag_retriever=Mock(), alpha_vantage_client=Mock(), llm=StubReActLLM(), verbose=False
+        )
+        agent.answer_fast = Mock(return_value=None)
+
+        assert agent.chat("Dites bonjour") == "Bonjour le monde"
+        events = list(agent.stream_chat("Dites bonjour"))
+        assert (events[-1].type, events[-1].text) == ("done", "Bonjour le monde")
+        assert "".join(e.text for e in events if e.type == "token") == "Bonjour le monde"
+
+    def test_fallback_runs_once_within_budget(self, agent):
+        """Test a backend failing early falls back to the tools once"""
+        agent.answer_fast = Mock(return_value=None)
+        agent.backend = Mock(name="backend")
+        agent.backend.call.side_effect = RuntimeError("agent failed")
+        agent._execute_tools_directly = Mock(return_value="Réponse directe")
+
+        assert agent.chat("Analysez l'entreprise") == "Réponse directe"
+        agent._execute_tools_directly.assert_called_once()
+
+    def test_no_fallback_once_budget_spent(self, agent):
+        """Test the LLM calls a failing backend made count against the message budget"""
+        def spend_and_fail(message, memory=None, max_iterations=None):
+            for _ in range(5):
+                agent.llm.complete("étape")
+            raise RuntimeError("agent failed")
+
+        agent.answer_fast = Mock(return_value=None)
+        agent.backend = Mock(name="backend")
+        agent.backend.call.side_effect = spend_and_fail
+        agent._execute_tools_directly = Mock(return_value="Réponse directe")
+
+        assert agent.chat("Analysez l'entreprise") == BUDGET_EXHAUSTED_MESSAGE
+        agent._execute_tools_directly.assert_not_called()
+
+    def test_tool_llm_calls_stay_within_cap(self):
+        """Test the LLM calls a tool makes inside one agent step are refused past the cap"""
+        report_llm = MockLLM(max_tokens=2)
+        agent = FinanceAgent(
+            rag_retriever=Mock(llm=report_llm),
+            alpha_vantage_client=Mock(),
+            llm=MockLLM(max_tokens=2),
+            verbose=False,
+            max_llm_calls=4,
+        )
+        answered = []
+
+        def one_step(message, memory=None, max_iterations=None):
+            # A single reasoning step whose report tool synthesizes many times
+            agent.llm.complete("étape")
+            answered.append("agent")
+            for _ in range(10):
+                report_llm.complete("synthèse")
+                answered.append("tool")
+            return "fin"
+
+        agent.answer_fast = Mock(return_value=None)
+        agent.backend = Mock(name="backend")
+        agent.backend.call.side_effect = one_step
+
+        assert agent.chat("Analysez les risques") == BUDGET_EXHAUSTED_MESSAGE
+        assert len(answered) == 4
+        assert report_llm.complete("hors budget").text
+
+    def test_budget_counts_calls_in_tool_threads(self, agent):
+        """Test LLM calls made by parallel tools are charged to the caller's budget"""
+        def tool(prompt):
+            return str(agent.llm.complete(prompt))
+
+        budget = LLMCallBudget(10)
+        with budget.activate():
+            agent.run_tools_parallel(
+                [
+                    ('analyze_10k_report', tool, {'prompt': "a"}),
+                    ('get_stock_metrics', tool, {'prompt': "b"}),
+                ]
+            )
+        agent.llm.complete("hors budget")
+
+        assert budget.used == 2
+        assert budget.remaining == 8
+
+
+class TestAnswerStreaming:
+    """Test the relay of tool progress and answer tokens"""
+
+    @pytest.fixture
+    def agent(self):
+        agent = FinanceAgent(
+            rag_retriever=Mock(),
+            alpha_vantage_client=Mock(),
+            llm=MockLLM(max_tokens=5),
+            verbose=False,
+        )
+        agent.answer_fast = Mock(return_value=None)
+        agent.backend = Mock(name="backend")
+        return agent
+
+    def test_react_filter_keeps_final_answer(self):
+        """Test only the text after 'Answer:' is streamed, step by step"""
+        answer_filter = ReActAnswerFilter()
+        step_1 = ["Thought: je", "Thought: je dois chercher\nAction: analyze_10k_report"]
+        step_2 = [
+            "Thought: j'ai",
+            "Thought: j'ai tout\nAnswer: Les",
+            "Thought: j'ai tout\nAnswer: Les risques",
+        ]
+
+        deltas = [answer_filter.feed(text) for text in step_1 + step_2]
+
+        assert "".join(deltas) == "Les risques"
+        assert deltas[-1] == " risques"
+
+    def test_events_reach_stream_from_event_loop(self):
+        """Test events emitted on the background loop go to the caller's stream"""
+        async def work():
+            emit_status("Recherche…")
+            emit_token("Bonjour")
+
+        stream = AnswerStream()
+        with stream.activate():
+            run_coroutine(work(), timeout=5)
+        run_coroutine(work(), timeout=5)
+
+        assert [(e.type, e.text) for e in (stream.get(0), stream.get(0))] == [
+            ("status", "Recherche…"),
+            ("token", "Bonjour"),
+        ]
+        assert stream.get(0) is None
+
+    def test_stream_chat_relays_progress_then_answer(self, agent):
+        """Test tool status and tokens are yielded as produced, then the full answer"""
+        def answer(message, memory=None, max_iterations=None):
+            agent.tools['analyze_10k_report'].fn(question=message, section="Item 1A")
+            for token in ("Les ", "risques"):
+                emit_token(token)
+            return "Les risques"
+
+        agent.backend.call.side_effect = answer
+        agent.rag_retriever.query.return_value = "extrait"
+
+        events = [(e.type, e.text) for e in agent.stream_chat("Quels risques ?")]
+
+        assert events == [
+            ("status", "Recherche dans le rapport 10-K (Item 1A)…"),
+            ("token", "Les "), ("token", "risques"),
+            ("done", "Les risques"),
+        ]
+
+    def test_fallback_discards_streamed_tokens(self, agent):
+        """Test a failed agent's partial answer is reset before the fallback answer"""
+        def fail(message, memory=None, max_iterations=None):
+            emit_token("Début")
+            raise RuntimeError("agent failed")
+
+        agent.backend.call.side_effect = fail
+        agent._execute_tools_directly = Mock(return_value="Réponse directe")
+
+        events = [(e.type, e.text) for e in agent.stream_chat("Analysez l'entreprise")]
+
+        assert events == [("token", "Début"), ("reset", ""), ("done", "Réponse directe")]
+
+
+class TestFinanceAgentTools:
+    """Test direct (planned) tool execution"""
+
+    @pytest.fixture
+    def agent(self):
+        """Create agent with mock retriever and market data client"""
+        return FinanceAgent(
+            rag_retriever=Mock(),
+            alpha_vantage_client=Mock(),
+            llm=MockLLM(),
+            verbose=False,
+            ticker="AAPL"
+        )
+
+    def test_plan_tool_calls(self, agent):
+        """Test report and market tools are planned from the question"""
+        calls = agent.plan_tool_calls("Quelle est la stratégie et la tendance du cours ?")
+
+        assert [name for name, _, _ in calls] == [
+            'analyze_10k_report',
+            'get_stock_metrics',
+            'get_stock_time_series',
+        ]
+        assert calls[1][2] == {'symbol': 'AAPL'}
+
+    def test_fast_path_market_lookup(self, agent):
+        """Test a price question is answered from the metrics tool alone"""
+        metrics = "Stock Metrics for AAPL:\n- Current Price: $150.00\n- PE Ratio: 30"
+        agent.tools['get_stock_metrics'] = Mock(fn=Mock(return_value=metrics))
+        agent.backend = Mock()
+
+        answer = agent.chat("quel est le prix de AAPL ?")
+
+        assert answer == "**Données de marché (AAPL) :**\n- Current Price: $150.00"
+        agent.backend.call.assert_not_called()
+
+    def test_fast_path_skips_other_companies(self, agent):
+        """Test a lookup about another company than the agent's goes to the agent"""
+        agent.tools['get_stock_metrics'] = Mock(fn=Mock(return_value="- Current Price: $150.00"))
+
+        assert agent.answer_fast("Quel est le prix de MSFT ?") is None
+        assert agent.answer_fast("Quel est le prix de Microsoft ?") is None
+        assert agent.answer_fast("Quel est le prix de AAPL ?") is not None
+        agent.tools['get_stock_metrics'].fn.assert_called_once()
+
+    def test_fast_path_report_section_falls_back_to_whole_report(self, agent):
+        """Test a section lookup without matches is retried on the whole report"""
+        agent.rag_retriever.query_with_sources.side_effect = [
+            RAGResult(
+                "Aucune information pertinente trouvée dans le rapport 10-K pour cette question."
+            ),
+            RAGResult(
+                "Les principaux risques sont la concurrence et la chaîne d'approvisionnement.",
+                [Mock()],
+            ),
+        ]
+        with patch.object(RAGResult, 'format_sources', return_value=""):
+            answer = agent.answer_fast("Quels sont les risques ?")
+
+        assert "chaîne d'approvisionnement" in answer
+        calls = agent.rag_retriever.query_with_sources.call_args_list
+        assert [c.kwargs['metadata_filters'] for c in calls] == [{'section': 'Item 1A'}, None]
+
+    def test_tools_run_concurrently_with_timeouts(self, agent):
+        """Test independent calls overlap and a slow call is dropped at its timeout"""
+        def slow(seconds, value):
+            time.sleep(seconds)
+            return value
+
+        calls = [
+            ('analyze_10k_report', slow, {'seconds': 0.3, 'value': 'report'}),
+            ('get_stock_metrics', slow, {'seconds': 0.3, 'value': 'metrics'}),
+            ('get_stock_time_series', slow, {'seconds': 2, 'value': 'series'}),
+        ]
+        with patch.dict('src.agents.finance_agent.TOOL_TIMEOUTS', {'get_stock_time_series': 0.5}):
+            started = time.monotonic()
+            results = agent.run_tools_parallel(calls)
+            elapsed = time.monotonic() - started
+
+        assert results == {
+            'analyze_10k_report': 'report',
+            'get_stock_metrics': 'metrics',
+            'get_stock_time_series': '',
+        }
+        assert elapsed < 0.9
+
+    def test_tool_timeout_starts_when_call_runs(self, agent):
+        """Test a call queued behind busy workers is not timed out for the wait"""
+        def slow(value):
+            time.sleep(0.3)
+            return value
+
+        calls = [
+            ('get_stock_metrics', slow, {'value': 'metrics'}),
+            ('get_stock_time_series', slow, {'value': 'series'}),
+        ]
+        busy_pool = ThreadPoolExecutor(max_workers=1)
+        try:
+            with (
+                patch('src.agents.finance_agent.get_tool_executor', return_value=busy_pool),
+                patch.dict(
+                    'src.agents.finance_agent.TOOL_TIMEOUTS', {'get_stock_time_series': 0.45}
+                ),
+            ):
+                results = agent.run_tools_parallel(calls)
+        finally:
+            busy_pool.shutdown()
+
+        assert results == {'get_stock_metrics': 'metrics', 'get_stock_time_series': 'series'}
@@ -28,6 +28,25 @@ class TestRateLimiting:
         result = test_func()
         assert result == 1
 
+    def test_rate_limiting_concurrent_calls(self):
+        """Test that concurrent calls are spaced by the minimum interval"""
+        import threading
+        import time
+        call_times = []
+
+        @rate_limited(max_per_minute=600)  # 0.1s between calls
+        def test_func():
+            call_times.append(time.monotonic())
+
+        threads = [threading.Thread(target=test_func) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        call_times.sort()
+        assert all(b - a >= 0.09 for a, b in zip(call_times, call_times[1:]))
+
 
 class TestAlphaVantageClient:
     """Test Alpha Vantage client"""
@@ -92,6 +111,55 @@ class TestAlphaVantageClient:
             with pytest.raises(ValueError, match="Rate Limit"):
                 client.get_quote("AAPL")
     
+    def test_quote_and_overview_fetched_concurrently(self, client):
+        """Test quote and overview are both fetched and returned together"""
+        with (
+            patch.object(client, 'get_quote', return_value={'price': 150.0}) as get_quote,
+            patch.object(
+                client, 'get_company_overview', return_value={'pe_ratio': '30'}
+            ) as get_overview,
+        ):
+            quote, overview = client.get_quote_and_overview("AAPL")
+
+        assert quote == {'price': 150.0}
+        assert overview == {'pe_ratio': '30'}
+        get_quote.assert_called_once_with("AAPL")
+        get_overview.assert_called_once_with("AAPL")
+
+    def test_time_series_shared_between_calls(self, client, tmp_path):
+        """Test the parsed time series is fetched once and shared"""
+        client.cache_dir = str(tmp_path)
+        mock_response = {
+            "Time Series (Daily)": {
+                "2024-01-02": {
+                    "1. open": "1",
+                    "2. high": "2",
+                    "3. low": "0.5",
+                    "4. close": "1.5",
+                    "5. volume": "10",
+                },
+                "2024-01-01": {
+                    "1. open": "1",
+                    "2. high": "2",
+                    "3. low": "0.5",
+                    "4. close": "1.2",
+                    "5. volume": "10",
+                },
+            }
+        }
+
+        with patch.object(
+            AlphaVantageClient, '_make_request', return_value=mock_response
+        ) as mock_request:
+            first = client.get_time_series_daily("SHARED")
+            first['close'] = 0.0
+            other = AlphaVantageClient(api_key="test_key")
+            other.cache_dir = str(tmp_path)
+            second = other.get_time_series_daily("SHARED")
+
+        assert mock_request.call_count == 1
+        assert second['close'].tolist() == [1.2, 1.5]
+
     def test_calculate_sma(self, client):
         """Test SMA calculation"""
         import pandas as pd
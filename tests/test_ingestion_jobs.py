@@ -0,0 +1,86 @@
+"""
+Tests for the background ingestion job queue
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+from src.web.ingestion_jobs import IngestionJobQueue, DONE, FAILED
+
+
+class FakeClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = datetime(2024, 1, 1)
+
+    def __call__(self):
+        return self.now
+
+
+class TestIngestionJobQueue:
+    """Test ingestion job queue"""
+
+    def test_concurrent_submits_share_one_job(self, tmp_path):
+        """Test jobs for the same ticker are deduplicated while active"""
+        release = threading.Event()
+        calls = []
+
+        def runner(ticker, progress):
+            calls.append(ticker)
+            progress('embedding', 0.5, 'halfway')
+            release.wait(5)
+
+        queue = IngestionJobQueue(runner, max_workers=2, state_dir=str(tmp_path))
+        first = queue.submit("AAPL")
+        second = queue.submit("AAPL")
+        assert first is second
+
+        release.set()
+        state = first.to_dict()
+        while state['status'] != DONE:
+            state = queue.wait_for_update(first, since=state['updated_at'], timeout=5)
+
+        assert calls == ["AAPL"]
+        assert state['progress'] == 1.0
+
+    def test_failed_job_is_persisted_and_reloaded(self, tmp_path):
+        """Test job state survives a restart"""
+        def runner(ticker, progress):
+            raise ValueError("download failed")
+
+        queue = IngestionJobQueue(runner, state_dir=str(tmp_path))
+        job = queue.submit("MSFT")
+        state = job.to_dict()
+        while state['status'] != FAILED:
+            state = queue.wait_for_update(job, since=state['updated_at'], timeout=5)
+
+        reloaded = IngestionJobQueue(runner, state_dir=str(tmp_path))
+
+        latest = reloaded.get_latest("MSFT")
+        assert latest.id == job.id
+        assert latest.status == FAILED
+        assert latest.error == "download failed"
+
+    def test_tickers_are_normalized_and_finished_jobs_expire(self, tmp_path):
+        """Test "aapl" and "AAPL" share a job and finished jobs are pruned after the TTL"""
+        clock = FakeClock()
+        release = threading.Event()
+        queue = IngestionJobQueue(
+            lambda ticker, progress: release.wait(5),
+            state_dir=str(tmp_path), finished_ttl=3600, clock=clock
+        )
+        job = queue.submit("aapl")
+        assert queue.submit("AAPL ") is job
+        assert job.ticker == "AAPL"
+
+        release.set()
+        state = job.to_dict()
+        while state['status'] != DONE:
+            state = queue.wait_for_update(job, since=state['updated_at'], timeout=5)
+
+        clock.now += timedelta(minutes=30)
+        assert queue.get_latest("aapl") is job
+        clock.now += timedelta(hours=1)
+        assert queue.list_jobs() == []
+        assert queue.get_latest("AAPL") is None
+        assert not os.path.exists(tmp_path / f"{job.id}.json")
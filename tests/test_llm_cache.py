@@ -0,0 +1,133 @@
+"""
+Tests for the persistent LLM response cache
+"""
+import asyncio
+import pytest
+from llama_index.core.llms import ChatMessage, MockLLM
+from src.rag.llm_cache import CachedLLM, LLMResponseStore, RECORD, REPLAY
+
+
+class CountingLLM(MockLLM):
+    """MockLLM counting the calls that reach it"""
+    calls: int = 0
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        self.calls += 1
+        return super().complete(prompt, formatted=formatted, **kwargs)
+
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        self.calls += 1
+        return super().stream_complete(prompt, formatted=formatted, **kwargs)
+
+
+class FakeClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LLMResponseStore(str(tmp_path / "llm.sqlite"))
+    yield store
+    store.close()
+
+
+class TestCachedLLM:
+    """Test responses served from the cache"""
+
+    def test_identical_calls_hit_cache(self, store):
+        """Test a repeated prompt or conversation is answered without the LLM"""
+        inner = CountingLLM(max_tokens=4)
+        llm = CachedLLM(inner, store)
+        messages = [
+            ChatMessage(role="system", content="analyste"),
+            ChatMessage(role="user", content="risques AAPL"),
+        ]
+
+        first = llm.complete("Quels sont les risques ?").text
+        assert llm.complete("Quels sont les risques ?").text == first
+        assert llm.chat(messages).message.content == llm.chat(messages).message.content
+        assert inner.calls == 2
+
+        # Other parameters or another message: other keys
+        CachedLLM(CountingLLM(max_tokens=3), store).complete("Quels sont les risques ?")
+        llm.complete("Quelle est la stratégie ?")
+        assert store.stats()['entries'] == 4
+
+    def test_streams_are_cached_once_complete(self, store):
+        """Test a streamed answer is stored and replayed as one chunk"""
+        inner = CountingLLM(max_tokens=4)
+        llm = CachedLLM(inner, store)
+        messages = [ChatMessage(role="user", content="tendance du cours")]
+
+        deltas = [chunk.delta for chunk in llm.stream_chat(messages)]
+        cached = [chunk.delta for chunk in llm.stream_chat(messages)]
+
+        async def astream():
+            return [chunk.delta async for chunk in await llm.astream_chat(messages)]
+
+        assert len(deltas) > 1
+        assert cached == ["".join(deltas)] == asyncio.run(astream())
+        assert inner.calls == 1
+
+    def test_record_then_replay_offline(self, tmp_path):
+        """Test replay mode serves recorded responses and never calls the LLM"""
+        path = str(tmp_path / "fixtures.sqlite")
+        recorder = CachedLLM(CountingLLM(max_tokens=4), LLMResponseStore(path, ttl=1), mode=RECORD)
+        recorded = recorder.complete("Résumez le 10-K").text
+        recorder.complete("Résumez le 10-K")
+        assert recorder.llm.calls == 2
+
+        # New process: the responses come from the file, even past their TTL
+        clock = FakeClock()
+        clock.now = 1e12
+        inner = CountingLLM(max_tokens=4)
+        replay = CachedLLM(inner, LLMResponseStore(path, ttl=1, clock=clock), mode=REPLAY)
+
+        assert replay.complete("Résumez le 10-K").text == recorded
+        with pytest.raises(RuntimeError, match="replay"):
+            replay.complete("Question jamais enregistrée")
+        assert inner.calls == 0
+
+
+class TestLLMResponseStore:
+    """Test store bounds"""
+
+    def test_ttl_expiry(self, tmp_path):
+        """Test a response older than the TTL is a miss"""
+        clock = FakeClock()
+        store = LLMResponseStore(str(tmp_path / "llm.sqlite"), ttl=60, clock=clock)
+        store.put("k", {'text': "réponse"})
+
+        clock.now += 30
+        assert store.get("k") == {'text': "réponse"}
+        clock.now += 31
+        assert store.get("k") is None
+        assert store.get("k", ignore_ttl=True) == {'text': "réponse"}
+
+    def test_lru_eviction_by_count_and_size(self, tmp_path):
+        """Test least recently used responses are evicted past either bound"""
+        clock = FakeClock()
+        store = LLMResponseStore(
+            str(tmp_path / "llm.sqlite"), ttl=None, max_entries=2, max_bytes=200, clock=clock
+        )
+        for key in ("a", "b"):
+            clock.now += 1
+            store.put(key, {'text': key})
+        clock.now += 1
+        store.get("a")
+        clock.now += 1
+        store.put("c", {'text': "c"})  # over the count bound: b is the LRU entry
+
+        assert store.get("b") is None
+        assert store.get("a") and store.get("c")
+
+        clock.now += 1
+        store.put("d", {'text': "x" * 180})  # over the size bound
+        assert store.stats()['entries'] == 1
+        assert store.stats()['evictions'] == 3
@@ -1,11 +1,17 @@
 """
 Tests for RAG system
 """
+import threading
 import pytest
+import numpy as np
 from unittest.mock import Mock, patch, MagicMock
-from llama_index.core import Document
+from llama_index.core import Document, VectorStoreIndex
 from src.rag.ingestion import DocumentIngester
-from src.rag.retrieval import AdvancedRAGRetriever
+from src.rag.retrieval import AdvancedRAGRetriever, RetrievalRequest
+from src.rag.chunking import StructuredChunker, split_blocks
+from src.rag.manifest import IngestionManifest
+from src.rag.store_registry import VectorStoreRegistry
+from src.rag.flat_store import NumpyVectorStore
 
 
 class TestDocumentIngester:
@@ -41,6 +47,379 @@ class TestDocumentIngester:
         assert {doc.metadata.get('section') for doc in documents} == {"Item 1", "Item 1A"}
 
 
+class TestVectorStoreRegistry:
+    """Test shared vector store registry"""
+
+    def test_client_and_index_are_shared(self, tmp_path):
+        """Test one client per directory and one index per collection"""
+        from llama_index.core.embeddings import MockEmbedding
+        registry = VectorStoreRegistry()
+        persist_dir = str(tmp_path / "vector_db")
+
+        assert registry.get_client(persist_dir) is registry.get_client(persist_dir)
+        assert not registry.has_collection(persist_dir, "shared")
+
+        index = registry.get_index(persist_dir, "shared", embed_model=MockEmbedding(embed_dim=8))
+
+        assert registry.has_collection(persist_dir, "shared")
+        assert registry.get_index(persist_dir, "shared") is index
+
+        registry.delete_collection(persist_dir, "shared")
+        assert not registry.has_collection(persist_dir, "shared")
+
+    @pytest.mark.parametrize("backend", ["chroma", "numpy"])
+    def test_retrievers_survive_a_reset(self, tmp_path, backend):
+        """Test a retriever built before a reset re-ingestion searches the new collection"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(
+                persist_dir=str(tmp_path / "vector_db"), vector_backend=backend
+            )
+        docs = ingester.create_documents_from_sections({"Item 1": "Old business content."})
+        index = ingester.ingest_documents(docs, collection_name="test_reset")
+        retriever = AdvancedRAGRetriever(
+            index=index,
+            llm=None,
+            similarity_cutoff=0.0,
+            sparse_index=ingester.get_sparse_index("test_reset"),
+        )
+
+        docs = ingester.create_documents_from_sections({"Item 7": "New management discussion."})
+        ingester.ingest_documents(docs, collection_name="test_reset", reset=True)
+
+        nodes = retriever.retrieve("management discussion")
+        assert [n.node.metadata['section'] for n in nodes] == ["Item 7"]
+
+    def test_release_drops_cached_stores(self, tmp_path):
+        """Test a released collection is reloaded from disk, unless it is being written"""
+        from llama_index.core.embeddings import MockEmbedding
+        registry = VectorStoreRegistry()
+        persist_dir = str(tmp_path / "vector_db")
+        index = registry.get_index(
+            persist_dir, "released", embed_model=MockEmbedding(embed_dim=8), backend="numpy"
+        )
+        sparse_index = registry.get_sparse_index(persist_dir, "released", "numpy")
+        parent_store = registry.get_parent_store(persist_dir, "released", "numpy")
+
+        with registry.collection_lock(persist_dir, "released"):
+            released = threading.Thread(target=registry.release, args=(persist_dir, "released"))
+            released.start()
+            released.join()
+        assert registry.get_index(persist_dir, "released", backend="numpy") is index
+
+        assert registry.release(persist_dir, "released")
+        assert registry.get_index(persist_dir, "released", backend="numpy") is not index
+        assert registry.get_numpy_store(persist_dir, "released") is not index.vector_store
+        assert registry.get_sparse_index(persist_dir, "released", "numpy") is not sparse_index
+        assert registry.get_parent_store(persist_dir, "released", "numpy") is not parent_store
+
+
+class TestIncrementalIngestion:
+    """Test manifest-based incremental ingestion"""
+
+    @pytest.fixture
+    def ingester(self, tmp_path):
+        """Create ingester with a mock embedding model"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            yield DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+
+    def test_manifest_diff_section(self, tmp_path):
+        """Test chunk-level diff of a re-parsed section"""
+        manifest = IngestionManifest(str(tmp_path / "m.json"), "test")
+        manifest.set_section("f1", "Item 1A", "h1", {"a": "id-a", "b": "id-b"})
+
+        to_insert, stale = manifest.diff_section("f1", "Item 1A", ["a", "c"])
+
+        assert to_insert == ["c"]
+        assert stale == ["id-b"]
+        assert manifest.is_section_current("f1", "Item 1A", "h1")
+        assert not manifest.is_section_current("f1", "Item 1A", "h2")
+
+    def test_manifest_persistence(self, tmp_path):
+        """Test manifest is saved and reloaded with its version"""
+        manifest = IngestionManifest.for_collection(str(tmp_path), "test")
+        assert manifest.is_new
+        manifest.set_section("f1", "Item 1", "h", {"a": "id-a"})
+        manifest.bump_version()
+        manifest.save()
+
+        reloaded = IngestionManifest.for_collection(str(tmp_path), "test")
+
+        assert not reloaded.is_new
+        assert reloaded.version == 1
+        assert reloaded.node_ids() == ["id-a"]
+
+    def test_reingest_is_noop_and_delta(self, ingester):
+        """Test unchanged sections are skipped and changed ones replaced"""
+        sections = {"Item 1": "Business content.", "Item 1A": "Risk factors content."}
+        docs = ingester.create_documents_from_sections(
+            sections, {'ticker': 'TEST', 'filing_id': 'f1'}
+        )
+        ingester.ingest_documents(docs, collection_name="test_delta")
+        assert ingester.last_ingest_stats['added'] == 2
+        version = ingester.last_ingest_stats['version']
+
+        ingester.ingest_documents(docs, collection_name="test_delta")
+        assert ingester.last_ingest_stats['added'] == 0
+        assert ingester.last_ingest_stats['unchanged_sections'] == 2
+        assert ingester.last_ingest_stats['version'] == version
+
+        sections["Item 1A"] = "Updated risk factors content."
+        docs = ingester.create_documents_from_sections(
+            sections, {'ticker': 'TEST', 'filing_id': 'f1'}
+        )
+        ingester.ingest_documents(docs, collection_name="test_delta")
+        assert ingester.last_ingest_stats['added'] == 1
+        assert ingester.last_ingest_stats['deleted'] == 1
+        assert ingester.chroma_client.get_collection("test_delta").count() == 2
+
+    def test_removed_sections_are_deleted(self, ingester):
+        """Test sections missing from a re-parsed filing lose their vectors"""
+        sections = {"Item 1": "Business content.", "Item 7": "Management discussion."}
+        docs = ingester.create_documents_from_sections(sections, {'filing_id': 'f1'})
+        ingester.ingest_documents(docs, collection_name="test_orphans")
+        other = ingester.create_documents_from_sections(
+            {"Item 1": "Other filing."}, {'filing_id': 'f2'}
+        )
+        ingester.ingest_documents(other, collection_name="test_orphans")
+
+        docs = ingester.create_documents_from_sections(
+            {"Item 1": "Business content."}, {'filing_id': 'f1'}
+        )
+        ingester.ingest_documents(docs, collection_name="test_orphans")
+
+        assert ingester.last_ingest_stats['removed_sections'] == 1
+        assert ingester.last_ingest_stats['deleted'] == 1
+        manifest = ingester.get_manifest("test_orphans")
+        assert manifest.sections("f1") == ["Item 1"]
+        assert manifest.sections("f2") == ["Item 1"]
+        assert ingester.chroma_client.get_collection("test_orphans").count() == 2
+
+    def test_failed_insert_keeps_manifest(self, ingester):
+        """Test a failed insert is raised and leaves the manifest unchanged"""
+        docs = ingester.create_documents_from_sections(
+            {"Item 1": "Business content."}, {'filing_id': 'f1'}
+        )
+
+        with patch.object(VectorStoreIndex, 'insert_nodes', side_effect=RuntimeError("disk full")):
+            with pytest.raises(RuntimeError, match="disk full"):
+                ingester.ingest_documents(docs, collection_name="test_failure")
+        assert ingester.get_manifest("test_failure").node_ids() == []
+
+        ingester.ingest_documents(docs, collection_name="test_failure")
+        assert ingester.last_ingest_stats['added'] == 1
+
+    def test_failed_insert_after_reset_is_retried(self, ingester):
+        """Test a reset followed by a failed insert re-indexes everything on the next ingest"""
+        docs = ingester.create_documents_from_sections(
+            {"Item 1": "Business content.", "Item 1A": "Risk content."}, {'filing_id': 'f1'}
+        )
+        ingester.ingest_documents(docs, collection_name="test_reset_failure")
+
+        with patch.object(VectorStoreIndex, 'insert_nodes', side_effect=RuntimeError("disk full")):
+            with pytest.raises(RuntimeError, match="disk full"):
+                ingester.ingest_documents(docs, collection_name="test_reset_failure", reset=True)
+        assert ingester.get_manifest("test_reset_failure").node_ids() == []
+
+        ingester.ingest_documents(docs, collection_name="test_reset_failure")
+        assert ingester.last_ingest_stats['added'] == 2
+        assert ingester.chroma_client.get_collection("test_reset_failure").count() == 2
+
+
+class TestStructuredChunker:
+    """Test structure-aware chunking"""
+
+    @pytest.fixture
+    def chunker(self):
+        """Create chunker with a whitespace tokenizer"""
+        return StructuredChunker(
+            max_chunk_size=50,
+            min_chunk_size=10,
+            chunk_overlap=5,
+            tokenizer=lambda text: text.split()
+        )
+
+    def test_split_blocks_kinds(self):
+        """Test block detection keeps offsets and kinds"""
+        text = (
+            "Item 1A. Risk Factors\n\nThe Company faces competition.\n\n"
+            "| Year | Sales |\n| 2009 | 42 |"
+        )
+
+        blocks = split_blocks(text)
+
+        assert [b.kind for b in blocks] == ['heading', 'paragraph', 'table']
+        assert all(text[b.start:b.end] == b.text for b in blocks)
+
+    def test_small_section_is_single_chunk(self, chunker):
+        """Test short sections stay in one chunk"""
+        doc = Document(
+            text="Competition\n\nThe market is highly competitive.", metadata={'section': 'Item 1'}
+        )
+
+        nodes = chunker.get_nodes_from_documents([doc])
+
+        assert len(nodes) == 1
+        assert nodes[0].metadata['section'] == 'Item 1'
+        assert nodes[0].metadata['heading'] == 'Competition'
+
+    def test_tables_are_kept_intact(self, chunker):
+        """Test tables become their own chunk with row/column metadata"""
+        paragraph = " ".join(["word"] * 30)
+        table = "| Year | Net sales |\n| 2009 | 42,905 |\n| 2008 | 37,491 |"
+        doc = Document(text=f"{paragraph}\n\n{table}\n\n{paragraph}")
+
+        nodes = chunker.get_nodes_from_documents([doc])
+
+        tables = [n for n in nodes if n.metadata['chunk_type'] == 'table']
+        assert len(tables) == 1
+        assert tables[0].text == table
+        assert tables[0].metadata['table_rows'] == 3
+        assert tables[0].metadata['table_columns'] == 2
+
+    def test_each_heading_labels_its_own_chunk(self, chunker):
+        """Test content is never labelled with the heading that follows it"""
+        doc = Document(text=(
+            "Competition\n\nThe market is highly competitive.\n\n"
+            "Employees\n\nThe Company had 35,000 employees."
+        ))
+
+        nodes = chunker.get_nodes_from_documents([doc])
+
+        assert [(n.metadata['heading'], n.text.split('\n\n')[-1]) for n in nodes] == [
+            ("Competition", "The market is highly competitive."),
+            ("Employees", "The Company had 35,000 employees."),
+        ]
+
+    def test_table_fragments_join_their_neighbour(self, chunker):
+        """Test one-row layout tables are not chunks of their own"""
+        paragraph = " ".join(["word"] * 10)
+        doc = Document(
+            text=f"| PART I |\n\n{paragraph}\n\n| Year | Sales |\n| 2009 | 42 |\n\n| (1) |"
+        )
+
+        nodes = chunker.get_nodes_from_documents([doc])
+
+        assert [n.metadata['chunk_type'] for n in nodes] == ['text', 'table']
+        assert nodes[0].text.startswith("| PART I |")
+        assert nodes[1].text.endswith("| (1) |")
+
+    def test_adaptive_chunks_without_overlap(self, chunker):
+        """Test paragraphs are packed into balanced chunks without duplication"""
+        paragraphs = [" ".join([f"p{i}w{j}" for j in range(20)]) for i in range(6)]
+        doc = Document(text="\n\n".join(paragraphs))
+
+        nodes = chunker.get_nodes_from_documents([doc])
+
+        assert len(nodes) == 3
+        words = [w for n in nodes for w in n.text.split()]
+        assert len(words) == len(set(words)) == 120
+
+
+class TestNumpyVectorStore:
+    """Test in-process NumPy vector store"""
+
+    @staticmethod
+    def make_node(node_id, embedding, **metadata):
+        from llama_index.core.schema import TextNode
+        return TextNode(id_=node_id, text=f"text {node_id}", embedding=embedding, metadata=metadata)
+
+    def test_query_filter_delete_and_reload(self, tmp_path):
+        """Test exact search, metadata filters, deletion and persistence"""
+        from llama_index.core.vector_stores import (
+            VectorStoreQuery,
+            MetadataFilters,
+            ExactMatchFilter,
+        )
+
+        store = NumpyVectorStore(str(tmp_path / "store"), dtype="float16")
+        store.add([
+            self.make_node("a", [1.0, 0.0, 0.0], section="Item 1"),
+            self.make_node("b", [0.9, 0.1, 0.0], section="Item 1A"),
+            self.make_node("c", [0.0, 1.0, 0.0], section="Item 1A"),
+        ])
+
+        result = store.query(VectorStoreQuery(query_embedding=[1.0, 0.0, 0.0], similarity_top_k=2))
+        assert result.ids == ["a", "b"]
+        assert result.similarities[0] == pytest.approx(1.0, abs=1e-3)
+        assert result.nodes[0].metadata["section"] == "Item 1"
+
+        filters = MetadataFilters(filters=[ExactMatchFilter(key="section", value="Item 1A")])
+        result = store.query(
+            VectorStoreQuery(query_embedding=[1.0, 0.0, 0.0], similarity_top_k=2, filters=filters)
+        )
+        assert result.ids == ["b", "c"]
+
+        store.delete_nodes(["b"])
+        reloaded = NumpyVectorStore(str(tmp_path / "store"), dtype="float16")
+        assert reloaded.count() == 2
+        result = reloaded.query(
+            VectorStoreQuery(query_embedding=[1.0, 0.0, 0.0], similarity_top_k=5)
+        )
+        assert result.ids == ["a", "c"]
+
+    def test_batches_written_once_on_persist(self, tmp_path):
+        """Test added batches stay in memory, searchable, until persist()"""
+        from llama_index.core.vector_stores import VectorStoreQuery
+        store = NumpyVectorStore(str(tmp_path / "store"))
+        with patch('src.rag.flat_store.np.save', wraps=np.save) as save:
+            store.add([self.make_node("a", [1.0, 0.0])])
+            store.add([self.make_node("b", [0.0, 1.0])])
+            result = store.query(VectorStoreQuery(query_embedding=[0.0, 1.0], similarity_top_k=1))
+            assert result.ids == ["b"]
+            assert save.call_count == 0
+            assert NumpyVectorStore(str(tmp_path / "store")).count() == 0
+
+            store.persist()
+            store.persist()
+            assert save.call_count == 1
+        assert NumpyVectorStore(str(tmp_path / "store")).count() == 2
+
+    def test_vector_memory_is_sized_from_rows(self, tmp_path):
+        """Test vector memory is rows x dimension x item size, whatever the backend"""
+        from llama_index.core.embeddings import MockEmbedding
+        from src.rag.store_registry import vector_store_nbytes
+        store = NumpyVectorStore(str(tmp_path / "store"), dtype="float16")
+        store.add([self.make_node(str(i), [1.0] * 16) for i in range(10)])
+        assert vector_store_nbytes(store) == 10 * 16 * 2
+
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        sections = {f"Item {i}": f"Business content number {i}." for i in range(1, 4)}
+        index = ingester.ingest_documents(
+            ingester.create_documents_from_sections(sections), collection_name="test_size"
+        )
+        assert vector_store_nbytes(index.vector_store) >= 3 * 8 * 4
+        assert ingester.get_sparse_index("test_size").nbytes() > 0
+
+    def test_incremental_ingestion_with_numpy_backend(self, tmp_path):
+        """Test DocumentIngester can index into the NumPy backend"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(
+                persist_dir=str(tmp_path / "vector_db"), vector_backend="numpy"
+            )
+        docs = ingester.create_documents_from_sections(
+            {"Item 1": "Business content."}, {'filing_id': 'f1'}
+        )
+
+        index = ingester.ingest_documents(docs, collection_name="test_numpy")
+
+        assert ingester.last_ingest_stats['added'] == 1
+        assert ingester.registry.count(ingester.persist_dir, "test_numpy", "numpy") == 1
+        nodes = index.as_retriever(similarity_top_k=1).retrieve("business")
+        assert nodes[0].node.metadata['section'] == "Item 1"
+
+
 class TestAdvancedRAGRetriever:
     """Test RAG retriever"""
     
@@ -69,8 +448,575 @@ class TestAdvancedRAGRetriever:
         
         assert query_engine is not None
 
+    def test_build_metadata_filters(self):
+        """Test filter dictionaries become vector store filters"""
+        from src.rag.retrieval import build_metadata_filters
+
+        filters = build_metadata_filters(
+            {'section': 'Item 1A', 'fiscal_year': 2024, 'ticker': ['AAPL', 'MSFT']}
+        )
+
+        assert [(f.key, f.operator.value, f.value) for f in filters.filters] == [
+            ('section', '==', 'Item 1A'),
+            ('year', '==', '2024'),
+            ('ticker', 'in', ['AAPL', 'MSFT']),
+        ]
+        assert build_metadata_filters(None) is None
+
+    def test_metadata_filter_is_pushed_down(self, tmp_path):
+        """Test filtered retrieval returns top-k among matching chunks only"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        sections = {f"Item {i}": f"Business content number {i}." for i in range(2, 8)}
+        sections["Item 1A"] = "Risk factors content."
+        docs = ingester.create_documents_from_sections(sections, {'ticker': 'TEST', 'year': '2024'})
+        index = ingester.ingest_documents(docs, collection_name="test_filters")
+        retriever = AdvancedRAGRetriever(index=index, similarity_top_k=2)
+
+        nodes = retriever.retrieve_with_metadata_filter(
+            "risks", {'section': 'Item 1A', 'fiscal_year': 2024}
+        )
+
+        assert [n.metadata['section'] for n in nodes] == ["Item 1A"]
+
+    def test_query_with_sources_searches_once(self, tmp_path):
+        """Test answer and sources come from a single vector search"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        sections = {
+            "Item 1": "Apple designs smartphones and computers.",
+            "Item 1A": "Competition is a major risk factor.",
+        }
+        docs = ingester.create_documents_from_sections(sections, {'ticker': 'TEST'})
+        index = ingester.ingest_documents(docs, collection_name="test_single_pass")
+        retriever = AdvancedRAGRetriever(index=index, llm=None, similarity_top_k=2)
+
+        store_cls = type(index.vector_store)
+        with patch.object(
+            store_cls, 'query', autospec=True, side_effect=store_cls.query
+        ) as vector_query:
+            result = retriever.query_with_sources("Quels sont les principaux risques ?")
+
+        assert vector_query.call_count == 1
+        assert [n.metadata['section'] for n in result.source_nodes] == ["Item 1A"]
+        assert "Competition" in result.answer
+        assert "Section: Item 1A (Ticker: TEST)" in result.format_sources()
+
+    def test_semantic_cache_is_scoped_to_collection_version(self, tmp_path):
+        """Test near-identical questions reuse the answer until the collection changes"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        docs = ingester.create_documents_from_sections(
+            {"Item 1A": "Competition is a major risk factor."}, {'ticker': 'TEST'}
+        )
+        index = ingester.ingest_documents(docs, collection_name="test_cache")
+        retriever = AdvancedRAGRetriever(
+            index=index,
+            llm=None,
+            collection_version=lambda: ingester.get_collection_version("test_cache")
+        )
+
+        store_cls = type(index.vector_store)
+        with patch.object(
+            store_cls, 'query', autospec=True, side_effect=store_cls.query
+        ) as vector_query:
+            first = retriever.query_with_sources("Quels sont les principaux risques ?")
+            second = retriever.query_with_sources("quels sont les principaux risques")
+            assert second is first
+            assert vector_query.call_count == 1
+            assert retriever.embedding_cache.stats()['hits'] == 1
+
+            docs = ingester.create_documents_from_sections(
+                {"Item 1A": "Supply chain is a new risk."}, {'ticker': 'TEST'}
+            )
+            ingester.ingest_documents(docs, collection_name="test_cache")
+            third = retriever.query_with_sources("Quels sont les principaux risques ?")
+
+        assert vector_query.call_count == 2
+        assert "Supply chain" in third.answer
+
+    def test_semantic_cache_keeps_years_and_tickers_apart(self, tmp_path):
+        """Test questions differing only by a year or ticker never share an answer"""
+        from llama_index.core.embeddings import MockEmbedding
+        from src.rag.cache import query_facets
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        docs = ingester.create_documents_from_sections(
+            {"Item 7": "Revenue grew in 2023."}, {'ticker': 'TEST'}
+        )
+        index = ingester.ingest_documents(docs, collection_name="test_cache_facets")
+        retriever = AdvancedRAGRetriever(
+            index=index,
+            llm=None,
+            collection_version=lambda: ingester.get_collection_version("test_cache_facets")
+        )
+
+        # MockEmbedding embeds every question identically
+        first = retriever.query_with_sources("Quels étaient les revenus 2022 ?")
+        assert retriever.query_with_sources("quels étaient les revenus 2022") is first
+        assert retriever.query_with_sources("Quels étaient les revenus 2023 ?") is not first
+        assert retriever.query_with_sources("Quels étaient les revenus 2022 de MSFT ?") is not first
+        assert retriever.response_cache.stats()['hits'] == 1
+        assert query_facets("Revenus T3 2023 : 1,5 Md$ pour AAPL") == (
+            ("1.5", "2023", "3"),
+            ("AAPL",),
+        )
+
+    def test_per_call_requests_share_one_retriever(self, tmp_path):
+        """Test concurrent queries with different parameters never affect each other"""
+        import dataclasses
+        from concurrent.futures import ThreadPoolExecutor
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        sections = {f"Item {i}": f"Business content number {i}." for i in range(1, 9)}
+        docs = ingester.create_documents_from_sections(sections, {'ticker': 'TEST'})
+        index = ingester.ingest_documents(docs, collection_name="test_requests")
+        retriever = AdvancedRAGRetriever(index=index, llm=None, similarity_top_k=2)
+
+        request = retriever.make_request(top_k=1, similarity_cutoff=0.99)
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            request.top_k = 3
+
+        def run(top_k):
+            result = retriever.query_with_sources(
+                "business content", request=retriever.make_request(top_k=top_k)
+            )
+            return top_k, len(result.source_nodes)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(run, [1, 2, 3, 4, 5, 6] * 3))
+
+        assert all(top_k == count for top_k, count in results)
+        assert retriever.default_request.top_k == 2
+        assert retriever.postprocessor.similarity_cutoff == 0.7
+
+
+class TestHybridRetrieval:
+    """Test BM25 index and dense + sparse fusion"""
+
+    def test_bm25_index_update_and_reload(self, tmp_path):
+        """Test lexical ranking, deletions and persistence"""
+        from src.rag.sparse import BM25Index
+        index = BM25Index(str(tmp_path / "bm25"))
+        index.update(added=[
+            ("a", "Goodwill impairment charges were recorded this year."),
+            ("b", "Revenue grew thanks to iPhone sales."),
+            ("c", "Goodwill is tested annually."),
+        ])
+
+        assert [node_id for node_id, _ in index.search("goodwill impairment")] == ["a", "c"]
+        assert index.search("dividends") == []
+
+        index.update(deleted=["a"])
+        reloaded = BM25Index(str(tmp_path / "bm25"))
+        assert reloaded.count() == 2
+        assert [node_id for node_id, _ in reloaded.search("goodwill impairment")] == ["c"]
+
+    def test_reciprocal_rank_fusion(self):
+        """Test nodes ranked by both lists come first"""
+        from llama_index.core.schema import TextNode, NodeWithScore
+        from src.rag.retrieval import reciprocal_rank_fusion
+        a, b, c = (TextNode(id_=i, text=i) for i in "abc")
+
+        fused = reciprocal_rank_fusion([
+            [NodeWithScore(node=a, score=0.9), NodeWithScore(node=b, score=0.8)],
+            [NodeWithScore(node=c, score=5.0), NodeWithScore(node=b, score=3.0)],
+        ])
+
+        assert [n.node.node_id for n in fused][0] == "b"
+        assert {n.node.node_id for n in fused} == {"a", "b", "c"}
+
+        # Ties carry no order: the other list decides
+        tied = reciprocal_rank_fusion([
+            [NodeWithScore(node=a, score=1.0), NodeWithScore(node=b, score=1.0)],
+            [NodeWithScore(node=c, score=5.0)],
+        ])
+        assert [n.node.node_id for n in tied][0] == "c"
+
+    def test_weak_lexical_hits_need_the_cutoff(self):
+        """Test only well-fused BM25 hits skip the dense similarity cutoff"""
+        from llama_index.core.schema import TextNode, NodeWithScore
+        from src.rag.retrieval import reciprocal_rank_fusion
+        retriever = AdvancedRAGRetriever.__new__(AdvancedRAGRetriever)
+        retriever.rrf_k = 60
+        retriever.reranker = None
+        nodes = {i: TextNode(id_=i, text=i) for i in "abcdefgh"}
+        dense = [NodeWithScore(node=nodes[i], score=0.3) for i in "ab"]
+        sparse = [NodeWithScore(node=nodes[i], score=10.0 - n) for n, i in enumerate("cdefgh")]
+        candidates = reciprocal_rank_fusion([dense, sparse])
+        request = RetrievalRequest(top_k=10, fallback_similarity_cutoff=0.2)
+
+        selected = retriever.select_nodes(
+            "q", candidates, request, dense_scores={"a": 0.3, "b": 0.3}, lexical_ids=set("cdefgh")
+        )
+
+        # BM25 ranks 1-5 pass; rank 6 ("h") has no dense similarity to pass a cutoff
+        assert {n.node.node_id for n in selected} == set("cdefg")
+
+    def test_hybrid_query_finds_exact_terms(self, tmp_path):
+        """Test BM25 hits are used when dense similarity is uninformative"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        sections = {f"Item {i}": f"Generic business discussion number {i}." for i in range(2, 9)}
+        sections["Item 8"] = "A goodwill impairment charge of $2 billion was recorded."
+        docs = ingester.create_documents_from_sections(sections, {'ticker': 'TEST'})
+        index = ingester.ingest_documents(docs, collection_name="test_hybrid")
+        retriever = AdvancedRAGRetriever(
+            index=index,
+            llm=None,
+            similarity_top_k=1,
+            candidate_top_k=3,
+            sparse_index=ingester.get_sparse_index("test_hybrid")
+        )
+
+        result = retriever.query_with_sources("goodwill impairment")
+
+        assert ingester.get_sparse_index("test_hybrid").count() == len(sections)
+        assert [n.metadata['section'] for n in result.source_nodes] == ["Item 8"]
+
+
+class TestReranking:
+    """Test rerankers"""
+
+    @staticmethod
+    def make_nodes(texts):
+        from llama_index.core.schema import TextNode, NodeWithScore
+        return [
+            NodeWithScore(node=TextNode(id_=str(i), text=t), score=0.9 - i * 0.1)
+            for i, t in enumerate(texts)
+        ]
+
+    def test_lexical_reranker_prefers_query_terms(self):
+        """Test chunks covering the query terms move up"""
+        from src.rag.rerank import LexicalReranker
+        nodes = self.make_nodes([
+            "The company sells phones.",
+            "Supply chain disruptions are a risk.",
+            "Supply chain risk from single-source suppliers in Asia.",
+        ])
+
+        reranked = LexicalReranker().rerank("supply chain risk suppliers", nodes, top_k=2)
+
+        assert [n.node.node_id for n in reranked] == ["2", "1"]
+
+    def test_cross_encoder_scores_are_cached(self):
+        """Test (query, node) pairs are scored once, in one batch"""
+        from src.rag.rerank import CrossEncoderReranker
+        model = Mock()
+        model.predict.side_effect = lambda pairs, **kwargs: [float(len(text)) for _, text in pairs]
+        reranker = CrossEncoderReranker()
+        reranker._model = model
+        nodes = self.make_nodes(["short", "a much longer chunk"])
+
+        first = reranker.rerank("Question ?", nodes, top_k=1)
+        second = reranker.rerank("question", nodes, top_k=1)
+
+        assert [n.node.node_id for n in first] == [n.node.node_id for n in second] == ["1"]
+        assert model.predict.call_count == 1
+
+    def test_retriever_reranks_to_rerank_top_k(self, tmp_path):
+        """Test the retriever keeps rerank_top_k chunks when a reranker is set"""
+        from llama_index.core.embeddings import MockEmbedding
+        from src.rag.rerank import LexicalReranker
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        sections = {f"Item {i}": f"Generic business discussion number {i}." for i in range(2, 8)}
+        sections["Item 7"] = "Liquidity and capital resources remain strong."
+        docs = ingester.create_documents_from_sections(sections, {'ticker': 'TEST'})
+        index = ingester.ingest_documents(docs, collection_name="test_rerank")
+        retriever = AdvancedRAGRetriever(
+            index=index, llm=None, similarity_top_k=5, rerank_top_k=2, reranker=LexicalReranker()
+        )
+
+        result = retriever.query_with_sources("liquidity capital resources")
+
+        assert len(result.source_nodes) == 2
+        assert result.source_nodes[0].metadata['section'] == "Item 7"
+
+
+class TestFederatedRetrieval:
+    """Test retrieval across per-ticker collections"""
+
+    def test_detect_tickers_and_merge_quotas(self):
+        """Test mentioned tickers are found and every ticker keeps its quota"""
+        from llama_index.core.schema import TextNode, NodeWithScore
+        from src.rag.federated import detect_tickers, merge_with_quotas
+
+        assert detect_tickers("Compare AAPL and MSFT, it is on", ["aapl", "MSFT", "IT", "ON"]) == [
+            "AAPL",
+            "MSFT",
+        ]
+
+        results = {
+            ticker: [
+                NodeWithScore(node=TextNode(id_=f"{ticker}{i}", text="x"), score=1.0)
+                for i in range(count)
+            ]
+            for ticker, count in (("AAPL", 5), ("MSFT", 1), ("NVDA", 0))
+        }
+        merged = merge_with_quotas(results, total_top_k=4)
+
+        assert [n.node.node_id for n in merged] == ["AAPL0", "MSFT0", "AAPL1"]
+
+    def test_federated_query_covers_every_ticker(self, tmp_path):
+        """Test a comparison question gets sources from each collection"""
+        from llama_index.core.embeddings import MockEmbedding
+        from src.rag.federated import FederatedRetriever
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        retrievers = {}
+        for ticker in ("AAPL", "MSFT"):
+            sections = {f"Item {i}": f"{ticker} risk discussion number {i}." for i in range(1, 6)}
+            docs = ingester.create_documents_from_sections(
+                sections, {'ticker': ticker, 'year': '2024'}
+            )
+            index = ingester.ingest_documents(docs, collection_name=f"test_{ticker.lower()}")
+            retrievers[ticker] = AdvancedRAGRetriever(index=index, llm=None, similarity_top_k=5)
+
+        federated = FederatedRetriever(retrievers, total_top_k=4)
+        result = federated.query_with_sources(
+            "Compare AAPL and MSFT risk factors", {'fiscal_year': 2024}
+        )
+
+        assert [n.metadata['ticker'] for n in result.source_nodes] == [
+            "AAPL",
+            "MSFT",
+            "AAPL",
+            "MSFT",
+        ]
+        assert federated.query_with_sources("risks", {'fiscal_year': 2023}).source_nodes == []
+
+
+class TestContextBuilder:
+    """Test context packing for synthesis"""
+
+    @staticmethod
+    def make_node(node_id, text, start, end, score=1.0, doc_id="doc"):
+        from llama_index.core.schema import (
+            TextNode,
+            NodeWithScore,
+            NodeRelationship,
+            RelatedNodeInfo,
+        )
+
+        node = TextNode(
+            id_=node_id,
+            text=text,
+            start_char_idx=start,
+            end_char_idx=end,
+            metadata={'section': 'Item 7'},
+        )
+        node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=doc_id)
+        return NodeWithScore(node=node, score=score)
+
+    def test_overlapping_and_adjacent_chunks_are_merged(self):
+        """Test overlap is removed and neighbouring chunks become one passage"""
+        from src.rag.context import ContextBuilder
+        source = "Alpha beta gamma. Delta epsilon zeta. Eta theta iota."
+        nodes = [
+            self.make_node("b", source[18:37], 18, 37, score=0.9),
+            self.make_node("a", source[:25], 0, 25, score=0.8),
+            self.make_node("c", source[38:], 38, len(source), score=0.7),
+            self.make_node("dup", source[:25], 100, 125, score=0.6, doc_id="other"),
+            self.make_node("x", "Unrelated chunk.", 0, 16, score=0.5, doc_id="other"),
+        ]
+
+        packed = ContextBuilder(token_budget=1000, tokenizer=str.split).build(nodes)
+
+        assert [n.node.node_id for n in packed] == ["b", "x"]
+        assert (
+            packed[0].node.get_content()
+            == "Alpha beta gamma. Delta epsilon zeta.\n\nEta theta iota."
+        )
+        assert packed[0].node.metadata['merged_chunks'] == 3
+
+    def test_context_fits_token_budget(self):
+        """Test passages are packed by relevance within the budget"""
+        from src.rag.context import ContextBuilder
+        nodes = [
+            self.make_node("a", " ".join(["first"] * 40), 0, 240, doc_id="a"),
+            self.make_node("b", " ".join(["second"] * 80), 0, 560, doc_id="b"),
+            self.make_node("c", " ".join(["third"] * 10), 0, 60, doc_id="c"),
+        ]
+        builder = ContextBuilder(token_budget=60, tokenizer=str.split)
+
+        packed = builder.build(nodes)
+
+        assert [n.node.node_id for n in packed] == ["a", "c"]
+        truncated = builder.build(nodes[1:2])
+        assert len(truncated[0].node.get_content().split()) <= 60
+
+
+class TestParentChildIndex:
+    """Test small-to-big (parent/child) indexing"""
+
+    def test_children_are_searched_and_parents_synthesized(self, tmp_path):
+        """Test children are indexed, mapped back to parents and expanded"""
+        from llama_index.core.embeddings import MockEmbedding
+        from src.rag.parents import ParentStore
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(
+                persist_dir=str(tmp_path / "vector_db"),
+                index_mode="parent-child",
+                child_chunk_size=16
+            )
+        liquidity = " ".join(
+            f"Sentence {i} about general operations and markets." for i in range(8)
+        )
+        sections = {"Item 7": liquidity + " Goodwill impairment was recorded this year."}
+        docs = ingester.create_documents_from_sections(
+            sections, {'ticker': 'TEST', 'filing_id': 'f1'}
+        )
+        index = ingester.ingest_documents(docs, collection_name="test_parents")
+        parent_store = ingester.get_parent_store("test_parents")
+
+        assert parent_store.count() == 1
+        assert ingester.last_ingest_stats['added'] > 1
+
+        retriever = AdvancedRAGRetriever(
+            index=index,
+            llm=None,
+            similarity_top_k=2,
+            sparse_index=ingester.get_sparse_index("test_parents"),
+            parent_store=parent_store
+        )
+        result = retriever.query_with_sources("goodwill impairment")
+
+        assert len(result.source_nodes) == 1
+        assert result.source_nodes[0].node.get_content() == sections["Item 7"]
+
+        # Offsets map a child to its parent without the parent_id link
+        child = retriever.retrieve("goodwill impairment")[0].node
+        child.metadata.pop('parent_id')
+        reloaded = ParentStore(parent_store.path)
+        assert reloaded.parent_of(child).node_id == result.source_nodes[0].node.node_id
+
+        ingester.ingest_documents(docs, collection_name="test_parents")
+        assert ingester.last_ingest_stats['added'] == 0
+
+    def test_delta_reingest_keeps_children_linked(self, tmp_path):
+        """Test unchanged children of an edited parent are re-linked to the new parent"""
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(
+                persist_dir=str(tmp_path / "vector_db"),
+                index_mode="parent-child",
+                child_chunk_size=16
+            )
+        paragraphs = [
+            " ".join(f"Paragraph {p} sentence {i} about operations." for i in range(6))
+            for p in range(3)
+        ]
+        metadata = {'ticker': 'TEST', 'filing_id': 'f1'}
+        ingester.ingest_documents(
+            ingester.create_documents_from_sections({"Item 7": "\n\n".join(paragraphs)}, metadata),
+            collection_name="test_relink"
+        )
+
+        paragraphs[1] = paragraphs[1].replace("sentence 0", "sentence zero")
+        index = ingester.ingest_documents(
+            ingester.create_documents_from_sections({"Item 7": "\n\n".join(paragraphs)}, metadata),
+            collection_name="test_relink"
+        )
+
+        parent_store = ingester.get_parent_store("test_relink")
+        children = index.vector_store.get_nodes(
+            node_ids=ingester.get_manifest("test_relink").node_ids()
+        )
+        assert ingester.last_ingest_stats['deleted'] > 0
+        assert children and all(
+            parent_store.get(child.metadata['parent_id']) is not None for child in children
+        )
+
+
+class TestAsyncQuery:
+    """Test the async RAG API"""
+
+    @pytest.fixture
+    def index_and_ingester(self, tmp_path):
+        from llama_index.core.embeddings import MockEmbedding
+        with patch(
+            'src.rag.ingestion.HuggingFaceEmbedding', return_value=MockEmbedding(embed_dim=8)
+        ):
+            ingester = DocumentIngester(persist_dir=str(tmp_path / "vector_db"))
+        sections = {
+            "Item 1": "Apple designs smartphones.",
+            "Item 8": "A goodwill impairment charge was recorded.",
+        }
+        docs = ingester.create_documents_from_sections(sections, {'ticker': 'TEST'})
+        return ingester.ingest_documents(docs, collection_name="test_async"), ingester
+
+    def test_aquery_matches_sync_query(self, index_and_ingester):
+        """Test the async pipeline returns the same answer and sources"""
+        import asyncio
+        from llama_index.core.llms import MockLLM
+        index, ingester = index_and_ingester
+        retriever = AdvancedRAGRetriever(
+            index=index,
+            llm=MockLLM(),
+            similarity_top_k=1,
+            sparse_index=ingester.get_sparse_index("test_async")
+        )
+
+        async_result = asyncio.run(retriever.aquery_with_sources("goodwill impairment"))
+        sync_result = retriever.query_with_sources("goodwill impairment")
+
+        assert [n.metadata['section'] for n in async_result.source_nodes] == ["Item 8"]
+        assert async_result.answer == sync_result.answer
 
+    def test_stage_timeouts(self, index_and_ingester):
+        """Test a slow search times out and a slow LLM falls back to the context"""
+        import asyncio
+        import time
+        from src.rag.retrieval import TIMEOUT_MESSAGE
+        index, _ = index_and_ingester
+        retriever = AdvancedRAGRetriever(index=index, llm=None, similarity_top_k=1)
 
+        def slow_search(*args, **kwargs):
+            time.sleep(0.5)
+            return []
 
+        with patch.object(retriever, 'retrieve_with_metadata_filter', side_effect=slow_search):
+            result = asyncio.run(
+                retriever.aquery_with_sources(
+                    "risks", request=retriever.make_request(search_timeout=0.05)
+                )
+            )
+        assert result.answer == TIMEOUT_MESSAGE
 
+        async def slow_synthesis(*args, **kwargs):
+            await asyncio.sleep(1)
 
+        with patch.object(retriever, 'asynthesize', side_effect=slow_synthesis):
+            result = asyncio.run(
+                retriever.aquery_with_sources(
+                    "goodwill", request=retriever.make_request(synthesis_timeout=0.05)
+                )
+            )
+        assert result.answer.startswith("**Informations trouvées")
+        assert result.source_nodes
@@ -0,0 +1,88 @@
+"""
+Tests for the per-ticker resource cache
+"""
+import threading
+import time
+from src.web.resource_cache import ResourceCache, estimate_size
+
+
+class FakeClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResourceCache:
+    """Test bounded LRU cache"""
+
+    def test_lru_eviction_by_count_and_memory(self):
+        """Test least recently used entries are evicted past either bound"""
+        evicted = []
+        cache = ResourceCache(
+            max_entries=3, max_bytes=250, idle_ttl=None,
+            estimate_cost=lambda value: value, on_evict=lambda key, _: evicted.append(key)
+        )
+        cache.put('AAPL', 100)
+        cache.put('MSFT', 100)
+        cache.get('AAPL')
+        cache.put('NVDA', 100)  # over the memory budget: MSFT is the LRU entry
+
+        assert evicted == ['MSFT']
+        assert cache.keys() == ['AAPL', 'NVDA']
+        stats = cache.stats()
+        assert stats['total_bytes'] == 200
+        assert stats['evictions'] == 1
+        assert [item['key'] for item in stats['items']] == ['NVDA', 'AAPL']
+
+    def test_idle_entries_expire(self):
+        """Test entries unused for longer than the TTL are dropped"""
+        clock = FakeClock()
+        cache = ResourceCache(idle_ttl=60, estimate_cost=lambda value: 1, clock=clock)
+        cache.put('AAPL', 'a')
+        cache.put('MSFT', 'm')
+        clock.now = 50
+        cache.get('AAPL')
+        clock.now = 100
+
+        assert 'MSFT' not in cache
+        assert cache.get('AAPL') == 'a'
+        assert cache.stats()['expirations'] == 1
+
+    def test_concurrent_creation_builds_once(self):
+        """Test concurrent first requests for a key share one build"""
+        cache = ResourceCache(estimate_cost=lambda value: 1)
+        builds = []
+
+        def factory():
+            builds.append(1)
+            time.sleep(0.1)
+            return object()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_create('AAPL', factory)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(builds) == 1
+        assert all(result is results[0] for result in results)
+        assert not cache._creation_locks
+
+    def test_estimate_size_excludes_shared_objects(self):
+        """Test shared objects are not charged to an entry"""
+        shared = list(range(10000))
+        own = {'chunks': [str(i) * 1000 for i in range(10)], 'model': shared}
+
+        with_shared = estimate_size(own)
+        without_shared = estimate_size(own, exclude=[shared])
+
+        assert without_shared >= 10 * 1000
+        assert with_shared - without_shared >= 10000 * 8
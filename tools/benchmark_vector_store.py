@@ -0,0 +1,165 @@
+"""Benchmark vector store backends (Chroma vs in-process NumPy/HNSW) on the bundled 10-K filings."""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from llama_index.core import Document
+from llama_index.core.vector_stores import VectorStoreQuery
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.data.sec_edgar import SecEdgarClient  # noqa: E402
+from src.rag.chunking import StructuredChunker  # noqa: E402
+from src.rag.ingestion import DocumentIngester  # noqa: E402
+from src.rag.store_registry import (  # noqa: E402
+    VectorStoreRegistry, CHROMA, NUMPY, NUMPY_FLOAT16
+)
+
+FILINGS_DIR = Path(__file__).parent.parent / "sec-edgar-filings"
+
+
+def filing_year(filing_dir):
+    """Filing year from the two-digit year of the accession number"""
+    year = int(filing_dir.name.split('-')[1])
+    return year + (1900 if year > 50 else 2000)
+
+
+def load_nodes(tickers, filings_per_ticker):
+    """Parse and chunk the most recent bundled filings of each ticker"""
+    # Parsing needs no Downloader (whose constructor resolves tickers over the network)
+    sec = SecEdgarClient.__new__(SecEdgarClient)
+    chunker = StructuredChunker()
+    nodes = []
+    for ticker in tickers:
+        filing_dirs = sorted(
+            (FILINGS_DIR / ticker / "10-K").iterdir(), key=filing_year, reverse=True
+        )
+        for filing_dir in filing_dirs[:filings_per_ticker]:
+            sections = sec.parse_10k_html(str(filing_dir / "full-submission.txt"))
+            documents = [
+                Document(
+                    text=text,
+                    metadata={'ticker': ticker, 'section': name, 'document_type': '10-K'}
+                )
+                for name, text in sections.items()
+            ]
+            nodes.extend(chunker.get_nodes_from_documents(documents))
+    return nodes
+
+
+def embed_nodes(nodes, dim, use_model):
+    """Attach embeddings: the ingester's model, or random unit vectors"""
+    if use_model:
+        embed_model = DocumentIngester(persist_dir=tempfile.mkdtemp()).embed_model
+        texts = [node.get_content(metadata_mode="embed") for node in nodes]
+        embeddings = embed_model.get_text_embedding_batch(texts, show_progress=True)
+    else:
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((len(nodes), dim)).astype(np.float32).tolist()
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def directory_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+
+def run_backend(backend, nodes, queries, top_k, hnsw_threshold=None):
+    """Insert all nodes, then time queries; returns a result row"""
+    persist_dir = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        registry = VectorStoreRegistry()
+        store = registry.get_vector_store(persist_dir, "bench", backend)
+        if hnsw_threshold is not None:
+            store.hnsw_threshold = hnsw_threshold
+
+        start = time.perf_counter()
+        for i in range(0, len(nodes), 64):
+            store.add(nodes[i:i + 64])
+        insert_seconds = time.perf_counter() - start
+
+        # First query pays for index loading / HNSW build
+        start = time.perf_counter()
+        store.query(VectorStoreQuery(query_embedding=queries[0].tolist(), similarity_top_k=top_k))
+        first_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        results = []
+        for q in queries:
+            start = time.perf_counter()
+            result = store.query(
+                VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k)
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(result.ids)
+        latencies.sort()
+        return {
+            'insert_s': insert_seconds,
+            'first_ms': first_ms,
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+            'disk_mb': directory_size(persist_dir) / 1e6,
+            'ids': results,
+        }
+    finally:
+        shutil.rmtree(persist_dir, ignore_errors=True)
+
+
+def recall(results, reference):
+    hits = sum(len(set(r) & set(ref)) for r, ref in zip(results, reference))
+    return hits / max(1, sum(len(ref) for ref in reference))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', nargs='+', default=['AAPL', 'MSFT'])
+    parser.add_argument('--filings', type=int, default=3, help='Most recent filings per ticker')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=384, help='Dimension of random embeddings')
+    parser.add_argument(
+        '--model', action='store_true', help="Embed with the ingester's HuggingFace model"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    nodes = load_nodes(args.tickers, args.filings)
+    print(f"Parsed and chunked {len(nodes)} nodes in {time.perf_counter() - start:.1f}s")
+    vectors = embed_nodes(nodes, args.dim, args.model)
+
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(nodes), size=min(args.queries, len(nodes)), replace=False)
+    noise = rng.normal(0, 0.01, (len(picks), vectors.shape[1])).astype(np.float32)
+    queries = vectors[picks] + noise
+
+    rows = [
+        ('chroma', run_backend(CHROMA, nodes, queries, args.top_k)),
+        ('numpy f32 (exact)', run_backend(NUMPY, nodes, queries, args.top_k)),
+        ('numpy f16 (exact)', run_backend(NUMPY_FLOAT16, nodes, queries, args.top_k)),
+        ('numpy f32 (hnsw)', run_backend(NUMPY, nodes, queries, args.top_k, hnsw_threshold=0)),
+    ]
+    reference = rows[1][1]['ids']
+
+    print(
+        f"\n{len(nodes)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, "
+        f"top_k={args.top_k}"
+    )
+    print(
+        f"{'backend':<20}{'insert s':>10}{'first ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'disk MB':>10}{'recall':>8}"
+    )
+    for name, row in rows:
+        print(
+            f"{name:<20}{row['insert_s']:>10.2f}{row['first_ms']:>10.2f}{row['p50_ms']:>10.3f}"
+            f"{row['p95_ms']:>10.3f}{row['disk_mb']:>10.1f}{recall(row['ids'], reference):>8.3f}"
+        )
+
+
+if __name__ == '__main__':
+    main()